@@ -0,0 +1,252 @@
+from array import array
+from datetime import date, datetime, timedelta
+
+from archive import SessionArchive
+from lru import LRUCache
+from storage import as_date
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A week is cached once it ended more than this long ago, so sessions that
+# were still running when it closed have been recorded
+GRACE = timedelta(days=1)
+ROLLING_DAYS = 7
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _bincount(index, weights, length):
+    # Sums weights into `length` buckets: numpy when it is installed, one
+    # pass over the arrays otherwise
+    if numpy is not None and len(index):
+        return numpy.bincount(numpy.frombuffer(index, dtype=index.typecode),
+                              numpy.frombuffer(weights, dtype=weights.typecode), length).tolist()
+    totals = [0.0] * length
+    for i, weight in zip(index, weights):
+        totals[i] += weight
+    return totals
+
+
+# Cells are (day, hour) aggregates produced by the database; Columns holds
+# them as parallel arrays for the bucketed sums below
+class Columns:
+    def __init__(self):
+        self.day = array("l")
+        self.hour = array("l")
+        self.sessions = array("d")
+        self.planned = array("d")
+        self.actual = array("d")
+        self.on_target = array("d")
+
+    def extend(self, cells):
+        for cell in cells:
+            self.day.append(cell['day'])
+            self.hour.append(cell['hour'])
+            self.sessions.append(cell['sessions'])
+            self.planned.append(cell['planned'])
+            self.actual.append(cell['actual'])
+            self.on_target.append(cell['on_target'])
+
+
+def summarize(columns, start, days):
+    # Per-day and per-week totals, a weekday x hour heatmap, completion rates
+    # and a rolling average of daily minutes, all from bucketed sums
+    first = start.toordinal()
+    day_index = array("l", (day - first for day in columns.day))
+    daily_minutes = _bincount(day_index, columns.actual, days)
+    daily_sessions = _bincount(day_index, columns.sessions, days)
+    # Ordinal 1 is a Monday, so (ordinal - 1) % 7 is date.weekday()
+    slot_index = array("l", (((day - 1) % 7) * 24 + hour for day, hour in zip(columns.day, columns.hour)))
+    slots = _bincount(slot_index, columns.actual, 7 * 24)
+    heatmap = [slots[weekday * 24:weekday * 24 + 24] for weekday in range(7)]
+
+    running = [0.0]
+    for minutes in daily_minutes:
+        running.append(running[-1] + minutes)
+    daily = []
+    for i in range(days):
+        window = min(i + 1, ROLLING_DAYS)
+        daily.append({
+            'date': date.fromordinal(first + i),
+            'minutes': round(daily_minutes[i], 2),
+            'sessions': int(daily_sessions[i]),
+            'rolling_avg': round((running[i + 1] - running[i + 1 - window]) / window, 2),
+        })
+    weekly = []
+    for offset in range(0, days, 7):
+        weekly.append({
+            'week': date.fromordinal(first + offset),
+            'minutes': round(sum(daily_minutes[offset:offset + 7]), 2),
+            'sessions': int(sum(daily_sessions[offset:offset + 7])),
+        })
+
+    planned = sum(columns.planned)
+    actual = sum(columns.actual)
+    sessions = sum(columns.sessions)
+    return {
+        'start': start,
+        'end': start + timedelta(days=days),
+        'daily': daily,
+        'weekly': weekly,
+        'heatmap': [[round(minutes, 2) for minutes in row] for row in heatmap],
+        'completion': {
+            'sessions': int(sessions),
+            'planned_minutes': round(planned, 2),
+            'actual_minutes': round(actual, 2),
+            'ratio': round(actual / planned, 3) if planned else None,
+            'on_target_rate': round(sum(columns.on_target) / sessions, 3) if sessions else None,
+        },
+    }
+
+
+# Bounded LRU of per-week cells for weeks that can no longer change
+class PeriodCache(LRUCache):
+    def __init__(self, max_size=4096):
+        super().__init__(max_size)
+
+
+# Study analytics for a user, a group's current members, or everyone. The
+# database aggregates completed sessions into (day, hour) cells, so even a
+# cohort-wide report moves at most 24 rows per day into Python
+class StudyAnalytics:
+    def __init__(self, db, cache=None, clock=datetime.now):
+        self.db = db
+        self.cache = cache or PeriodCache()
+        self.clock = clock
+
+    def _scope(self, user_id=None, group_id=None):
+        # (cache key, extra WHERE clause, parameters)
+        if user_id is not None:
+            return ("user", user_id), " AND user_id = %s", [user_id]
+        if group_id is not None:
+            # Membership changes alter a group's past weeks too, so the
+            # member count is part of the key
+            cursor = self.db.cursor
+            cursor.execute("SELECT member_count FROM study_groups WHERE group_id = %s", (group_id,))
+            row = cursor.fetchone()
+            return (("group", group_id, row['member_count'] if row else 0),
+                    " AND user_id IN (SELECT user_id FROM group_members WHERE group_id = %s)", [group_id])
+        return ("cohort",), "", []
+
+    def _cells_query(self, table, where):
+        hour = self.db.backend.hour("start_time")
+        return f"""
+            SELECT DATE(start_time) AS day, {hour} AS hour, COUNT(*) AS sessions,
+                   SUM(duration) AS planned, SUM(actual_duration) AS actual,
+                   SUM(CASE WHEN actual_duration >= duration THEN 1 ELSE 0 END) AS on_target
+            FROM {table}
+            WHERE status = %s AND start_time >= %s AND start_time < %s{where}
+            GROUP BY DATE(start_time), {hour}
+        """
+
+    def _archived_scope(self, user_id=None, group_id=None):
+        # Shards hold only sessions, so a group is resolved to its members here
+        if user_id is not None:
+            return " AND user_id = %s", [user_id]
+        if group_id is not None:
+            cursor = self.db.cursor
+            cursor.execute("SELECT user_id FROM group_members WHERE group_id = %s", (group_id,))
+            members = [row['user_id'] for row in cursor.fetchall()] or [None]
+            return f" AND user_id IN ({', '.join(['%s'] * len(members))})", members
+        return "", []
+
+    def _query(self, where, params, since, until, user_id=None, group_id=None):
+        bounds = ["Completed", datetime.combine(since, datetime.min.time()),
+                  datetime.combine(until, datetime.min.time())]
+        cursor = self.db.cursor
+        cursor.execute(self._cells_query("study_sessions", where), bounds + params)
+        rows = cursor.fetchall()
+        # Months moved out by the archiver are read from their shards; cells
+        # for the same (day, hour) from both just add up in summarize()
+        archive = SessionArchive(self.db)
+        periods = archive.periods(since)
+        if periods:
+            archived_where, archived_params = self._archived_scope(user_id, group_id)
+            query = self._cells_query("{table}", archived_where)
+            for period in periods:
+                rows += archive.query_shard(period, query, bounds + archived_params)
+        weeks = {}
+        for row in rows:
+            day = as_date(row['day'])
+            weeks.setdefault(week_start(day), []).append({
+                'day': day.toordinal(), 'hour': int(row['hour']), 'sessions': row['sessions'],
+                'planned': float(row['planned'] or 0), 'actual': float(row['actual'] or 0),
+                'on_target': float(row['on_target'] or 0)})
+        return weeks
+
+    def report(self, weeks=12, user_id=None, group_id=None):
+        # The last `weeks` weeks, ending with the current one
+        key, where, params = self._scope(user_id, group_id)
+        now = self.clock()
+        first = week_start(now.date()) - timedelta(weeks=weeks - 1)
+        periods = [first + timedelta(weeks=i) for i in range(weeks)]
+        cells = {}
+        missing = []
+        for period in periods:
+            closed = datetime.combine(period + timedelta(days=7), datetime.min.time()) + GRACE <= now
+            cached = self.cache.get(key + (period,)) if closed else None
+            if cached is None:
+                missing.append(period)
+            else:
+                cells[period] = cached
+        if missing:
+            fetched = self._query(where, params, missing[0], missing[-1] + timedelta(days=7), user_id, group_id)
+            for period in missing:
+                cells[period] = fetched.get(period, [])
+                if datetime.combine(period + timedelta(days=7), datetime.min.time()) + GRACE <= now:
+                    self.cache.put(key + (period,), cells[period])
+        columns = Columns()
+        for period in periods:
+            columns.extend(cells[period])
+        result = summarize(columns, first, weeks * 7)
+        result['cached_weeks'] = weeks - len(missing)
+        return result
+
+    def active_users(self, since, until):
+        bounds = ("Completed", datetime.combine(since, datetime.min.time()), datetime.combine(until, datetime.min.time()))
+        cursor = self.db.cursor
+        archive = SessionArchive(self.db)
+        periods = archive.periods(since)
+        if not periods:
+            cursor.execute(
+                "SELECT COUNT(DISTINCT user_id) AS users FROM study_sessions "
+                "WHERE status = %s AND start_time >= %s AND start_time < %s", bounds)
+            return cursor.fetchone()['users']
+        # A user can appear in several shards, so the distinct ids are merged here
+        query = "SELECT DISTINCT user_id FROM {table} WHERE status = %s AND start_time >= %s AND start_time < %s"
+        cursor.execute(query.format(table="study_sessions"), bounds)
+        users = {row['user_id'] for row in cursor.fetchall()}
+        for period in periods:
+            users.update(row['user_id'] for row in archive.query_shard(period, query, bounds))
+        return len(users)
+
+    def cohort_report(self, weeks=12):
+        result = self.report(weeks)
+        result['active_users'] = self.active_users(result['start'], result['end'])
+        return result
+
+
+DAY_LABELS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def print_report(result, title, out=None):
+    print(f"\n=== {title}: {result['start']} to {result['end'] - timedelta(days=1)} ===", file=out)
+    print("{:<12} {:>10} {:>10}".format("Week of", "Minutes", "Sessions"), file=out)
+    for week in result['weekly']:
+        print("{:<12} {:>10.1f} {:>10}".format(str(week['week']), week['minutes'], week['sessions']), file=out)
+    completion = result['completion']
+    if completion['sessions']:
+        print(f"\nCompletion: {completion['actual_minutes']:.0f} of {completion['planned_minutes']:.0f} planned "
+              f"minutes ({completion['ratio']:.0%}), {completion['on_target_rate']:.0%} of sessions on target",
+              file=out)
+        weekday, hour = max(((d, h) for d in range(7) for h in range(24)),
+                            key=lambda slot: result['heatmap'][slot[0]][slot[1]])
+        print(f"Busiest slot: {DAY_LABELS[weekday]} {hour:02d}:00", file=out)
+        print(f"7-day average: {result['daily'][-1]['rolling_avg']:.1f} minutes/day", file=out)
+    if 'active_users' in result:
+        print(f"Active users: {result['active_users']}", file=out)
@@ -0,0 +1,183 @@
+from datetime import date, datetime, timedelta
+
+# Completed sessions are archived once the month they ended in is entirely
+# older than this
+RETENTION_DAYS = 180
+COLUMNS = ["session_id", "user_id", "session_name", "duration", "start_time", "end_time", "actual_duration",
+           "status"]
+
+
+def period_of(moment):
+    return date(moment.year, moment.month, 1)
+
+
+def next_period(period):
+    return date(period.year + period.month // 12, period.month % 12 + 1, 1)
+
+
+def _start(period):
+    return datetime.combine(period, datetime.min.time())
+
+
+# Moves completed sessions out of study_sessions one month at a time (by
+# end_time): the rows go to that month's shard (backend.shard) and each
+# user's totals for the month to session_archive, so study_sessions only
+# holds the retention window plus sessions still running. A run can be
+# repeated after a crash: shard writes skip rows already copied, and the
+# summaries commit together with the deletes from study_sessions
+class SessionArchive:
+    def __init__(self, db, retention_days=RETENTION_DAYS, batch_size=1000, clock=datetime.now):
+        self.db = db
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.clock = clock
+
+    def cutoff(self):
+        # First month that stays in study_sessions
+        return period_of(self.clock() - timedelta(days=self.retention_days))
+
+    def pending(self):
+        cursor = self.db.cursor
+        cursor.execute("SELECT MIN(end_time) AS oldest FROM study_sessions WHERE status = %s", ("Completed",))
+        oldest = cursor.fetchone()['oldest']
+        if isinstance(oldest, str):
+            # MIN() loses the column type on SQLite
+            oldest = datetime.fromisoformat(oldest)
+        periods = []
+        period = period_of(oldest) if oldest else self.cutoff()
+        while period < self.cutoff():
+            periods.append(period)
+            period = next_period(period)
+        return periods
+
+    def _copy(self, period):
+        # Copies the month's completed sessions to its shard in keyset pages
+        # of (end_time, session_id); returns (session ids, per-user totals)
+        backend = self.db.backend
+        cursor = self.db.cursor
+        low, high = _start(period), _start(next_period(period))
+        ids = []
+        totals = {}
+        connection = None
+        try:
+            last_end, last_id = low, 0
+            while True:
+                cursor.execute("""
+                    SELECT * FROM study_sessions
+                    WHERE status = %s AND end_time >= %s AND end_time < %s
+                      AND (end_time > %s OR (end_time = %s AND session_id > %s))
+                    ORDER BY end_time, session_id LIMIT %s
+                """, ("Completed", low, high, last_end, last_end, last_id, self.batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                if connection is None:
+                    connection, table = backend.create_shard(period, self.db.connection)
+                    shard = backend.cursor(connection)
+                shard.executemany(
+                    f"{backend.insert_ignore} INTO {table} ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join(['%s'] * len(COLUMNS))})",
+                    [tuple(row[column] for column in COLUMNS) for row in rows])
+                connection.commit()
+                for row in rows:
+                    ids.append(row['session_id'])
+                    total = totals.setdefault(row['user_id'], {
+                        'sessions': 0, 'planned': 0.0, 'actual': 0.0, 'on_target': 0, 'days': 0, 'last_end': None})
+                    total['sessions'] += 1
+                    total['planned'] += row['duration'] or 0
+                    total['actual'] += row['actual_duration'] or 0
+                    total['on_target'] += (row['actual_duration'] or 0) >= (row['duration'] or 0)
+                    total['days'] |= 1 << (row['end_time'].day - 1)
+                    total['last_end'] = max(total['last_end'] or row['end_time'], row['end_time'])
+                last_end, last_id = rows[-1]['end_time'], rows[-1]['session_id']
+                if len(rows) < self.batch_size:
+                    break
+        finally:
+            if connection is not None:
+                backend.release_shard(connection)
+        return ids, totals
+
+    def archive_period(self, period):
+        # Returns the number of sessions moved out of study_sessions
+        ids, totals = self._copy(period)
+        if not ids:
+            return 0
+        cursor = self.db.cursor
+        cursor.executemany(
+            self.db.backend.upsert(
+                "session_archive",
+                ["user_id", "period", "sessions", "planned_minutes", "actual_minutes", "on_target",
+                 "study_days", "last_end"],
+                ["user_id", "period"],
+                {"sessions": "sessions + {sessions}",
+                 "planned_minutes": "planned_minutes + {planned_minutes}",
+                 "actual_minutes": "actual_minutes + {actual_minutes}",
+                 "on_target": "on_target + {on_target}",
+                 "study_days": "study_days | {study_days}",
+                 "last_end": "CASE WHEN last_end IS NULL OR {last_end} > last_end THEN {last_end} ELSE last_end END"}),
+            [(user_id, period, total['sessions'], total['planned'], total['actual'], total['on_target'],
+              total['days'], total['last_end']) for user_id, total in totals.items()])
+        for start in range(0, len(ids), self.batch_size):
+            chunk = ids[start:start + self.batch_size]
+            cursor.execute(f"DELETE FROM study_sessions WHERE session_id IN ({', '.join(['%s'] * len(chunk))})",
+                           chunk)
+        cursor.execute(
+            self.db.backend.upsert("archived_periods", ["period", "sessions", "archived_at"], ["period"],
+                                   {"sessions": "sessions + {sessions}", "archived_at": "{archived_at}"}),
+            (period, len(ids), datetime.now()))
+        self.db.commit()
+        return len(ids)
+
+    def run(self):
+        # Archives every pending month; returns [(period, sessions moved)]
+        # for the months that had any
+        archived = []
+        for period in self.pending():
+            moved = self.archive_period(period)
+            if moved:
+                archived.append((period, moved))
+        return archived
+
+    def periods(self, since=None):
+        # Archived months that can hold sessions starting at or after since.
+        # A session ends after it starts, so its month is never before since's;
+        # there is no upper bound, as a session may be ended days later
+        cursor = self.db.cursor
+        if since:
+            cursor.execute("SELECT period FROM archived_periods WHERE period >= %s ORDER BY period",
+                           (period_of(since),))
+        else:
+            cursor.execute("SELECT period FROM archived_periods ORDER BY period")
+        return [row['period'] for row in cursor.fetchall()]
+
+    def summaries(self, user_id):
+        cursor = self.db.cursor
+        cursor.execute("SELECT * FROM session_archive WHERE user_id = %s ORDER BY period", (user_id,))
+        return cursor.fetchall()
+
+    def user_sessions(self, user_id, since=None, until=None):
+        # One list per shard the user has sessions in, each ordered by
+        # (start_time, session_id); a month's rows for one user are few
+        filters = ["user_id = %s"]
+        params = [user_id]
+        if since:
+            filters.append("start_time >= %s")
+            params.append(since)
+        if until:
+            filters.append("start_time < %s")
+            params.append(until)
+        query = f"SELECT * FROM {{table}} WHERE {' AND '.join(filters)} ORDER BY start_time, session_id"
+        return [self.query_shard(summary['period'], query, params) for summary in self.summaries(user_id)
+                if not since or summary['period'] >= period_of(since)]
+
+    def query_shard(self, period, query, params=()):
+        # Runs a SELECT against one month's shard; {table} names its table.
+        # On MySQL this is the caller's own connection
+        backend = self.db.backend
+        connection, table = backend.shard(period, self.db.connection)
+        try:
+            cursor = backend.cursor(connection)
+            cursor.execute(query.format(table=table), params)
+            return cursor.fetchall()
+        finally:
+            backend.release_shard(connection)
@@ -0,0 +1,368 @@
+import argparse
+import builtins
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import main
+from journal import SessionWriter
+from passwords import check_login, hash_password, legacy_hash
+from storage import SQLiteBackend
+from transfer import UserImporter
+
+PASSWORD = "benchmark"
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+# Cursor proxy that counts every statement sent to the database
+class CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, query, params=()):
+        self._counter[0] += 1
+        return self._cursor.execute(query, params)
+
+    def executemany(self, query, seq_of_params):
+        self._counter[0] += 1
+        return self._cursor.executemany(query, seq_of_params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# Wraps a backend so the harness can report queries per operation
+class CountingBackend:
+    def __init__(self, backend):
+        self.backend = backend
+        self.counter = [0]
+
+    def cursor(self, connection):
+        return CountingCursor(self.backend.cursor(connection), self.counter)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+@contextmanager
+def scripted(answers=()):
+    # Feeds input() from a list and swallows print() while a manager runs
+    answers = list(answers)
+    real_input, real_print = builtins.input, builtins.print
+    builtins.input = lambda prompt="": answers.pop(0)
+    builtins.print = lambda *args, **kwargs: None
+    try:
+        yield
+    finally:
+        builtins.input, builtins.print = real_input, real_print
+
+
+def seed(db, users, sessions_per_user, groups, seed_value=42):
+    rng = random.Random(seed_value)
+    hashed = main.User(db).hash_password(PASSWORD)
+    today = datetime.now().date()
+
+    def fixtures():
+        for i in range(users):
+            streak = rng.randint(0, 45)
+            points = rng.randint(0, 2500)
+            yield {
+                "username": f"user{i}",
+                "password": hashed,
+                "streak": streak,
+                "points": points,
+                "badges": [name for name, field, threshold in main.BADGE_RULES
+                           if {"streak": streak, "points": points}[field] >= threshold and rng.random() < 0.5],
+                "last_study_date": str(today - timedelta(days=rng.randint(0, 3))),
+                "study_reminders": [{"time": f"{rng.randint(6, 22):02d}:00", "days": "Mon,Wed,Fri"}]
+                if rng.random() < 0.3 else [],
+            }
+
+    UserImporter(db, batch_size=5000, progress=None).import_users(fixtures())
+
+    cursor = db.cursor
+    start = datetime.now() - timedelta(days=365)
+    batch = []
+    for user_id in range(1, users + 1):
+        for _ in range(sessions_per_user):
+            started = start + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            minutes = rng.uniform(5, 120)
+            batch.append((user_id, "Synthetic", 60, started, started + timedelta(minutes=minutes),
+                          minutes, "Completed"))
+        if len(batch) >= 20000:
+            cursor.executemany(
+                "INSERT INTO study_sessions (user_id, session_name, duration, start_time, end_time, "
+                "actual_duration, status) VALUES (%s, %s, %s, %s, %s, %s, %s)", batch)
+            batch = []
+    if batch:
+        cursor.executemany(
+            "INSERT INTO study_sessions (user_id, session_name, duration, start_time, end_time, "
+            "actual_duration, status) VALUES (%s, %s, %s, %s, %s, %s, %s)", batch)
+
+    cursor.executemany("INSERT INTO study_groups (group_name, creator_id) VALUES (%s, %s)",
+                       [(f"Group {g}", rng.randint(1, users)) for g in range(groups)])
+    members = {(rng.randint(1, groups), rng.randint(1, users)) for _ in range(groups * 10)}
+    cursor.executemany("INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)", sorted(members))
+    cursor.execute("""
+        UPDATE study_groups SET member_count = (
+            SELECT COUNT(*) FROM group_members WHERE group_members.group_id = study_groups.group_id
+        )
+    """)
+    db.commit()
+    main.StatsRollup(db).reconcile(repair=True, chunk_size=5000)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(name, operation, iterations, counter):
+    latencies = []
+    queries = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        before = counter[0]
+        tick = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - tick)
+        queries += counter[0] - before
+    elapsed = time.perf_counter() - started
+    return {
+        "operation": name,
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "queries_per_op": round(queries / iterations, 2),
+        "ops_per_sec": round(iterations / elapsed, 1) if elapsed else None,
+    }
+
+
+def run_size(users, sessions_per_user, iterations, workdir):
+    backend = CountingBackend(SQLiteBackend(os.path.join(workdir, f"bench-{users}.db")))
+    db = main.Database(backend)
+    seed(db, users, sessions_per_user, max(users // 50, 1))
+
+    rng = random.Random(users)
+    leaderboard = main.Leaderboard(db)
+    user = main.User(db, leaderboard)
+    study_session = main.StudySession(db)
+    progress_report = main.ProgressReport(user, study_session, db)
+    study_group = main.StudyGroup(db)
+    usernames = [f"user{rng.randint(0, users - 1)}" for _ in range(iterations)]
+
+    def login(i):
+        with scripted():
+            user.login(usernames[i], PASSWORD)
+
+    def start_session(i):
+        with scripted(["Benchmark", "30"]):
+            study_session.start_session(user)
+
+    def end_session(i):
+        with scripted():
+            study_session.end_session(user)
+
+    def view_report(i):
+        with scripted():
+            progress_report.view_report()
+
+    def view_leaderboard(i):
+        with scripted():
+            leaderboard.view_leaderboard(user)
+
+    def view_groups(i):
+        with scripted(["n"]):
+            study_group.view_groups()
+
+    def search_groups(i):
+        with scripted([f"Group {i % 10}"]):
+            study_group.search_groups()
+
+    def view_resources(i):
+        with scripted([str(i % max(users // 50, 1) + 1)]):
+            study_group.view_resources()
+
+    # Write-behind variants: latency until the event is acknowledged; the
+    # group commits happen on the writer's own connection
+    writer = SessionWriter(backend.backend, os.path.join(workdir, f"journal-{users}.log"))
+    writer.start()
+    journaled = main.StudySession(db, journal=writer)
+
+    def journal_start(i):
+        with scripted(["Benchmark", "30"]):
+            journaled.start_session(user)
+
+    def journal_end(i):
+        with scripted():
+            journaled.end_session(user)
+
+    results = [measure("login", login, iterations, backend.counter)]
+    # The remaining operations run as the last user that logged in
+    for name, operation in [("start_session", start_session), ("end_session", end_session),
+                            ("journal_start", journal_start), ("journal_end", journal_end),
+                            ("view_report", view_report), ("view_leaderboard", view_leaderboard),
+                            ("view_groups", view_groups), ("search_groups", search_groups),
+                            ("view_resources", view_resources)]:
+        results.append(measure(name, operation, iterations, backend.counter))
+    writer.stop()
+    db.close()
+    backend.close()
+    return {"users": users, "sessions": users * sessions_per_user, "results": results}
+
+
+def login_throughput(logins, worker_counts):
+    # Password verification alone, as the server runs it in its KDF process pool
+    stored = hash_password(PASSWORD)
+    results = []
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            list(pool.map(check_login, [PASSWORD] * workers, [stored] * workers))  # warm up the workers
+            started = time.perf_counter()
+            verified = sum(matches for matches, _ in pool.map(check_login, [PASSWORD] * logins, [stored] * logins))
+            elapsed = time.perf_counter() - started
+        results.append({"workers": workers, "logins": verified, "logins_per_sec": round(logins / elapsed, 1),
+                        "per_core": round(logins / elapsed / min(workers, os.cpu_count() or 1), 1)})
+    started = time.perf_counter()
+    legacy = legacy_hash(PASSWORD)
+    for _ in range(logins):
+        check_login(PASSWORD, legacy)
+    elapsed = time.perf_counter() - started
+    # Every legacy check also rehashes, so this is the one-off migration cost
+    results.append({"workers": "legacy+rehash", "logins": logins, "logins_per_sec": round(logins / elapsed, 1),
+                    "per_core": round(logins / elapsed, 1)})
+    return results
+
+
+def time_to_prompt(env, command):
+    # Wall clock from launching the app to its first menu prompt; answers Exit
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable] + command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+                               cwd=os.path.dirname(MAIN_PATH))
+    output = b""
+    while b"Choose an option" not in output:
+        chunk = os.read(process.stdout.fileno(), 4096)
+        if not chunk:
+            raise RuntimeError("main.py exited before its first prompt")
+        output += chunk
+    elapsed = time.perf_counter() - started
+    process.communicate(b"3\n")
+    return elapsed
+
+
+def import_time(env):
+    # Cumulative time of `import main` as reported by -X importtime, in seconds
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], env=env,
+                            cwd=os.path.dirname(MAIN_PATH), capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == "main":
+            return int(fields[1]) / 1e6
+    raise RuntimeError("main not found in -X importtime output")
+
+
+def startup_time(runs, workdir):
+    # Cold starts of the interactive app on a migrated SQLite file. The bare
+    # interpreter is timed too, since it is a floor no change here can lower.
+    # `python main.py` recompiles the script on every run, while `python -m
+    # main` loads it from __pycache__. Best of `runs`, as with timeit, since
+    # scheduling noise only ever adds time
+    env = dict(os.environ, STUDYSPARK_DB="sqlite:" + os.path.join(workdir, "startup.db"),
+               STUDYSPARK_QUOTES="offline")
+    subprocess.run([sys.executable, MAIN_PATH, "migrate"], env=env, check=True, stdout=subprocess.DEVNULL)
+    interpreter = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+        interpreter.append(time.perf_counter() - started)
+    script = [time_to_prompt(env, [MAIN_PATH]) for _ in range(runs)]
+    module = [time_to_prompt(env, ["-m", "main"]) for _ in range(runs)]
+    imports = [import_time(env) for _ in range(runs)]
+    return {"runs": runs,
+            "interpreter_ms": round(min(interpreter) * 1000, 2),
+            "import_main_ms": round(min(imports) * 1000, 2),
+            "first_prompt_ms": round(min(script) * 1000, 2),
+            "first_prompt_module_ms": round(min(module) * 1000, 2)}
+
+
+def compare(report, baseline, tolerance):
+    # Returns the operations whose p50 grew by more than `tolerance` times
+    previous = {(size['users'], result['operation']): result
+                for size in baseline['sizes'] for result in size['results']}
+    regressions = []
+    for size in report['sizes']:
+        for result in size['results']:
+            old = previous.get((size['users'], result['operation']))
+            if old and result['p50_ms'] > old['p50_ms'] * tolerance:
+                regressions.append((size['users'], result['operation'], old['p50_ms'], result['p50_ms']))
+    return regressions
+
+
+def benchmark_main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-generation benchmark for the StudySpark managers")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated user counts")
+    parser.add_argument("--sessions", type=int, default=20, help="completed sessions seeded per user")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per operation")
+    parser.add_argument("--output", help="write the results as JSON (a baseline) to this file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed p50 slowdown factor")
+    parser.add_argument("--logins", type=int, default=0, help="also measure password verification throughput")
+    parser.add_argument("--kdf-workers", default=f"1,{os.cpu_count() or 1}", help="comma-separated process counts")
+    parser.add_argument("--startup", type=int, default=0, metavar="RUNS",
+                        help="also time cold starts of main.py to its first prompt")
+    args = parser.parse_args(argv)
+    os.environ.setdefault("STUDYSPARK_QUOTES", "offline")
+
+    report = {"created": datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0],
+              "backend": "sqlite", "sizes": []}
+    with tempfile.TemporaryDirectory() as workdir:
+        for users in [int(size) for size in args.sizes.split(",") if size]:
+            size = run_size(users, args.sessions, args.iterations, workdir)
+            report['sizes'].append(size)
+            print(f"\n{users} users, {size['sessions']} sessions")
+            print("{:<18} {:>10} {:>10} {:>10} {:>12}".format("Operation", "p50 ms", "p99 ms", "queries", "ops/sec"))
+            for result in size['results']:
+                print("{:<18} {:>10} {:>10} {:>10} {:>12}".format(
+                    result['operation'], result['p50_ms'], result['p99_ms'],
+                    result['queries_per_op'], result['ops_per_sec']))
+        if args.startup:
+            report['startup'] = startup = startup_time(args.startup, workdir)
+            print(f"\nStartup (best of {startup['runs']} runs)")
+            print(f"Interpreter alone    {startup['interpreter_ms']:>8} ms")
+            print(f"import main          {startup['import_main_ms']:>8} ms")
+            print(f"Prompt, main.py      {startup['first_prompt_ms']:>8} ms")
+            print(f"Prompt, -m main      {startup['first_prompt_module_ms']:>8} ms")
+
+    if args.logins:
+        report['logins'] = login_throughput(args.logins, sorted({int(n) for n in args.kdf_workers.split(",")}))
+        print(f"\nLogin verification ({report['logins'][0]['logins']} logins)")
+        print("{:<18} {:>14} {:>14}".format("Workers", "logins/sec", "per core"))
+        for result in report['logins']:
+            print("{:<18} {:>14} {:>14}".format(result['workers'], result['logins_per_sec'], result['per_core']))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=4)
+        print(f"\n==> Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(report, json.load(baseline), args.tolerance)
+        for users, operation, old, new in regressions:
+            print(f"==> Regression: {operation} at {users} users went from {old} ms to {new} ms (p50)")
+        if regressions:
+            exit(1)
+        print("==> No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    benchmark_main()
@@ -0,0 +1,295 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from main import Database, GroupActivity, StatsRollup, StreakEngine
+
+
+def _encode(event):
+    return json.dumps({key: value.isoformat() if isinstance(value, datetime) else value
+                       for key, value in event.items()}) + "\n"
+
+
+def _decode(line):
+    event = json.loads(line)
+    for key in ("start_time", "end_time"):
+        if event.get(key):
+            event[key] = datetime.fromisoformat(event[key])
+    return event
+
+
+# Append-only JSON lines file of session events. Appends only reach the OS;
+# a background thread fsyncs them in batches every sync_interval seconds
+class SessionJournal:
+    def __init__(self, path, sync_interval=0.05, max_bytes=16 * 1024 * 1024):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.file = None
+        self.seq = 0
+        self.dirty = False
+        self.stopping = threading.Event()
+        self.syncer = None
+
+    def open(self, applied_seq):
+        # Returns the events after applied_seq. A torn final line (a crash
+        # part way through a write) is cut off, so new events are not
+        # appended to the fragment and lost on the next replay
+        pending = []
+        self.seq = applied_seq
+        if os.path.exists(self.path):
+            good = 0
+            with open(self.path, "rb") as existing:
+                for line in existing:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        event = _decode(line.decode())
+                    except ValueError:
+                        break
+                    good += len(line)
+                    self.seq = max(self.seq, event['seq'])
+                    if event['seq'] > applied_seq:
+                        pending.append(event)
+            if good < os.path.getsize(self.path):
+                with open(self.path, "r+b") as existing:
+                    existing.truncate(good)
+                    os.fsync(existing.fileno())
+        self.file = open(self.path, "a")
+        self.syncer = threading.Thread(target=self._sync_loop, name="journal-sync", daemon=True)
+        self.syncer.start()
+        return pending
+
+    def append(self, event):
+        with self.lock:
+            self.seq += 1
+            event['seq'] = self.seq
+            self.file.write(_encode(event))
+            self.file.flush()
+            self.dirty = True
+        return event
+
+    def sync(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            fd = self.file.fileno()
+        os.fsync(fd)
+
+    def _sync_loop(self):
+        while not self.stopping.wait(self.sync_interval):
+            self.sync()
+
+    def compact(self, applied_seq):
+        # Once everything written has reached the database the file can start over
+        with self.lock:
+            if self.seq == applied_seq and self.file.tell() > self.max_bytes:
+                self.file.truncate(0)
+                self.file.seek(0)
+
+    def close(self):
+        self.stopping.set()
+        if self.syncer:
+            self.syncer.join()
+        self.sync()
+        self.file.close()
+
+
+# Write-behind front for StudySession.begin/finish: events are acknowledged
+# once journaled, active sessions are tracked in memory by user_id, and a
+# background writer applies them to study_sessions in group commits.
+# The applied sequence number is committed in the same transaction, so
+# replaying the journal after a crash never applies an event twice.
+class SessionWriter:
+    def __init__(self, backend, path, name="sessions", batch_size=500, flush_interval=0.05,
+                 sync_interval=0.05, on_flush=None):
+        self.backend = backend
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.journal = SessionJournal(path, sync_interval)
+        self.active = {}
+        self.active_lock = threading.Lock()
+        self.pending = []
+        self.pending_lock = threading.Condition()
+        self.applied_seq = 0
+        self.stopping = False
+        self.db = None
+        self.thread = None
+
+    def start(self):
+        self.db = Database(self.backend)
+        cursor = self.db.cursor
+        cursor.execute("SELECT applied_seq FROM journal_checkpoints WHERE journal = %s", (self.name,))
+        row = cursor.fetchone()
+        self.applied_seq = row['applied_seq'] if row else 0
+        cursor.execute(
+            "SELECT user_id, session_name, duration, start_time FROM study_sessions WHERE status = %s",
+            ("In Progress",)
+        )
+        for row in cursor.fetchall():
+            self._track_start(row)
+        self.db.commit()
+        replayed = self.journal.open(self.applied_seq)
+        for event in replayed:
+            if event['type'] == "start":
+                self._track_start(event)
+            else:
+                self._track_end(event['user_id'], event['start_time'])
+        self.pending = replayed
+        self.thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self.thread.start()
+        return len(replayed)
+
+    def _track_start(self, session):
+        sessions = self.active.setdefault(session['user_id'], [])
+        sessions.append({key: session[key] for key in ("session_name", "duration", "start_time")})
+        sessions.sort(key=lambda item: item['start_time'])
+
+    def _track_end(self, user_id, start_time):
+        sessions = self.active.get(user_id, [])
+        for i, session in enumerate(sessions):
+            if session['start_time'] == start_time:
+                del sessions[i]
+                break
+        if not sessions:
+            self.active.pop(user_id, None)
+
+    def _submit(self, event):
+        self.journal.append(event)
+        with self.pending_lock:
+            self.pending.append(event)
+            if len(self.pending) >= self.batch_size:
+                self.pending_lock.notify()
+
+    def begin(self, user_id, session_name, duration):
+        # Whole seconds, so the row can be found again by start_time on MySQL,
+        # and unique per user. Tracking and journaling happen under one lock so
+        # an end is never journaled ahead of its start
+        start_time = datetime.now().replace(microsecond=0)
+        with self.active_lock:
+            sessions = self.active.get(user_id)
+            if sessions and sessions[-1]['start_time'] >= start_time:
+                start_time = sessions[-1]['start_time'] + timedelta(seconds=1)
+            event = {'type': "start", 'user_id': user_id, 'session_name': session_name,
+                     'duration': duration, 'start_time': start_time}
+            self._track_start(event)
+            self._submit(event)
+        return {'session_id': None, 'session_name': session_name, 'duration': duration, 'start_time': start_time}
+
+    def finish(self, user_id):
+        with self.active_lock:
+            sessions = self.active.get(user_id)
+            if not sessions:
+                return None
+            session = sessions.pop()
+            if not sessions:
+                del self.active[user_id]
+            end_time = datetime.now()
+            elapsed_time = (end_time - session['start_time']).total_seconds() / 60
+            self._submit({'type': "end", 'user_id': user_id, 'start_time': session['start_time'],
+                          'end_time': end_time, 'actual_duration': elapsed_time})
+        return {'session_id': None, 'session_name': session['session_name'],
+                'end_time': end_time, 'elapsed_minutes': elapsed_time}
+
+    def _apply(self, events):
+        # One transaction for the whole batch, with consecutive starts sent as
+        # one executemany. Ends are applied one at a time so that an end whose
+        # row is missing or already completed is not rolled up; order is kept
+        # so that an end only matches the row its own start inserted.
+        # Returns the users whose sessions were completed
+        cursor = self.db.cursor
+        stats = StatsRollup(self.db)
+        streaks = StreakEngine(self.db)
+        groups = GroupActivity(self.db)
+        completed = set()
+        for kind, run in groupby(events, key=lambda event: event['type']):
+            run = list(run)
+            if kind == "start":
+                cursor.executemany(
+                    "INSERT INTO study_sessions (user_id, session_name, duration, start_time, status) "
+                    "VALUES (%s, %s, %s, %s, %s)",
+                    [(event['user_id'], event['session_name'], event['duration'], event['start_time'], "In Progress")
+                     for event in run])
+                continue
+            for event in run:
+                cursor.execute(
+                    "UPDATE study_sessions SET end_time = %s, actual_duration = %s, status = %s "
+                    "WHERE user_id = %s AND status = %s AND start_time = %s",
+                    (event['end_time'], event['actual_duration'], "Completed", event['user_id'], "In Progress",
+                     event['start_time']))
+                if cursor.rowcount == 0:
+                    continue
+                stats.record_session(cursor, event['user_id'], event['actual_duration'], event['end_time'])
+                streaks.record_session(cursor, event['user_id'], event['end_time'])
+                groups.record_session(cursor, event['user_id'], event['actual_duration'], event['end_time'])
+                completed.add(event['user_id'])
+        cursor.execute(
+            self.backend.upsert("journal_checkpoints", ["journal", "applied_seq"], ["journal"],
+                                {"applied_seq": "{applied_seq}"}),
+            (self.name, events[-1]['seq']))
+        self.db.commit()
+        return completed
+
+    def _rollback(self):
+        try:
+            self.db.connection.rollback()
+        except Exception as e:
+            print(f"==> Session writer could not roll back: {e}", flush=True)
+
+    def flush(self):
+        with self.pending_lock:
+            events, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+        if not events:
+            return 0
+        try:
+            completed = self._apply(events)
+        except Exception as e:
+            self._rollback()
+            with self.pending_lock:
+                self.pending[:0] = events
+            print(f"==> Session writer will retry {len(events)} events: {e}", flush=True)
+            return 0
+        self.applied_seq = events[-1]['seq']
+        self.journal.compact(self.applied_seq)
+        if self.on_flush and completed:
+            # Ends the callback's transaction too, so that the next batch
+            # reads a fresh snapshot (MySQL defaults to REPEATABLE READ)
+            try:
+                self.on_flush(self.db, completed)
+                self.db.commit()
+            except Exception as e:
+                self._rollback()
+                print(f"==> Session writer's after-flush update failed: {e}", flush=True)
+        return len(events)
+
+    def _run(self):
+        while True:
+            with self.pending_lock:
+                if not self.pending and self.stopping:
+                    return
+                if len(self.pending) < self.batch_size and not self.stopping:
+                    self.pending_lock.wait(self.flush_interval)
+            if not self.flush():
+                with self.pending_lock:
+                    retry = bool(self.pending)
+                if retry:
+                    time.sleep(1)
+
+    def stop(self):
+        # Drains what is left, then closes the journal
+        with self.pending_lock:
+            self.stopping = True
+            self.pending_lock.notify()
+        if self.thread:
+            self.thread.join()
+        self.journal.close()
+        if self.db:
+            self.db.close()
+
@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+
+
+# Bounded, thread-safe mapping that evicts the least recently used entry.
+# The caches built on it keep extra state (generations, expiry times) under
+# the same lock by calling the _get/_put halves while holding it
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value)
+
+    def discard(self, key):
+        with self._lock:
+            return self.entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def _get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self._evicted(*self.entries.popitem(last=False))
+
+    def _evicted(self, key, value):
+        # Called with the lock held for each entry pushed out by _put
+        pass
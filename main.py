@@ -1,91 +1,205 @@
-import mysql.connector
-from mysql.connector import Error
-import hashlib
-from datetime import datetime, timedelta
-import requests
+import argparse
+import atexit
+import csv
+import heapq
+import json
+import re
+import signal
+import sys
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from functools import cached_property
+from itertools import chain
+from lru import LRUCache
+from storage import as_date, create_backend
+
+# Modules only some commands need (analytics, migrations, passwords,
+# profiling, quotes, scheduler, transfer) are imported where they are used,
+# so the interactive menu starts without loading them
 
 # Database connection class
 class Database:
-    def __init__(self):
-        try:
-            self.connection = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                port=3311,
-                password="",
-                database="studyspark"
-            )
-            self.cursor = self.connection.cursor(dictionary=True)
-        except Error as e:
-            print(f"Error connecting to MySQL: {e}")
-            exit(1)
+    def __init__(self, backend=None, profiler=None):
+        self.backend = backend or create_backend()
+        self.profiler = profiler
+        self._connection = None
+
+    @property
+    def connection(self):
+        # Opened by the first query, so a run that never touches the database
+        # never waits on it. A failed connect raises backend.Error; main()
+        # exits on it and the API server answers 503
+        if self._connection is None:
+            self._connection = self.backend.connect()
+        return self._connection
+
+    @property
+    def connected(self):
+        return self._connection is not None
+
+    @property
+    def cursor(self):
+        # Every access hands out a fresh cursor so managers never share one;
+        # it is only wrapped when profiling, so the default path costs nothing
+        cursor = self.backend.cursor(self.connection)
+        if self.profiler is None:
+            return cursor
+        from profiling import ProfiledCursor
+        return ProfiledCursor(cursor, self.profiler)
+
+    def begin_action(self, name):
+        if self.profiler is not None:
+            self.profiler.begin_action(name)
 
     def commit(self):
         self.connection.commit()
 
     def close(self):
-        self.cursor.close()
-        self.connection.close()
+        if self._connection is not None:
+            self.backend.release(self._connection)
+            self._connection = None
+
+# Logged-in user record
+class CurrentUser:
+    __slots__ = ("user_id", "username", "password", "streak", "points", "badge_count", "last_study_date")
+
+    def __init__(self, user_id, username, password, streak, points, badge_count, last_study_date):
+        self.user_id = user_id
+        self.username = username
+        self.password = password
+        self.streak = streak
+        self.points = points
+        self.badge_count = badge_count
+        self.last_study_date = last_study_date
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['user_id'], row['username'], row['password'], row['streak'],
+                   row['points'], row['badge_count'] or 0, row['last_study_date'])
+
+    # Lets callers keep using user['streak'] like they did with the raw row
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+# Small LRU cache of user rows keyed by username
+class UserCache(LRUCache):
+    def __init__(self, db, max_size=128):
+        super().__init__(max_size)
+        self.db = db
+
+    def get(self, username):
+        record = super().get(username)
+        if record is not None:
+            return record
+        cursor = self.db.cursor
+        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+        row = cursor.fetchone()
+        return self.put(row) if row else None
+
+    def put(self, row):
+        record = row if isinstance(row, CurrentUser) else CurrentUser.from_row(row)
+        with self._lock:
+            self._put(record.username, record)
+        return record
+
+    def update(self, username, **fields):
+        # Write-through for values we just stored ourselves
+        with self._lock:
+            record = self.entries.get(username)
+            if record is not None:
+                for name, value in fields.items():
+                    setattr(record, name, value)
+
+    def invalidate(self, username=None):
+        if username is None:
+            self.clear()
+        else:
+            self.discard(username)
 
 # User management class
 class User:
-    def __init__(self, db):
+    def __init__(self, db, leaderboard=None):
         self.db = db
         self.logged_in_user = None
+        self.cache = UserCache(db)
+        self.leaderboard = leaderboard
 
     def hash_password(self, password):
-        return hashlib.sha256(password.encode()).hexdigest()
+        from passwords import hash_password
+        return hash_password(password)
 
-    def register(self, username, password):
+    def create_account(self, username, password, hashed_password=None):
+        # Returns the new user_id, or None when the username is taken. Callers
+        # that hash off-thread pass the result in as hashed_password
         cursor = self.db.cursor
         cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
         if cursor.fetchone():
+            return None
+        hashed_password = hashed_password or self.hash_password(password)
+        cursor.execute(
+            "INSERT INTO users (username, password, streak, points, last_study_date) VALUES (%s, %s, %s, %s, %s)",
+            (username, hashed_password, 0, 0, None)
+        )
+        self.db.commit()
+        if self.leaderboard:
+            self.leaderboard.record({'user_id': cursor.lastrowid, 'username': username,
+                                     'streak': 0, 'points': 0, 'badge_count': 0})
+        return cursor.lastrowid
+
+    def register(self, username, password):
+        if self.create_account(username, password) is None:
             print("==> Username already exists. Please choose a different one.")
         else:
-            hashed_password = self.hash_password(password)
-            cursor.execute(
-                "INSERT INTO users (username, password, streak, points, last_study_date) VALUES (%s, %s, %s, %s, %s)",
-                (username, hashed_password, 0, 0, None)
-            )
-            self.db.commit()
             print(f"==> User '{username}' registered successfully!")
 
-    def login(self, username, password):
+    def find_account(self, username):
         cursor = self.db.cursor
-        hashed_password = self.hash_password(password)
-        cursor.execute("SELECT * FROM users WHERE username = %s AND password = %s", (username, hashed_password))
-        user = cursor.fetchone()
-        if not user:
+        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+        return cursor.fetchone()
+
+    def authenticate(self, username, password):
+        # Returns the user's record, or None
+        user = self.find_account(username)
+        from passwords import check_login
+        matches, upgraded = check_login(password, user['password'] if user else None)
+        if not matches:
+            return None
+        return self.complete_login(user, upgraded)
+
+    def complete_login(self, user, upgraded=None):
+        # upgraded replaces an outdated (e.g. legacy SHA-256) hash
+        if upgraded:
+            cursor = self.db.cursor
+            cursor.execute("UPDATE users SET password = %s WHERE user_id = %s", (upgraded, user['user_id']))
+            self.db.commit()
+            user = dict(user, password=upgraded)
+        return self.cache.put(user)
+
+    def login(self, username, password):
+        if not self.authenticate(username, password):
             print("==> Invalid username or password. Please try again.")
         else:
             self.logged_in_user = username
             print(f"==> User '{username}' logged in successfully!")
-            self.update_streak(username)
 
-    def update_streak(self, username):
-        cursor = self.db.cursor
-        cursor.execute("SELECT last_study_date, streak FROM users WHERE username = %s", (username,))
-        result = cursor.fetchone()
-        if result:
-            last_study_date = result['last_study_date']
-            streak = result['streak']
-            today = datetime.now().date()
-            if last_study_date:
-                if today == last_study_date + timedelta(days=1):
-                    streak += 1
-                elif today > last_study_date + timedelta(days=1):
-                    streak = 1
-            else:
-                streak = 1
-            cursor.execute(
-                "UPDATE users SET streak = %s, last_study_date = %s WHERE username = %s",
-                (streak, today, username)
-            )
-            self.db.commit()
+    def refresh(self, username):
+        # Re-reads a user whose row was changed by another manager and moves
+        # them on the leaderboard
+        self.cache.invalidate(username)
+        record = self.cache.get(username)
+        if record and self.leaderboard:
+            self.leaderboard.record(record)
+        return record
 
     def logout(self):
         if self.logged_in_user:
             print(f"==> User '{self.logged_in_user}' logged out successfully!")
+            self.cache.invalidate(self.logged_in_user)
             self.logged_in_user = None
         else:
             print("==> No user is currently logged in.")
@@ -96,53 +210,344 @@ class User:
     def get_current_user(self):
         if not self.logged_in_user:
             return None
+        return self.cache.get(self.logged_in_user)
+
+    def get_user_id(self):
+        current = self.get_current_user()
+        return current.user_id if current else None
+
+# Per-user study totals, kept up to date as sessions end
+class StatsRollup:
+    def __init__(self, db):
+        self.db = db
+
+    def record_session(self, cursor, user_id, minutes, end_time):
+        # Runs inside the caller's transaction
+        cursor.execute(
+            self.db.backend.upsert(
+                "user_stats", ["user_id", "total_minutes", "session_count", "last_session"], ["user_id"],
+                {"total_minutes": "total_minutes + {total_minutes}",
+                 "session_count": "session_count + 1",
+                 "last_session": "{last_session}"}),
+            (user_id, minutes, 1, end_time)
+        )
+
+    def reconcile(self, repair=False, chunk_size=1000):
+        # Compares the rollups (and users.badge_count) with the base tables
+        # one user_id range at a time; returns the ids that had drifted
         cursor = self.db.cursor
-        cursor.execute("SELECT * FROM users WHERE username = %s", (self.logged_in_user,))
-        return cursor.fetchone()
+        drifted = []
+        last_id = 0
+        while True:
+            cursor.execute(
+                "SELECT user_id, badge_count FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                (last_id, chunk_size)
+            )
+            users = cursor.fetchall()
+            if not users:
+                break
+            low, high = users[0]['user_id'], users[-1]['user_id']
+            last_id = high
+            cursor.execute("""
+                SELECT user_id, SUM(actual_duration) AS total_minutes, COUNT(*) AS session_count,
+                       MAX(end_time) AS last_session
+                FROM study_sessions WHERE user_id BETWEEN %s AND %s AND status = %s GROUP BY user_id
+            """, (low, high, "Completed"))
+            actual = {row['user_id']: row for row in cursor.fetchall()}
+            # Archived months count too; their sessions are older than any
+            # still in study_sessions
+            cursor.execute("""
+                SELECT user_id, SUM(actual_minutes) AS total_minutes, SUM(sessions) AS session_count,
+                       MAX(last_end) AS last_session
+                FROM session_archive WHERE user_id BETWEEN %s AND %s GROUP BY user_id
+            """, (low, high))
+            for row in cursor.fetchall():
+                hot = actual.get(row['user_id'])
+                actual[row['user_id']] = {
+                    'total_minutes': (row['total_minutes'] or 0) + ((hot['total_minutes'] or 0) if hot else 0),
+                    'session_count': row['session_count'] + (hot['session_count'] if hot else 0),
+                    'last_session': hot['last_session'] if hot else row['last_session'],
+                }
+            cursor.execute("SELECT * FROM user_stats WHERE user_id BETWEEN %s AND %s", (low, high))
+            stored = {row['user_id']: row for row in cursor.fetchall()}
+            cursor.execute(
+                "SELECT user_id, COUNT(*) AS badge_count FROM badges WHERE user_id BETWEEN %s AND %s GROUP BY user_id",
+                (low, high)
+            )
+            badges = {row['user_id']: row['badge_count'] for row in cursor.fetchall()}
 
-# Study session management class
-class StudySession:
+            stats_fixes = []
+            badge_fixes = []
+            for row in users:
+                user_id = row['user_id']
+                want = actual.get(user_id)
+                have = stored.get(user_id)
+                want_minutes = (want['total_minutes'] or 0) if want else 0
+                want_count = want['session_count'] if want else 0
+                have_minutes = (have['total_minutes'] or 0) if have else 0
+                have_count = have['session_count'] if have else 0
+                stats_drift = abs(want_minutes - have_minutes) > 0.01 or want_count != have_count
+                badge_drift = (row['badge_count'] or 0) != badges.get(user_id, 0)
+                if stats_drift:
+                    stats_fixes.append((user_id, want_minutes, want_count, want['last_session'] if want else None))
+                if badge_drift:
+                    badge_fixes.append((badges.get(user_id, 0), user_id))
+                if stats_drift or badge_drift:
+                    drifted.append(user_id)
+
+            if repair and (stats_fixes or badge_fixes):
+                if stats_fixes:
+                    cursor.executemany(
+                        self.db.backend.upsert(
+                            "user_stats", ["user_id", "total_minutes", "session_count", "last_session"],
+                            ["user_id"],
+                            {"total_minutes": "{total_minutes}", "session_count": "{session_count}",
+                             "last_session": "{last_session}"}),
+                        stats_fixes
+                    )
+                if badge_fixes:
+                    cursor.executemany("UPDATE users SET badge_count = %s WHERE user_id = %s", badge_fixes)
+                self.db.commit()
+        return drifted
+
+def mask_days(period, mask):
+    # The days of `period` set in a session_archive study_days bitmask
+    return [period.replace(day=bit + 1) for bit in range(31) if mask >> bit & 1]
+
+
+# Streaks are consecutive days with at least one completed session (by the
+# date it ended), and lapse once a full day passes without one
+class StreakEngine:
+    JOB = "streaks"
+
+    def __init__(self, db, chunk_size=1000):
+        self.db = db
+        self.chunk_size = chunk_size
+
+    def record_session(self, cursor, user_id, end_time):
+        # Runs inside the caller's transaction when a session ends
+        today = end_time.date()
+        cursor.execute("""
+            UPDATE users SET streak = CASE
+                WHEN last_study_date = %s AND streak > 0 THEN streak
+                WHEN last_study_date = %s THEN streak + 1
+                ELSE 1 END,
+            last_study_date = %s WHERE user_id = %s
+        """, (today, today - timedelta(days=1), today, user_id))
+
+    @staticmethod
+    def streak_for(days, as_of):
+        # days: the user's distinct study days, newest first
+        if not days or days[0] < as_of - timedelta(days=1):
+            return 0
+        streak = 1
+        for newer, older in zip(days, days[1:]):
+            if (newer - older).days != 1:
+                break
+            streak += 1
+        return streak
+
+    def _recompute(self, users, sessions, as_of, archived=()):
+        # users: rows with user_id, streak, last_study_date; sessions: rows of
+        # (user_id, study_day) ordered by user_id, study_day DESC; archived:
+        # session_archive rows with each month's study_days bitmask
+        days = {}
+        for row in sessions:
+            days.setdefault(row['user_id'], []).append(as_date(row['study_day']))
+        archived_days = {}
+        for row in archived:
+            archived_days.setdefault(row['user_id'], set()).update(mask_days(row['period'], row['study_days']))
+        for user_id, extra in archived_days.items():
+            days[user_id] = sorted(extra.union(days.get(user_id, ())), reverse=True)
+        updates = []
+        for user in users:
+            user_days = days.get(user['user_id'])
+            streak = self.streak_for(user_days, as_of)
+            last = user_days[0] if user_days else user['last_study_date']
+            if streak != user['streak'] or last != user['last_study_date']:
+                updates.append((streak, last, user['user_id']))
+        if updates:
+            self.db.cursor.executemany("UPDATE users SET streak = %s, last_study_date = %s WHERE user_id = %s",
+                                       updates)
+        self.db.commit()
+        return len(updates)
+
+    def watermark(self):
+        cursor = self.db.cursor
+        cursor.execute("SELECT watermark FROM job_watermarks WHERE job = %s", (self.JOB,))
+        row = cursor.fetchone()
+        return row['watermark'] if row else None
+
+    def _latest_end(self):
+        cursor = self.db.cursor
+        cursor.execute("SELECT MAX(end_time) AS latest FROM study_sessions WHERE status = %s", ("Completed",))
+        return cursor.fetchone()['latest']
+
+    def _save_watermark(self, mark):
+        if mark is not None:
+            self.db.cursor.execute(
+                self.db.backend.upsert("job_watermarks", ["job", "watermark"], ["job"], {"watermark": "{watermark}"}),
+                (self.JOB, mark))
+            self.db.commit()
+
+    def recompute_all(self, as_of=None):
+        # One pass over every user in user_id ranges, one transaction each;
+        # returns (users scanned, users changed)
+        as_of = as_of or datetime.now().date()
+        mark = self._latest_end()
+        cursor = self.db.cursor
+        scanned = changed = 0
+        last_id = 0
+        while True:
+            cursor.execute(
+                "SELECT user_id, streak, last_study_date FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                (last_id, self.chunk_size)
+            )
+            users = cursor.fetchall()
+            if not users:
+                break
+            last_id = users[-1]['user_id']
+            cursor.execute("""
+                SELECT user_id, DATE(end_time) AS study_day FROM study_sessions
+                WHERE user_id BETWEEN %s AND %s AND status = %s
+                GROUP BY user_id, DATE(end_time) ORDER BY user_id, study_day DESC
+            """, (users[0]['user_id'], last_id, "Completed"))
+            sessions = cursor.fetchall()
+            cursor.execute("SELECT user_id, period, study_days FROM session_archive WHERE user_id BETWEEN %s AND %s",
+                           (users[0]['user_id'], last_id))
+            changed += self._recompute(users, sessions, as_of, cursor.fetchall())
+            scanned += len(users)
+        self._save_watermark(mark)
+        return scanned, changed
+
+    def run_incremental(self, as_of=None):
+        # Recomputes only users with sessions that ended since the last run,
+        # then lapses streaks that missed yesterday in one statement
+        since = self.watermark()
+        if since is None:
+            return self.recompute_all(as_of)
+        as_of = as_of or datetime.now().date()
+        mark = self._latest_end()
+        cursor = self.db.cursor
+        cursor.execute(
+            "SELECT DISTINCT user_id FROM study_sessions WHERE status = %s AND end_time > %s AND end_time <= %s",
+            ("Completed", since, mark or since)
+        )
+        user_ids = sorted(row['user_id'] for row in cursor.fetchall())
+        changed = 0
+        for start in range(0, len(user_ids), self.chunk_size):
+            chunk = user_ids[start:start + self.chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(
+                f"SELECT user_id, streak, last_study_date FROM users WHERE user_id IN ({placeholders})", chunk)
+            users = cursor.fetchall()
+            cursor.execute(f"""
+                SELECT user_id, DATE(end_time) AS study_day FROM study_sessions
+                WHERE user_id IN ({placeholders}) AND status = %s
+                GROUP BY user_id, DATE(end_time) ORDER BY user_id, study_day DESC
+            """, chunk + ["Completed"])
+            sessions = cursor.fetchall()
+            cursor.execute(f"SELECT user_id, period, study_days FROM session_archive WHERE user_id IN ({placeholders})",
+                           chunk)
+            changed += self._recompute(users, sessions, as_of, cursor.fetchall())
+        cursor.execute("UPDATE users SET streak = 0 WHERE streak > 0 AND last_study_date < %s",
+                       (as_of - timedelta(days=1),))
+        changed += cursor.rowcount
+        self.db.commit()
+        self._save_watermark(mark)
+        return len(user_ids), changed
+
+# Weekly study totals per group: the sessions of its current members,
+# added to as members finish sessions and when someone joins
+class GroupActivity:
     def __init__(self, db):
         self.db = db
 
-    def start_session(self, user):
-        if not user.is_logged_in():
-            print("Please log in before starting a session.")
-            return
-        username = user.logged_in_user
+    @staticmethod
+    def week_of(moment):
+        return moment.date() - timedelta(days=moment.weekday())
+
+    def _add(self, cursor, totals):
+        # totals: (group_id, week, minutes, sessions) rows to add
+        cursor.executemany(
+            self.db.backend.upsert(
+                "group_weekly_totals", ["group_id", "week", "total_minutes", "session_count"], ["group_id", "week"],
+                {"total_minutes": "total_minutes + {total_minutes}", "session_count": "session_count + {session_count}"}),
+            totals)
+
+    def record_session(self, cursor, user_id, minutes, end_time):
+        # Runs inside the caller's transaction
+        cursor.execute("SELECT group_id FROM group_members WHERE user_id = %s", (user_id,))
+        group_ids = [row['group_id'] for row in cursor.fetchall()]
+        if group_ids:
+            self._add(cursor, [(group_id, self.week_of(end_time), minutes, 1) for group_id in group_ids])
+
+    def record_join(self, cursor, group_id, user_id):
+        # Runs inside the caller's transaction: brings the new member's
+        # completed sessions into the group's weeks
+        cursor.execute("SELECT end_time, actual_duration FROM study_sessions WHERE status = %s AND user_id = %s",
+                       ("Completed", user_id))
+        weeks = {}
+        for row in cursor.fetchall():
+            week = weeks.setdefault(self.week_of(row['end_time']), [0.0, 0])
+            week[0] += row['actual_duration'] or 0
+            week[1] += 1
+        if weeks:
+            self._add(cursor, [(group_id, week, minutes, count) for week, (minutes, count) in weeks.items()])
+
+    def weekly(self, group_id, weeks=4, now=None):
+        # The last `weeks` weeks up to the current one, oldest first
+        current = self.week_of(now or datetime.now())
+        first = current - timedelta(weeks=weeks - 1)
         cursor = self.db.cursor
-        cursor.execute("SELECT user_id FROM users WHERE username = %s", (username,))
-        user_id = cursor.fetchone()['user_id']
-        
-        session_name = input("Enter the study session name: ")
-        duration = int(input("Enter the duration of the session in minutes: "))
+        cursor.execute(
+            "SELECT week, total_minutes, session_count FROM group_weekly_totals WHERE group_id = %s AND week >= %s",
+            (group_id, first))
+        totals = {as_date(row['week']): row for row in cursor.fetchall()}
+        weekly = []
+        for i in range(weeks):
+            week = first + timedelta(weeks=i)
+            row = totals.get(week)
+            weekly.append({'week': week, 'minutes': round(row['total_minutes'] or 0, 2) if row else 0,
+                           'sessions': row['session_count'] if row else 0})
+        return weekly
+
+# Study session management class
+class StudySession:
+    def __init__(self, db, quote_provider=None, journal=None):
+        # journal: an optional journal.SessionWriter that takes over begin/finish
+        self.db = db
+        self.quote_provider = quote_provider
+        self.journal = journal
+        self.stats = StatsRollup(db)
+        self.streaks = StreakEngine(db)
+        self.group_activity = GroupActivity(db)
+
+    def begin(self, user_id, session_name, duration):
+        if self.journal:
+            return self.journal.begin(user_id, session_name, duration)
         start_time = datetime.now()
-        
+        cursor = self.db.cursor
         cursor.execute(
             "INSERT INTO study_sessions (user_id, session_name, duration, start_time, status) VALUES (%s, %s, %s, %s, %s)",
             (user_id, session_name, duration, start_time, "In Progress")
         )
         self.db.commit()
-        print(f"\nSession '{session_name}' has started for {username}.")
-        print(f"Duration: {duration} minutes. Stay focused!")
+        return {'session_id': cursor.lastrowid, 'session_name': session_name,
+                'duration': duration, 'start_time': start_time}
 
-    def end_session(self, user):
-        if not user.is_logged_in():
-            print("Please log in before ending a session.")
-            return
-        username = user.logged_in_user
+    def finish(self, user_id):
+        # Completes the user's latest running session; None if there is none
+        if self.journal:
+            return self.journal.finish(user_id)
         cursor = self.db.cursor
-        cursor.execute("SELECT user_id FROM users WHERE username = %s", (username,))
-        user_id = cursor.fetchone()['user_id']
-        
         cursor.execute(
             "SELECT * FROM study_sessions WHERE user_id = %s AND status = %s ORDER BY start_time DESC LIMIT 1",
             (user_id, "In Progress")
         )
         session = cursor.fetchone()
         if not session:
-            print("No active study session found.")
-            return
+            return None
         
         end_time = datetime.now()
         elapsed_time = (end_time - session['start_time']).total_seconds() / 60
@@ -151,23 +556,107 @@ class StudySession:
             "UPDATE study_sessions SET end_time = %s, actual_duration = %s, status = %s WHERE session_id = %s",
             (end_time, elapsed_time, "Completed", session['session_id'])
         )
+        self.stats.record_session(cursor, user_id, elapsed_time, end_time)
+        self.streaks.record_session(cursor, user_id, end_time)
+        self.group_activity.record_session(cursor, user_id, elapsed_time, end_time)
         self.db.commit()
+        return {'session_id': session['session_id'], 'session_name': session['session_name'],
+                'end_time': end_time, 'elapsed_minutes': elapsed_time}
+
+    def start_session(self, user):
+        if not user.is_logged_in():
+            print("Please log in before starting a session.")
+            return
+        
+        session_name = input("Enter the study session name: ")
+        duration = int(input("Enter the duration of the session in minutes: "))
+        self.begin(user.get_user_id(), session_name, duration)
+        print(f"\nSession '{session_name}' has started for {user.logged_in_user}.")
+        print(f"Duration: {duration} minutes. Stay focused!")
+
+    def end_session(self, user):
+        if not user.is_logged_in():
+            print("Please log in before ending a session.")
+            return
+        
+        session = self.finish(user.get_user_id())
+        if not session:
+            print("No active study session found.")
+            return
+        user.refresh(user.logged_in_user)
         print(f"\nSession '{session['session_name']}' completed!")
-        print(f"Total time spent: {elapsed_time:.2f} minutes.")
+        print(f"Total time spent: {session['elapsed_minutes']:.2f} minutes.")
+
+    def iter_sessions(self, user_id, status=None, since=None, until=None, page_size=200):
+        # The user's history in (start_time, session_id) order: archived
+        # months read from their shards, merged with study_sessions
+        hot = self._hot_sessions(user_id, status, since, until, page_size)
+        if status and status != "Completed":
+            return hot
+        from archive import SessionArchive
+        shards = SessionArchive(self.db).user_sessions(user_id, since, until)
+        if not shards:
+            return hot
+        return heapq.merge(*shards, hot, key=lambda session: (session['start_time'], session['session_id']))
+
+    def _hot_sessions(self, user_id, status=None, since=None, until=None, page_size=200):
+        # Keyset pagination on (start_time, session_id): each page is a short
+        # indexed range read, so memory stays flat however long the history is
+        filters = ["user_id = %s"]
+        params = [user_id]
+        if status:
+            filters.append("status = %s")
+            params.append(status)
+        if since:
+            filters.append("start_time >= %s")
+            params.append(since)
+        if until:
+            filters.append("start_time < %s")
+            params.append(until)
+        where = " AND ".join(filters)
+        cursor = self.db.cursor
+        cursor.execute(f"SELECT * FROM study_sessions WHERE {where} ORDER BY start_time, session_id LIMIT %s",
+                       params + [page_size])
+        while True:
+            page = cursor.fetchall()
+            for session in page:
+                yield session
+            if len(page) < page_size:
+                return
+            last = page[-1]
+            cursor.execute(
+                f"SELECT * FROM study_sessions WHERE {where} "
+                "AND (start_time > %s OR (start_time = %s AND session_id > %s)) "
+                "ORDER BY start_time, session_id LIMIT %s",
+                params + [last['start_time'], last['start_time'], last['session_id'], page_size]
+            )
+
+    def export_sessions(self, user_id, output, fmt="csv", **filters):
+        # Streams the filtered history to an open text file, returns the row count
+        columns = ["session_id", "session_name", "duration", "start_time", "end_time",
+                   "actual_duration", "status"]
+        writer = csv.writer(output) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+        count = 0
+        for session in self.iter_sessions(user_id, **filters):
+            if writer:
+                writer.writerow([session[column] for column in columns])
+            else:
+                output.write(json.dumps({column: session[column] for column in columns}, default=str) + "\n")
+            count += 1
+        return count
 
-    def view_all_sessions(self, user):
+    def view_all_sessions(self, user, status=None, since=None, until=None):
         if not user.is_logged_in():
             print("==> Please log in to view your sessions.")
             return
-        username = user.logged_in_user
-        cursor = self.db.cursor
-        cursor.execute("SELECT user_id FROM users WHERE username = %s", (username,))
-        user_id = cursor.fetchone()['user_id']
+        user_id = user.get_user_id()
         
-        cursor.execute("SELECT * FROM study_sessions WHERE user_id = %s", (user_id,))
-        sessions = cursor.fetchall()
+        sessions = self.iter_sessions(user_id, status, since, until)
+        first = next(sessions, None)
         
-        if not sessions:
+        if not first:
             print("==> No sessions found.")
             return
         
@@ -175,7 +664,7 @@ class StudySession:
         print("{:<5} {:<20} {:<25} {:<25} {:<15} {:<10}".format(
             "No.", "Name", "Start Time", "End Time", "Duration", "Status"))
         
-        for i, session in enumerate(sessions, 1):
+        for i, session in enumerate(chain([first], sessions), 1):
             start_time = session['start_time'].strftime("%Y-%m-%d %H:%M:%S") if session['start_time'] else "N/A"
             end_time = session['end_time'].strftime("%Y-%m-%d %H:%M:%S") if session['end_time'] else "N/A"
             duration = f"{session['actual_duration']:.2f} min" if session['actual_duration'] else "N/A"
@@ -183,76 +672,161 @@ class StudySession:
                 i, session['session_name'], start_time, end_time, duration, session['status']))
 
     def get_encouragement(self):
-        try:
-            response = requests.get("https://api.quotable.io/random?tags=inspirational")
-            if response.status_code == 200:
-                data = response.json()
-                return f"\n==> Encouragement: {data['content']} - {data['author']}\n"
-        except requests.exceptions.RequestException:
-            pass
+        if self.quote_provider is None:
+            from quotes import create_provider
+            self.quote_provider = create_provider()
+        quote = self.quote_provider.get()
+        if quote:
+            return f"\n==> Encouragement: {quote['content']} - {quote['author']}\n"
         return "\n==> Keep going! Your hard work will pay off.\n"
 
+# Badge thresholds: (badge name, user field, minimum value)
+BADGE_RULES = [
+    ("7-Day Streak", "streak", 7),
+    ("30-Day Streak", "streak", 30),
+    ("1000 Points", "points", 1000),
+]
+
+# Badge evaluation engine
+class BadgeEngine:
+    def __init__(self, db, rules=None):
+        self.db = db
+        self.rules = rules or BADGE_RULES
+
+    def earned(self, user, owned):
+        return [name for name, field, threshold in self.rules
+                if (user[field] or 0) >= threshold and name not in owned]
+
+    def award(self, cursor, awards):
+        # awards is a list of (user_id, badge_name) pairs; the unique
+        # (user_id, badge_name) index makes repeats a no-op
+        if not awards:
+            return
+        cursor.executemany(f"{self.db.backend.insert_ignore} INTO badges (user_id, badge_name) VALUES (%s, %s)",
+                           awards)
+        user_ids = sorted({user_id for user_id, _ in awards})
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        cursor.execute(f"""
+            UPDATE users SET badge_count = (
+                SELECT COUNT(*) FROM badges WHERE badges.user_id = users.user_id
+            ) WHERE user_id IN ({placeholders})
+        """, user_ids)
+
+    def evaluate(self, user, owned=None):
+        cursor = self.db.cursor
+        if owned is None:
+            cursor.execute("SELECT badge_name FROM badges WHERE user_id = %s", (user['user_id'],))
+            owned = {row['badge_name'] for row in cursor.fetchall()}
+        new_badges = self.earned(user, owned)
+        if new_badges:
+            self.award(cursor, [(user['user_id'], badge) for badge in new_badges])
+            self.db.commit()
+        return new_badges
+
+    def evaluate_all(self, chunk_size=1000):
+        # Scores every user in user_id order, one transaction per chunk
+        cursor = self.db.cursor
+        last_id = 0
+        scored = 0
+        awarded = 0
+        while True:
+            cursor.execute(
+                "SELECT user_id, streak, points FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                (last_id, chunk_size)
+            )
+            users = cursor.fetchall()
+            if not users:
+                break
+            last_id = users[-1]['user_id']
+            placeholders = ", ".join(["%s"] * len(users))
+            cursor.execute(
+                f"SELECT user_id, badge_name FROM badges WHERE user_id IN ({placeholders})",
+                [row['user_id'] for row in users]
+            )
+            owned = {}
+            for row in cursor.fetchall():
+                owned.setdefault(row['user_id'], set()).add(row['badge_name'])
+            awards = []
+            for row in users:
+                for badge in self.earned(row, owned.get(row['user_id'], ())):
+                    awards.append((row['user_id'], badge))
+            self.award(cursor, awards)
+            self.db.commit()
+            scored += len(users)
+            awarded += len(awards)
+        return scored, awarded
+
 # Progress report class
 class ProgressReport:
     def __init__(self, user_manager, session_manager, db):
         self.user_manager = user_manager
         self.session_manager = session_manager
         self.db = db
+        self.badge_engine = BadgeEngine(db)
     
+    def build_report(self, username):
+        cursor = self.db.cursor
+        cursor.execute("""
+            SELECT u.*, s.total_minutes,
+                   (SELECT GROUP_CONCAT(b.badge_name) FROM badges b WHERE b.user_id = u.user_id) AS badge_names
+            FROM users u
+            LEFT JOIN user_stats s ON s.user_id = u.user_id
+            WHERE u.username = %s
+        """, (username,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        
+        user = self.user_manager.cache.put(row)
+        badges = row['badge_names'].split(",") if row['badge_names'] else []
+        new_badges = self.award_badges(user, set(badges))
+        return {
+            'username': user['username'],
+            'streak': user['streak'],
+            'points': user['points'],
+            'badges': badges,
+            'new_badges': new_badges,
+            'total_minutes': row['total_minutes'] or 0,
+            'message': self.generate_personalized_message(user),
+        }
+
     def view_report(self):
         if not self.user_manager.is_logged_in():
             print("==> Please log in to view your progress report.")
             return
         
-        user = self.user_manager.get_current_user()
-        if not user:
+        report = self.build_report(self.user_manager.logged_in_user)
+        if not report:
             return
         
-        cursor = self.db.cursor
-        cursor.execute("SELECT badge_name FROM badges WHERE user_id = %s", (user['user_id'],))
-        badges = [row['badge_name'] for row in cursor.fetchall()]
-        
-        cursor.execute("SELECT SUM(actual_duration) as total FROM study_sessions WHERE user_id = %s AND status = %s", 
-                       (user['user_id'], "Completed"))
-        total_minutes = cursor.fetchone()['total'] or 0
-        hours = int(total_minutes // 60)
-        minutes = int(total_minutes % 60)
+        badges = report['badges']
+        hours = int(report['total_minutes'] // 60)
+        minutes = int(report['total_minutes'] % 60)
         
         print("\n=== YOUR PROGRESS REPORT ===")
-        print(f"Current Streak: {user['streak']} days")
-        print(f"Total Points: {user['points']}")
+        print(f"Current Streak: {report['streak']} days")
+        print(f"Total Points: {report['points']}")
         print(f"Badges Earned: {', '.join(badges) if badges else 'None'}")
         print(f"Total Study Time: {hours} hours and {minutes} minutes")
         
-        self.check_badges(user)
+        if report['new_badges']:
+            print(f"\n==> New Badges Earned: {', '.join(report['new_badges'])}")
         
         print("\n=== PERSONALIZED MESSAGE ===")
-        print(self.generate_personalized_message(user))
+        print(report['message'])
     
-    def check_badges(self, user):
-        cursor = self.db.cursor
-        new_badges = []
-        
-        if user['streak'] >= 7:
-            cursor.execute("SELECT * FROM badges WHERE user_id = %s AND badge_name = %s", (user['user_id'], "7-Day Streak"))
-            if not cursor.fetchone():
-                new_badges.append("7-Day Streak")
-        
-        if user['streak'] >= 30:
-            cursor.execute("SELECT * FROM badges WHERE user_id = %s AND badge_name = %s", (user['user_id'], "30-Day Streak"))
-            if not cursor.fetchone():
-                new_badges.append("30-Day Streak")
-        
-        if user['points'] >= 1000:
-            cursor.execute("SELECT * FROM badges WHERE user_id = %s AND badge_name = %s", (user['user_id'], "1000 Points"))
-            if not cursor.fetchone():
-                new_badges.append("1000 Points")
-        
-        for badge in new_badges:
-            cursor.execute("INSERT INTO badges (user_id, badge_name) VALUES (%s, %s)", (user['user_id'], badge))
+    def award_badges(self, user, owned=None):
+        new_badges = self.badge_engine.evaluate(user, owned)
         
         if new_badges:
-            self.db.commit()
+            self.user_manager.cache.update(user['username'], badge_count=user['badge_count'] + len(new_badges))
+            if self.user_manager.leaderboard:
+                self.user_manager.leaderboard.record(user)
+        return new_badges
+
+    def check_badges(self, user, owned=None):
+        new_badges = self.award_badges(user, owned)
+        if new_badges:
             print(f"\n==> New Badges Earned: {', '.join(new_badges)}")
     
     def generate_personalized_message(self, user):
@@ -274,9 +848,7 @@ class ProgressReport:
         else:
             messages.append(f"With {user['points']} points, you're showing serious dedication!")
         
-        cursor = self.db.cursor
-        cursor.execute("SELECT COUNT(*) as count FROM badges WHERE user_id = %s", (user['user_id'],))
-        badge_count = cursor.fetchone()['count']
+        badge_count = user['badge_count']
         
         if badge_count == 0:
             messages.append("Complete challenges to earn your first badge!")
@@ -285,105 +857,550 @@ class ProgressReport:
         
         return " ".join(messages)
 
-# Leaderboard class
+# In-process ranking index, kept sorted by (streak, points, badges)
+class LeaderboardIndex:
+    def __init__(self):
+        self.keys = []
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(user_id, streak, points, badge_count):
+        # Negated so that ascending order is the leaderboard order. Ties go
+        # to the higher user_id, the order a backward scan of
+        # idx_users_ranking returns them in
+        return (-(streak or 0), -(points or 0), -(badge_count or 0), -user_id)
+
+    def load(self, rows):
+        self.entries = {}
+        for row in rows:
+            key = self.make_key(row['user_id'], row['streak'], row['points'], row['badge_count'])
+            self.entries[row['user_id']] = (key, row['username'])
+        self.keys = sorted(key for key, _ in self.entries.values())
+
+    def update(self, user_id, username, streak, points, badge_count):
+        with self.lock:
+            old = self.entries.get(user_id)
+            if old:
+                del self.keys[bisect_left(self.keys, old[0])]
+            key = self.make_key(user_id, streak, points, badge_count)
+            insort(self.keys, key)
+            self.entries[user_id] = (key, username)
+
+    def remove(self, user_id):
+        with self.lock:
+            old = self.entries.pop(user_id, None)
+            if old:
+                del self.keys[bisect_left(self.keys, old[0])]
+
+    def top(self, limit=10, offset=0):
+        leaders = []
+        with self.lock:
+            keys = self.keys[offset:offset + limit]
+            names = [self.entries[-key[3]][1] for key in keys]
+        for key, username in zip(keys, names):
+            leaders.append({
+                'user_id': -key[3],
+                'username': username,
+                'streak': -key[0],
+                'points': -key[1],
+                'badge_count': -key[2],
+            })
+        return leaders
+
+    def rank(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if not entry:
+                return None
+            return bisect_left(self.keys, entry[0]) + 1
+
+    def __len__(self):
+        return len(self.keys)
+
+# Leaderboard class. Without an index (the CLI, one process per run) the
+# ranking is read through idx_users_ranking; the API server loads a
+# LeaderboardIndex once and keeps it current in memory
 class Leaderboard:
-    def __init__(self, db):
+    def __init__(self, db, index=None, group_boards=None):
+        # Pass a loaded index to share one ranking between several handles,
+        # and a GroupBoards cache to keep group standings current as well
         self.db = db
-    
-    def view_leaderboard(self):
+        self.index = index
+        self.group_boards = group_boards
+
+    def load_index(self):
+        cursor = self.db.cursor
+        cursor.execute("SELECT user_id, username, streak, points, badge_count FROM users")
+        index = LeaderboardIndex()
+        index.load(cursor.fetchall())
+        self.index = index
+        return index
+
+    def record(self, user):
+        # Called whenever a user's streak, points or badge count changes
+        if self.index is not None:
+            self.index.update(user['user_id'], user['username'], user['streak'],
+                              user['points'], user['badge_count'])
+        if self.group_boards is not None:
+            self.group_boards.update(user)
+
+    def refresh_users(self, user_ids):
+        # Re-reads users changed outside this process's managers
+        if (self.index is None and self.group_boards is None) or not user_ids:
+            return
+        user_ids = list(user_ids)
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        cursor = self.db.cursor
+        cursor.execute(
+            f"SELECT user_id, username, streak, points, badge_count FROM users WHERE user_id IN ({placeholders})",
+            user_ids)
+        for row in cursor.fetchall():
+            self.record(row)
+
+    def top(self, limit=10, offset=0):
+        if self.index is not None:
+            return self.index.top(limit, offset)
         cursor = self.db.cursor
         cursor.execute("""
-            SELECT u.username, u.streak, u.points, COUNT(b.badge_id) as badge_count
-            FROM users u
-            LEFT JOIN badges b ON u.user_id = b.user_id
-            GROUP BY u.user_id
-            ORDER BY u.streak DESC, u.points DESC, badge_count DESC
-            LIMIT 10
+            SELECT user_id, username, streak, points, badge_count FROM users
+            ORDER BY streak DESC, points DESC, badge_count DESC, user_id DESC
+            LIMIT %s OFFSET %s
+        """, (limit, offset))
+        return cursor.fetchall()
+
+    def rank(self, user_id):
+        if self.index is not None:
+            return self.index.rank(user_id)
+        cursor = self.db.cursor
+        cursor.execute("SELECT streak, points, badge_count FROM users WHERE user_id = %s", (user_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        # Everyone ahead in leaderboard order, counted over the index
+        cursor.execute(
+            "SELECT COUNT(*) AS ahead FROM users WHERE (streak, points, badge_count, user_id) > (%s, %s, %s, %s)",
+            (row['streak'] or 0, row['points'] or 0, row['badge_count'] or 0, user_id))
+        return cursor.fetchone()['ahead'] + 1
+
+    def total(self):
+        if self.index is not None:
+            return len(self.index)
+        cursor = self.db.cursor
+        cursor.execute("SELECT COUNT(*) AS users FROM users")
+        return cursor.fetchone()['users']
+
+    def rebuild(self):
+        # Recomputes the denormalized badge counts and reloads the ranking
+        cursor = self.db.cursor
+        cursor.execute("""
+            UPDATE users SET badge_count = (
+                SELECT COUNT(*) FROM badges WHERE badges.user_id = users.user_id
+            )
         """)
-        leaders = cursor.fetchall()
+        self.db.commit()
+        if self.index is not None:
+            self.load_index()
+        return self.total()
+
+    def standings(self, user_id=None, page=1, page_size=10):
+        offset = (page - 1) * page_size
+        leaders = self.top(page_size, offset)
+        for rank, leader in enumerate(leaders, offset + 1):
+            leader['rank'] = rank
+        return {
+            'leaders': leaders,
+            'rank': self.rank(user_id) if user_id is not None else None,
+            'total': self.total(),
+        }
+
+    def view_leaderboard(self, user=None, page=1, page_size=10):
+        user_id = user.get_user_id() if user is not None and user.is_logged_in() else None
+        standings = self.standings(user_id, page, page_size)
         
         print("\n=== LEADERBOARD ===")
         print("{:<5} {:<20} {:<10} {:<10} {:<20}".format(
             "Rank", "Username", "Streak", "Points", "Badges"))
         
-        for rank, leader in enumerate(leaders, 1):
+        for leader in standings['leaders']:
             print("{:<5} {:<20} {:<10} {:<10} {:<20}".format(
-                rank, leader['username'], leader['streak'], leader['points'], leader['badge_count']))
+                leader['rank'], leader['username'], leader['streak'], leader['points'], leader['badge_count']))
+
+        if standings['rank']:
+            print(f"\nYour Rank: {standings['rank']} of {standings['total']}")
+
+# Newest resources kept per group by the resource cache
+RESOURCE_PAGE = 100
+
+# Bounded LRU of each group's newest resources, shared between StudyGroup
+# handles. Readers take a token before querying so that a list fetched
+# before an invalidation is never stored after it
+class ResourceCache(LRUCache):
+    def __init__(self, max_size=256):
+        super().__init__(max_size)
+        self.generations = {}
+
+    def token(self, group_id):
+        with self._lock:
+            return self.generations.get(group_id, 0)
+
+    def put(self, group_id, rows, token):
+        with self._lock:
+            if self.generations.get(group_id, 0) == token:
+                self._put(group_id, rows)
+
+    def invalidate(self, group_id):
+        with self._lock:
+            self.entries.pop(group_id, None)
+            self.generations[group_id] = self.generations.get(group_id, 0) + 1
+
+# Weeks of group totals shown with a group's standings
+GROUP_WEEKS = 4
+
+# Bounded LRU of group standings: each board ranks a group's members in a
+# LeaderboardIndex and carries its recent weekly totals. Leaderboard.record
+# and StudyGroup.join keep cached boards current, so a cached group is
+# served without a query. As with ResourceCache, each group has a
+# generation and a board read while its group changed is used once but not
+# stored. Groups that are not cached have no membership here, so changed
+# users are also remembered (the last max_changes of them) and checked
+# against a board's members when it is stored
+class GroupBoards(LRUCache):
+    def __init__(self, max_size=256, max_changes=4096):
+        super().__init__(max_size)
+        self.max_changes = max_changes
+        self.memberships = {}
+        self.generations = {}
+        self.changed = OrderedDict()
+        self.seq = 0
+        self.horizon = 0
+
+    def token(self, group_id):
+        with self._lock:
+            return self.generations.get(group_id, 0), self.seq
+
+    def _evicted(self, group_id, board):
+        for user_id in board['index'].entries:
+            groups = self.memberships.get(user_id)
+            if groups is not None:
+                groups.discard(group_id)
+                if not groups:
+                    del self.memberships[user_id]
+
+    def _bump(self, group_id):
+        self.generations[group_id] = self.generations.get(group_id, 0) + 1
+
+    def put(self, group_id, board, token):
+        generation, seq = token
+        with self._lock:
+            if self.generations.get(group_id, 0) != generation or group_id in self.entries:
+                return
+            # Changes older than the horizon are forgotten, so a board read
+            # before it can't be checked
+            if seq < self.horizon or any(self.changed.get(user_id, 0) > seq for user_id in board['index'].entries):
+                return
+            for user_id in board['index'].entries:
+                self.memberships.setdefault(user_id, set()).add(group_id)
+            self._put(group_id, board)
+
+    def set_weekly(self, group_id, weekly, token):
+        with self._lock:
+            board = self.entries.get(group_id)
+            if board is not None and self.generations.get(group_id, 0) == token[0]:
+                board['weekly'] = weekly
+
+    def update(self, user):
+        # A user's standing changed, usually because they finished a session,
+        # so the weekly totals of their groups are stale too
+        with self._lock:
+            self.seq += 1
+            self.changed[user['user_id']] = self.seq
+            self.changed.move_to_end(user['user_id'])
+            while len(self.changed) > self.max_changes:
+                self.horizon = self.changed.popitem(last=False)[1]
+            for group_id in self.memberships.get(user['user_id'], ()):
+                self._bump(group_id)
+                board = self.entries[group_id]
+                board['index'].update(user['user_id'], user['username'], user['streak'],
+                                      user['points'], user['badge_count'])
+                board['weekly'] = None
+
+    def add_member(self, group_id, user):
+        with self._lock:
+            self._bump(group_id)
+            board = self.entries.get(group_id)
+            if board is None:
+                return
+            board['index'].update(user['user_id'], user['username'], user['streak'],
+                                  user['points'], user['badge_count'])
+            board['weekly'] = None
+            self.memberships.setdefault(user['user_id'], set()).add(group_id)
 
 # Study group management class
 class StudyGroup:
-    def __init__(self, db):
+    def __init__(self, db, resource_cache=None, group_boards=None):
         self.db = db
+        self.resource_cache = resource_cache or ResourceCache()
+        self.group_boards = group_boards or GroupBoards()
+        self.activity = GroupActivity(db)
 
-    def create_group(self, user):
-        if not user.is_logged_in():
-            print("==> Please log in to create a study group.")
-            return
-        group_name = input("Enter the study group name: ")
+    def create(self, creator_id, group_name):
         cursor = self.db.cursor
-        cursor.execute("SELECT user_id FROM users WHERE username = %s", (user.logged_in_user,))
-        creator_id = cursor.fetchone()['user_id']
         cursor.execute("INSERT INTO study_groups (group_name, creator_id) VALUES (%s, %s)", (group_name, creator_id))
         self.db.commit()
-        print(f"==> Study group '{group_name}' created successfully!")
+        return cursor.lastrowid
 
-    def view_groups(self):
+    def list_groups(self, after_id=0, limit=20):
+        # Keyset pages on group_id; member_count is maintained by join()
         cursor = self.db.cursor
         cursor.execute("""
-            SELECT g.group_id, g.group_name, u.username as creator, COUNT(m.user_id) as members 
-            FROM study_groups g 
-            LEFT JOIN group_members m ON g.group_id = m.group_id 
-            JOIN users u ON g.creator_id = u.user_id 
-            GROUP BY g.group_id
-        """)
+            SELECT g.group_id, g.group_name, u.username as creator, g.member_count as members
+            FROM study_groups g
+            JOIN users u ON g.creator_id = u.user_id
+            WHERE g.group_id > %s ORDER BY g.group_id LIMIT %s
+        """, (after_id, limit))
+        return cursor.fetchall()
+
+    def _name_match(self, term):
+        # (query, parameter) for the full-text index, or None when the term
+        # is too short for it
+        if self.db.backend.dialect == "mysql":
+            words = re.findall(r"\w+", term)
+            if not words:
+                return None
+            return ("""
+                SELECT g.group_id, g.group_name, u.username as creator, g.member_count as members
+                FROM study_groups g
+                JOIN users u ON g.creator_id = u.user_id
+                WHERE MATCH (g.group_name) AGAINST (%s IN BOOLEAN MODE) LIMIT %s
+            """, " ".join(f"+{word}*" for word in words))
+        if len(term) < 3:
+            return None
+        return ("""
+            SELECT g.group_id, g.group_name, u.username as creator, g.member_count as members
+            FROM study_groups g
+            JOIN users u ON g.creator_id = u.user_id
+            WHERE g.group_id IN (SELECT rowid FROM study_groups_fts WHERE study_groups_fts MATCH %s)
+            ORDER BY g.group_id LIMIT %s
+        """, '"%s"' % term.replace('"', '""'))
+
+    def search(self, term, limit=20):
+        # Name prefix matches first (read in idx_groups_name order, without a
+        # sort), then matches anywhere in the name
+        term = term.strip()
+        if not term:
+            return []
+        pattern = term.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+        cursor = self.db.cursor
+        cursor.execute("""
+            SELECT g.group_id, g.group_name, u.username as creator, g.member_count as members
+            FROM study_groups g
+            JOIN users u ON g.creator_id = u.user_id
+            WHERE g.group_name LIKE %s ESCAPE '!' LIMIT %s
+        """, (pattern, limit))
         groups = cursor.fetchall()
+        match = self._name_match(term) if len(groups) < limit else None
+        if match:
+            query, parameter = match
+            seen = {group['group_id'] for group in groups}
+            cursor.execute(query, (parameter, limit + len(groups)))
+            groups += [group for group in cursor.fetchall() if group['group_id'] not in seen][:limit - len(groups)]
+        return groups
+
+    def join(self, group_id, user_id):
+        # False when the user is already a member, None when there is no
+        # such group (INSERT IGNORE would hide the foreign key error on MySQL)
+        group_id = int(group_id)
+        cursor = self.db.cursor
+        cursor.execute("SELECT group_id FROM study_groups WHERE group_id = %s", (group_id,))
+        if not cursor.fetchone():
+            return None
+        cursor.execute(f"{self.db.backend.insert_ignore} INTO group_members (group_id, user_id) VALUES (%s, %s)",
+                       (group_id, user_id))
+        if cursor.rowcount == 0:
+            return False
+        cursor.execute("UPDATE study_groups SET member_count = member_count + 1 WHERE group_id = %s", (group_id,))
+        self.activity.record_join(cursor, group_id, user_id)
+        self.db.commit()
+        self.resource_cache.invalidate(group_id)
+        cursor.execute("SELECT user_id, username, streak, points, badge_count FROM users WHERE user_id = %s",
+                       (user_id,))
+        self.group_boards.add_member(group_id, cursor.fetchone())
+        return True
+
+    def share(self, group_id, user_id, resource_name, resource_link):
+        # False when the user is not a member of the group
+        group_id = int(group_id)
+        cursor = self.db.cursor
+        cursor.execute("SELECT * FROM group_members WHERE group_id = %s AND user_id = %s", (group_id, user_id))
+        if not cursor.fetchone():
+            return False
+        cursor.execute("INSERT INTO group_resources (group_id, resource_name, resource_link) VALUES (%s, %s, %s)", 
+                       (group_id, resource_name, resource_link))
+        self.db.commit()
+        self.resource_cache.invalidate(group_id)
+        return True
+
+    def resources(self, group_id, limit=RESOURCE_PAGE):
+        # Newest first; lists up to RESOURCE_PAGE long come from the cache
+        group_id = int(group_id)
+        if limit <= RESOURCE_PAGE:
+            cached = self.resource_cache.get(group_id)
+            if cached is not None:
+                return cached[:limit]
+        token = self.resource_cache.token(group_id)
+        cursor = self.db.cursor
+        cursor.execute("SELECT * FROM group_resources WHERE group_id = %s ORDER BY resource_id DESC LIMIT %s",
+                       (group_id, max(limit, RESOURCE_PAGE)))
+        rows = cursor.fetchall()
+        self.resource_cache.put(group_id, rows[:RESOURCE_PAGE], token)
+        return rows[:limit]
+
+    def board(self, group_id):
+        # The group's cached board, or one read with a single indexed join
+        # of its members; None when there is no such group
+        board = self.group_boards.get(group_id)
+        if board is not None:
+            return board
+        token = self.group_boards.token(group_id)
+        cursor = self.db.cursor
+        cursor.execute("SELECT group_name FROM study_groups WHERE group_id = %s", (group_id,))
+        group = cursor.fetchone()
+        if not group:
+            return None
+        cursor.execute("""
+            SELECT u.user_id, u.username, u.streak, u.points, u.badge_count
+            FROM group_members m JOIN users u ON u.user_id = m.user_id
+            WHERE m.group_id = %s
+        """, (group_id,))
+        index = LeaderboardIndex()
+        index.load(cursor.fetchall())
+        board = {'group_name': group['group_name'], 'index': index, 'weekly': None}
+        self.group_boards.put(group_id, board, token)
+        return board
+
+    def standings(self, group_id, user_id=None, page=1, page_size=10):
+        # Members ranked like the global leaderboard, plus the group's study
+        # totals for the last GROUP_WEEKS weeks
+        group_id = int(group_id)
+        board = self.board(group_id)
+        if board is None:
+            return None
+        weekly = board['weekly']
+        if weekly is None or weekly[-1]['week'] != GroupActivity.week_of(datetime.now()):
+            token = self.group_boards.token(group_id)
+            weekly = self.activity.weekly(group_id, GROUP_WEEKS)
+            self.group_boards.set_weekly(group_id, weekly, token)
+        offset = (page - 1) * page_size
+        index = board['index']
+        leaders = index.top(page_size, offset)
+        for rank, leader in enumerate(leaders, offset + 1):
+            leader['rank'] = rank
+        return {
+            'group_id': group_id,
+            'group_name': board['group_name'],
+            'leaders': leaders,
+            'rank': index.rank(user_id) if user_id is not None else None,
+            'total': len(index),
+            'weekly': weekly,
+        }
+
+    def create_group(self, user):
+        if not user.is_logged_in():
+            print("==> Please log in to create a study group.")
+            return
+        group_name = input("Enter the study group name: ")
+        self.create(user.get_user_id(), group_name)
+        print(f"==> Study group '{group_name}' created successfully!")
+
+    def print_groups(self, groups):
+        for group in groups:
+            print(f"ID: {group['group_id']}, Name: {group['group_name']}, Creator: {group['creator']}, Members: {group['members']}")
+
+    def view_groups(self, page_size=20):
+        groups = self.list_groups(0, page_size)
         if not groups:
             print("==> No study groups found.")
             return
         print("\nStudy Groups:")
-        for group in groups:
-            print(f"ID: {group['group_id']}, Name: {group['group_name']}, Creator: {group['creator']}, Members: {group['members']}")
+        while True:
+            self.print_groups(groups)
+            if len(groups) < page_size or input("Show more? (y/n): ").strip().lower() != "y":
+                return
+            groups = self.list_groups(groups[-1]['group_id'], page_size)
+            if not groups:
+                return
+
+    def view_group_leaderboard(self, user):
+        group_id = self.read_group_id("Enter the group ID: ")
+        if group_id is None:
+            return
+        standings = self.standings(group_id, user.get_user_id() if user.is_logged_in() else None)
+        if standings is None:
+            print("==> Study group not found.")
+            return
+
+        print(f"\n=== {standings['group_name']} LEADERBOARD ===")
+        print("{:<5} {:<20} {:<10} {:<10} {:<20}".format("Rank", "Username", "Streak", "Points", "Badges"))
+        for leader in standings['leaders']:
+            print("{:<5} {:<20} {:<10} {:<10} {:<20}".format(
+                leader['rank'], leader['username'], leader['streak'], leader['points'], leader['badge_count']))
+        if standings['rank']:
+            print(f"\nYour Rank: {standings['rank']} of {standings['total']}")
+
+        print("\nGroup study time by week:")
+        for week in standings['weekly']:
+            print(f"Week of {week['week']}: {week['minutes']:.0f} minutes in {week['sessions']} sessions")
+
+    def search_groups(self):
+        groups = self.search(input("Enter part of the group name: "))
+        if not groups:
+            print("==> No matching study groups found.")
+            return
+        print("\nMatching Study Groups:")
+        self.print_groups(groups)
+
+    def read_group_id(self, prompt):
+        group_id = input(prompt).strip()
+        if not group_id.isdigit():
+            print("==> Invalid group ID.")
+            return None
+        return int(group_id)
 
     def join_group(self, user):
         if not user.is_logged_in():
             print("==> Please log in to join a study group.")
             return
-        group_id = input("Enter the group ID to join: ")
-        cursor = self.db.cursor
-        cursor.execute("SELECT user_id FROM users WHERE username = %s", (user.logged_in_user,))
-        user_id = cursor.fetchone()['user_id']
-        cursor.execute("SELECT * FROM group_members WHERE group_id = %s AND user_id = %s", (group_id, user_id))
-        if cursor.fetchone():
+        group_id = self.read_group_id("Enter the group ID to join: ")
+        if group_id is None:
+            return
+        joined = self.join(group_id, user.get_user_id())
+        if joined is None:
+            print("==> Study group not found.")
+        elif not joined:
             print("==> You are already a member of this group.")
         else:
-            cursor.execute("INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)", (group_id, user_id))
-            self.db.commit()
             print("==> Joined the group successfully!")
 
     def add_resource(self, user):
         if not user.is_logged_in():
             print("==> Please log in to add a resource.")
             return
-        group_id = input("Enter the group ID to add resource to: ")
+        group_id = self.read_group_id("Enter the group ID to add resource to: ")
+        if group_id is None:
+            return
         resource_name = input("Enter the resource name: ")
         resource_link = input("Enter the resource link: ")
-        cursor = self.db.cursor
-        cursor.execute("SELECT user_id FROM users WHERE username = %s", (user.logged_in_user,))
-        user_id = cursor.fetchone()['user_id']
-        cursor.execute("SELECT * FROM group_members WHERE group_id = %s AND user_id = %s", (group_id, user_id))
-        if not cursor.fetchone():
+        if not self.share(group_id, user.get_user_id(), resource_name, resource_link):
             print("==> You are not a member of this group.")
             return
-        cursor.execute("INSERT INTO group_resources (group_id, resource_name, resource_link) VALUES (%s, %s, %s)", 
-                       (group_id, resource_name, resource_link))
-        self.db.commit()
         print("==> Resource added successfully!")
 
     def view_resources(self):
-        group_id = input("Enter the group ID to view resources: ")
-        cursor = self.db.cursor
-        cursor.execute("SELECT * FROM group_resources WHERE group_id = %s", (group_id,))
-        resources = cursor.fetchall()
+        group_id = self.read_group_id("Enter the group ID to view resources: ")
+        if group_id is None:
+            return
+        resources = self.resources(group_id)
         if not resources:
             print("==> No resources found for this group.")
             return
@@ -396,16 +1413,53 @@ class StudyReminder:
     def __init__(self, db):
         self.db = db
 
+    def record_change(self, cursor, user_id):
+        # Tells a running scheduler daemon to reload this user's reminders
+        cursor.execute("INSERT INTO reminder_changes (user_id, changed_at) VALUES (%s, %s)",
+                       (user_id, datetime.now()))
+
+    def reminders(self, user_id):
+        cursor = self.db.cursor
+        cursor.execute("SELECT * FROM study_reminders WHERE user_id = %s", (user_id,))
+        return cursor.fetchall()
+
+    @staticmethod
+    def normalize_time(text):
+        # "9:05" -> "09:05"; None unless it is a valid HH:MM time
+        try:
+            return datetime.strptime(text.strip(), "%H:%M").strftime("%H:%M")
+        except (AttributeError, ValueError):
+            return None
+
+    def add_reminder(self, user_id, time, days):
+        # None when time is not HH:MM
+        time = self.normalize_time(time)
+        if time is None:
+            return None
+        cursor = self.db.cursor
+        cursor.execute("INSERT INTO study_reminders (user_id, time, days, enabled) VALUES (%s, %s, %s, %s)", 
+                       (user_id, time, days, True))
+        reminder_id = cursor.lastrowid
+        self.record_change(cursor, user_id)
+        self.db.commit()
+        return reminder_id
+
+    def remove_reminder(self, user_id, reminder_id):
+        # False when the reminder does not belong to the user
+        cursor = self.db.cursor
+        cursor.execute("DELETE FROM study_reminders WHERE reminder_id = %s AND user_id = %s", (reminder_id, user_id))
+        if cursor.rowcount == 0:
+            return False
+        self.record_change(cursor, user_id)
+        self.db.commit()
+        return True
+
     def modify_schedule(self, user):
         if not user.is_logged_in():
             print("==> Please log in to modify your study schedule.")
             return
-        cursor = self.db.cursor
-        cursor.execute("SELECT user_id FROM users WHERE username = %s", (user.logged_in_user,))
-        user_id = cursor.fetchone()['user_id']
-        
-        cursor.execute("SELECT * FROM study_reminders WHERE user_id = %s", (user_id,))
-        reminders = cursor.fetchall()
+        user_id = user.get_user_id()
+        reminders = self.reminders(user_id)
         
         print("\nYour current reminders:")
         for i, reminder in enumerate(reminders, 1):
@@ -418,9 +1472,9 @@ class StudyReminder:
         if choice == "1":
             time = input("Enter reminder time (HH:MM format): ")
             days = input("Enter days (comma-separated, e.g., Mon,Tue,Wed): ")
-            cursor.execute("INSERT INTO study_reminders (user_id, time, days, enabled) VALUES (%s, %s, %s, %s)", 
-                           (user_id, time, days, True))
-            self.db.commit()
+            if self.add_reminder(user_id, time, days) is None:
+                print("==> Invalid time. Please use HH:MM format.")
+                return
             print("==> Reminder added successfully!")
         elif choice == "2":
             if not reminders:
@@ -429,9 +1483,7 @@ class StudyReminder:
             try:
                 index = int(input("Enter reminder number to remove: ")) - 1
                 if 0 <= index < len(reminders):
-                    reminder_id = reminders[index]['reminder_id']
-                    cursor.execute("DELETE FROM study_reminders WHERE reminder_id = %s", (reminder_id,))
-                    self.db.commit()
+                    self.remove_reminder(user_id, reminders[index]['reminder_id'])
                     print("==> Reminder removed successfully!")
                 else:
                     print("==> Invalid selection.")
@@ -440,15 +1492,264 @@ class StudyReminder:
         else:
             print("==> Invalid choice.")
 
+# The interactive app's managers, each built the first time a menu option
+# needs it
+class Managers:
+    def __init__(self, db):
+        self.db = db
+
+    @cached_property
+    def group_boards(self):
+        return GroupBoards()
+
+    @cached_property
+    def leaderboard(self):
+        return Leaderboard(self.db, group_boards=self.group_boards)
+
+    @cached_property
+    def user(self):
+        return User(self.db, self.leaderboard)
+
+    @cached_property
+    def study_session(self):
+        return StudySession(self.db)
+
+    @cached_property
+    def progress_report(self):
+        return ProgressReport(self.user, self.study_session, self.db)
+
+    @cached_property
+    def study_group(self):
+        return StudyGroup(self.db, group_boards=self.group_boards)
+
+    @cached_property
+    def study_reminder(self):
+        return StudyReminder(self.db)
+
 # Main application function
-def main():
-    db = Database()
-    user = User(db)
-    study_session = StudySession(db)
-    progress_report = ProgressReport(user, study_session, db)
-    leaderboard = Leaderboard(db)
-    study_group = StudyGroup(db)
-    study_reminder = StudyReminder(db)
+# Menu choices by name, used to group queries per action when profiling
+GUEST_ACTIONS = {'1': "login", '2': "register", '3': "exit"}
+MENU_ACTIONS = {'1': "start_session", '2': "end_session", '3': "view_all_sessions", '4': "view_report",
+                '5': "view_leaderboard", '6': "study_groups", '7': "modify_reminders", '8': "logout"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="StudySpark - your study motivator")
+    parser.add_argument("--profile", action="store_true", help="print a query profile summary at exit")
+    parser.add_argument("--profile-json", metavar="FILE", help="write the query profile to FILE as JSON at exit")
+    parser.add_argument("--slow-query-ms", type=float, metavar="MS", help="log every query slower than MS")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("rebuild-leaderboard", help="recompute badge counts and the ranking index")
+    commands.add_parser("migrate", help="apply pending schema migrations")
+    commands.add_parser("check-queries", help="EXPLAIN every query in main.py and report full scans")
+    export = commands.add_parser("export-sessions", help="stream a user's session history to a file")
+    export.add_argument("username")
+    export.add_argument("output", help="file to write, or - for stdout")
+    export.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    export.add_argument("--status", help="e.g. Completed or 'In Progress'")
+    export.add_argument("--since", help="YYYY-MM-DD, inclusive")
+    export.add_argument("--until", help="YYYY-MM-DD, exclusive")
+    reconcile = commands.add_parser("reconcile-stats", help="check the user_stats rollups against study_sessions")
+    reconcile.add_argument("--repair", action="store_true", help="rewrite any rollups that have drifted")
+    reconcile.add_argument("--chunk-size", type=int, default=1000)
+    import_users = commands.add_parser("import-users", help="bulk load users from users.json or JSON lines")
+    import_users.add_argument("input", help="file to read, or - for stdin")
+    import_users.add_argument("--format", choices=["json", "jsonl"], help="guessed from the file when omitted")
+    import_users.add_argument("--batch-size", type=int, default=1000, help="users per transaction")
+    export_users = commands.add_parser("export-users", help="dump users with badges and reminders")
+    export_users.add_argument("output", help="file to write, or - for stdout")
+    export_users.add_argument("--format", choices=["json", "jsonl"], default="json")
+    export_users.add_argument("--batch-size", type=int, default=1000)
+    schedule = commands.add_parser("scheduler", help="run the study reminder daemon")
+    schedule.add_argument("--check-interval", type=float, default=30,
+                          help="seconds between checks for changed reminders")
+    schedule.add_argument("--simulate", type=float, metavar="HOURS",
+                          help="replay the next HOURS on a simulated clock and exit")
+    serve = commands.add_parser("serve", help="run the HTTP/JSON API")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--workers", type=int, help="database worker threads (default: the pool size, one less with --journal)")
+    serve.add_argument("--journal", metavar="PATH", help="acknowledge session start/end from this write-behind log")
+    serve.add_argument("--kdf-workers", type=int, help="password hashing processes (default: one per CPU)")
+    streaks = commands.add_parser("recompute-streaks", help="recompute every streak from completed sessions")
+    streaks.add_argument("--incremental", action="store_true", help="only users with sessions since the last run")
+    streaks.add_argument("--chunk-size", type=int, default=1000, help="users per transaction")
+    archive = commands.add_parser("archive-sessions", help="move old completed sessions into monthly shards")
+    archive.add_argument("--retention-days", type=int, default=180,
+                         help="keep sessions from months newer than this in study_sessions")
+    archive.add_argument("--batch-size", type=int, default=1000, help="sessions copied per page")
+    report = commands.add_parser("analytics", help="weekly totals, heatmap and completion rates")
+    scope = report.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--user", metavar="USERNAME")
+    scope.add_argument("--group", type=int, metavar="GROUP_ID")
+    scope.add_argument("--cohort", action="store_true", help="every user")
+    report.add_argument("--weeks", type=int, default=12)
+    report.add_argument("--format", choices=["text", "json"], default="text")
+    award = commands.add_parser("award-badges", help="evaluate badge rules for every user")
+    award.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    profiler = None
+    if args.profile or args.profile_json or args.slow_query_ms is not None:
+        from profiling import QueryProfiler
+        profiler = QueryProfiler(args.slow_query_ms)
+        # atexit also covers the subcommands that leave through exit()
+        if args.profile:
+            atexit.register(profiler.print_summary)
+        if args.profile_json:
+            atexit.register(profiler.export_json, args.profile_json)
+
+    if args.command == "serve":
+        # Imported here because server.py builds on the managers in this module
+        from server import StudySparkServer
+        StudySparkServer(create_backend(), args.workers, kdf_workers=args.kdf_workers,
+                         journal_path=args.journal, profiler=profiler).run(args.host, args.port)
+        return
+
+    db = Database(profiler=profiler)
+    try:
+        run_command(args, db)
+    except db.backend.Error as e:
+        if db.connected:
+            raise
+        print(f"Error connecting to the database: {e}")
+        exit(1)
+
+
+def run_command(args, db):
+    if args.command == "migrate":
+        from migrations import MigrationRunner
+        applied = MigrationRunner(db.backend, db.connection).migrate()
+        for version, name in applied:
+            print(f"==> Applied migration {version}: {name}")
+        if not applied:
+            print("==> Database schema is up to date.")
+        db.close()
+        return
+
+    if args.command == "check-queries":
+        from migrations import check_queries
+        problems = check_queries(db.backend, db.connection)
+        for scope, line, query, tables in problems:
+            print(f"main.py:{line} {scope} scans {', '.join(tables)}: {query}")
+        print(f"==> {len(problems)} queries without a usable index.")
+        db.close()
+        exit(1 if problems else 0)
+
+    if args.command == "rebuild-leaderboard":
+        ranked = Leaderboard(db).rebuild()
+        print(f"==> Leaderboard rebuilt for {ranked} users.")
+        db.close()
+        return
+
+    if args.command == "export-sessions":
+        account = UserCache(db).get(args.username)
+        if not account:
+            print(f"==> No user named '{args.username}'.")
+            db.close()
+            exit(1)
+        since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+        until = datetime.strptime(args.until, "%Y-%m-%d") if args.until else None
+        output = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+        count = StudySession(db).export_sessions(account.user_id, output, args.format,
+                                                 status=args.status, since=since, until=until)
+        if output is not sys.stdout:
+            output.close()
+            print(f"==> Exported {count} sessions to {args.output}.")
+        db.close()
+        return
+
+    if args.command == "reconcile-stats":
+        drifted = StatsRollup(db).reconcile(args.repair, args.chunk_size)
+        action = "Repaired" if args.repair else "Found"
+        print(f"==> {action} drifted stats for {len(drifted)} users.")
+        db.close()
+        exit(1 if drifted and not args.repair else 0)
+
+    if args.command == "import-users":
+        from transfer import UserImporter, iter_users
+        source = sys.stdin if args.input == "-" else open(args.input)
+        count = UserImporter(db, args.batch_size).import_users(iter_users(source, args.format))
+        if source is not sys.stdin:
+            source.close()
+        print(f"==> Imported {count} users.")
+        db.close()
+        return
+
+    if args.command == "export-users":
+        from transfer import UserExporter
+        output = sys.stdout if args.output == "-" else open(args.output, "w")
+        count = UserExporter(db, args.batch_size).export_users(output, args.format)
+        if output is not sys.stdout:
+            output.close()
+            print(f"==> Exported {count} users to {args.output}.")
+        db.close()
+        return
+
+    if args.command == "scheduler":
+        from scheduler import ReminderScheduler, SimulatedClock
+        if args.simulate:
+            start = datetime.now()
+            scheduler = ReminderScheduler(db, SimulatedClock(start), check_interval=None)
+            scheduler.run(until=start + timedelta(hours=args.simulate))
+        else:
+            scheduler = ReminderScheduler(db, check_interval=args.check_interval)
+            if hasattr(signal, "SIGHUP"):
+                signal.signal(signal.SIGHUP, lambda signum, frame: scheduler.notify())
+            print("==> Reminder scheduler running. Press Ctrl+C to stop.", flush=True)
+            try:
+                scheduler.run()
+            except KeyboardInterrupt:
+                pass
+        db.close()
+        return
+
+    if args.command == "recompute-streaks":
+        engine = StreakEngine(db, args.chunk_size)
+        scanned, changed = engine.run_incremental() if args.incremental else engine.recompute_all()
+        print(f"==> Recomputed streaks for {scanned} users, {changed} changed.")
+        db.close()
+        return
+
+    if args.command == "archive-sessions":
+        from archive import SessionArchive
+        archived = SessionArchive(db, args.retention_days, args.batch_size).run()
+        for period, moved in archived:
+            print(f"==> Archived {moved} sessions from {period:%Y-%m}.")
+        if not archived:
+            print("==> Nothing to archive.")
+        db.close()
+        return
+
+    if args.command == "analytics":
+        from analytics import StudyAnalytics, print_report
+        analytics = StudyAnalytics(db)
+        if args.user:
+            account = UserCache(db).get(args.user)
+            if not account:
+                print(f"==> No user named '{args.user}'.")
+                db.close()
+                exit(1)
+            result, title = analytics.report(args.weeks, user_id=account.user_id), args.user
+        elif args.group:
+            result, title = analytics.report(args.weeks, group_id=args.group), f"Group {args.group}"
+        else:
+            result, title = analytics.cohort_report(args.weeks), "All users"
+        if args.format == "json":
+            print(json.dumps(result, default=str, indent=4))
+        else:
+            print_report(result, title)
+        db.close()
+        return
+
+    if args.command == "award-badges":
+        scored, awarded = BadgeEngine(db).evaluate_all(args.chunk_size)
+        print(f"==> Scored {scored} users and awarded {awarded} new badges.")
+        db.close()
+        return
+
+    managers = Managers(db)
+    user = managers.user
     
     print("============================================")
     print("WELCOME TO STUDYSPARK - YOUR STUDY MOTIVATOR")
@@ -472,6 +1773,8 @@ def main():
             print("8. Logout")
         
         choice = input("\nChoose an option: ")
+        actions = MENU_ACTIONS if user.is_logged_in() else GUEST_ACTIONS
+        db.begin_action(actions.get(choice, "invalid_choice"))
         
         if not user.is_logged_in():
             if choice == '1':
@@ -489,15 +1792,15 @@ def main():
                 print("==> Invalid choice. Please try again.")
         else:
             if choice == '1':
-                study_session.start_session(user)
+                managers.study_session.start_session(user)
             elif choice == '2':
-                study_session.end_session(user)
+                managers.study_session.end_session(user)
             elif choice == '3':
-                study_session.view_all_sessions(user)
+                managers.study_session.view_all_sessions(user)
             elif choice == '4':
-                progress_report.view_report()
+                managers.progress_report.view_report()
             elif choice == '5':
-                leaderboard.view_leaderboard()
+                managers.leaderboard.view_leaderboard(user)
             elif choice == '6':
                 print("\nSTUDY GROUPS MENU")
                 print("1. Create Study Group")
@@ -505,22 +1808,28 @@ def main():
                 print("3. Join Study Group")
                 print("4. Add Resource to Group")
                 print("5. View Group Resources")
+                print("6. Search Study Groups")
+                print("7. View Group Leaderboard")
                 group_choice = input("Choose an option: ")
 
                 if group_choice == '1':
-                    study_group.create_group(user)
+                    managers.study_group.create_group(user)
                 elif group_choice == '2':
-                    study_group.view_groups()
+                    managers.study_group.view_groups()
                 elif group_choice == '3':
-                    study_group.join_group(user)
+                    managers.study_group.join_group(user)
                 elif group_choice == '4':
-                    study_group.add_resource(user)
+                    managers.study_group.add_resource(user)
                 elif group_choice == '5':
-                    study_group.view_resources()
+                    managers.study_group.view_resources()
+                elif group_choice == '6':
+                    managers.study_group.search_groups()
+                elif group_choice == '7':
+                    managers.study_group.view_group_leaderboard(user)
                 else:
                     print("==> Invalid choice.")
             elif choice == '7':
-                study_reminder.modify_schedule(user)
+                managers.study_reminder.modify_schedule(user)
             elif choice == '8':
                 user.logout()
             else:
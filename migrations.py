@@ -0,0 +1,381 @@
+import ast
+import os
+import re
+from datetime import datetime
+
+from storage import SCHEMA_PATH, sqlite_schema
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def base_schema(runner):
+    # Databases created by hand from schema.sql are adopted as-is
+    if not runner.table_exists("users"):
+        with open(SCHEMA_PATH) as schema:
+            runner.run_script(schema.read())
+
+
+def badge_count_column(runner):
+    runner.add_column("users", "badge_count", "INT DEFAULT 0")
+
+
+def hot_path_indexes(runner):
+    runner.create_index("idx_users_ranking", "users", "streak, points, badge_count")
+    runner.create_index("idx_sessions_user_status_start", "study_sessions", "user_id, status, start_time")
+    runner.create_index("idx_group_resources_group", "group_resources", "group_id")
+    runner.create_index("idx_reminders_user", "study_reminders", "user_id")
+    # group_members is already covered by its (group_id, user_id) primary key
+
+
+def unique_badges(runner):
+    # Drop duplicate awards before the unique index can be built, then
+    # bring the denormalized counts back in line
+    runner.execute("""
+        DELETE FROM badges WHERE badge_id NOT IN (
+            SELECT badge_id FROM (
+                SELECT MIN(badge_id) AS badge_id FROM badges GROUP BY user_id, badge_name
+            ) AS keep
+        )
+    """)
+    runner.create_index("uq_badges_user_badge", "badges", "user_id, badge_name", unique=True)
+    runner.execute("""
+        UPDATE users SET badge_count = (
+            SELECT COUNT(*) FROM badges WHERE badges.user_id = users.user_id
+        )
+    """)
+
+
+def session_history_index(runner):
+    # Serves keyset pagination of a user's history on (start_time, session_id)
+    runner.create_index("idx_sessions_user_start", "study_sessions", "user_id, start_time, session_id")
+
+
+def user_stats_rollup(runner):
+    runner.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INT PRIMARY KEY,
+            total_minutes FLOAT DEFAULT 0,
+            session_count INT DEFAULT 0,
+            last_session DATETIME,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+    runner.execute("DELETE FROM user_stats")
+    runner.execute("""
+        INSERT INTO user_stats (user_id, total_minutes, session_count, last_session)
+        SELECT user_id, SUM(actual_duration), COUNT(*), MAX(end_time)
+        FROM study_sessions WHERE status = 'Completed' GROUP BY user_id
+    """)
+
+
+def reminder_change_log(runner):
+    # Append-only log the scheduler daemon reads to reload only changed users
+    if not runner.table_exists("reminder_changes"):
+        runner.run_script("""
+            CREATE TABLE reminder_changes (
+                change_id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT,
+                changed_at DATETIME
+            );
+        """)
+
+
+def password_hash_width(runner):
+    # Versioned hashes ("algorithm$params$salt$hash") outgrow the old 64
+    # characters of hex SHA-256; SQLite does not enforce VARCHAR lengths
+    if runner.backend.dialect == "mysql":
+        runner.execute("ALTER TABLE users MODIFY password VARCHAR(255)")
+
+
+def job_watermarks(runner):
+    # Where incremental batch jobs resume, the index they resume by, and a
+    # covering index for walking completed sessions one user range at a time
+    runner.execute("""
+        CREATE TABLE IF NOT EXISTS job_watermarks (
+            job VARCHAR(50) PRIMARY KEY,
+            watermark DATETIME
+        )
+    """)
+    runner.create_index("idx_sessions_status_end", "study_sessions", "status, end_time")
+    runner.create_index("idx_sessions_status_user_end", "study_sessions", "status, user_id, end_time")
+
+
+def journal_checkpoints(runner):
+    # Last journal event applied, committed with the events themselves
+    runner.execute("""
+        CREATE TABLE IF NOT EXISTS journal_checkpoints (
+            journal VARCHAR(50) PRIMARY KEY,
+            applied_seq BIGINT
+        )
+    """)
+
+
+def group_directory(runner):
+    # Maintained member counts plus name search: a prefix index, and a
+    # FULLTEXT index (MySQL) or trigram FTS5 table kept in sync by triggers
+    runner.add_column("study_groups", "member_count", "INT DEFAULT 0")
+    runner.execute("""
+        UPDATE study_groups SET member_count = (
+            SELECT COUNT(*) FROM group_members WHERE group_members.group_id = study_groups.group_id
+        )
+    """)
+    if runner.backend.dialect == "mysql":
+        runner.create_index("idx_groups_name", "study_groups", "group_name")
+        if not runner.index_exists("study_groups", "ft_groups_name"):
+            runner.execute("ALTER TABLE study_groups ADD FULLTEXT INDEX ft_groups_name (group_name)")
+        return
+    # NOCASE so that case-insensitive LIKE 'prefix%' can use the index
+    runner.create_index("idx_groups_name", "study_groups", "group_name COLLATE NOCASE")
+    if runner.table_exists("study_groups_fts"):
+        return
+    runner.execute("""
+        CREATE VIRTUAL TABLE study_groups_fts USING fts5(
+            group_name, content='study_groups', content_rowid='group_id', tokenize='trigram'
+        )
+    """)
+    runner.execute("""
+        CREATE TRIGGER study_groups_fts_insert AFTER INSERT ON study_groups BEGIN
+            INSERT INTO study_groups_fts (rowid, group_name) VALUES (new.group_id, new.group_name);
+        END
+    """)
+    runner.execute("""
+        CREATE TRIGGER study_groups_fts_delete AFTER DELETE ON study_groups BEGIN
+            INSERT INTO study_groups_fts (study_groups_fts, rowid, group_name)
+            VALUES ('delete', old.group_id, old.group_name);
+        END
+    """)
+    runner.execute("""
+        CREATE TRIGGER study_groups_fts_update AFTER UPDATE OF group_name ON study_groups BEGIN
+            INSERT INTO study_groups_fts (study_groups_fts, rowid, group_name)
+            VALUES ('delete', old.group_id, old.group_name);
+            INSERT INTO study_groups_fts (rowid, group_name) VALUES (new.group_id, new.group_name);
+        END
+    """)
+    runner.execute("INSERT INTO study_groups_fts (study_groups_fts) VALUES ('rebuild')")
+
+
+def analytics_index(runner):
+    # Covers the per-period aggregates in analytics.py, so cohort reports
+    # over recent weeks read a slice of this index instead of the table
+    runner.create_index("idx_sessions_status_start_cover", "study_sessions",
+                        "status, start_time, user_id, duration, actual_duration")
+
+
+def session_archive(runner):
+    # Per-user monthly summaries of sessions moved out of study_sessions,
+    # and the months that have been archived. study_days is a bitmask of the
+    # days of the month (bit 0 = the 1st) with a session ending on them
+    runner.execute("""
+        CREATE TABLE IF NOT EXISTS session_archive (
+            user_id INT,
+            period DATE,
+            sessions INT DEFAULT 0,
+            planned_minutes FLOAT DEFAULT 0,
+            actual_minutes FLOAT DEFAULT 0,
+            on_target INT DEFAULT 0,
+            study_days INT DEFAULT 0,
+            last_end DATETIME,
+            PRIMARY KEY (user_id, period),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+    runner.execute("""
+        CREATE TABLE IF NOT EXISTS archived_periods (
+            period DATE PRIMARY KEY,
+            sessions INT DEFAULT 0,
+            archived_at DATETIME
+        )
+    """)
+
+
+def group_activity(runner):
+    # Weekly study totals per group (weeks start on Monday), added to as
+    # members finish sessions, and the index finding a member's groups.
+    # Existing history is summed once here
+    runner.execute("""
+        CREATE TABLE IF NOT EXISTS group_weekly_totals (
+            group_id INT,
+            week DATE,
+            total_minutes FLOAT DEFAULT 0,
+            session_count INT DEFAULT 0,
+            PRIMARY KEY (group_id, week),
+            FOREIGN KEY (group_id) REFERENCES study_groups(group_id)
+        )
+    """)
+    runner.create_index("idx_group_members_user", "group_members", "user_id")
+    if runner.backend.dialect == "mysql":
+        week = "DATE_SUB(DATE(s.end_time), INTERVAL WEEKDAY(s.end_time) DAY)"
+    else:
+        week = "DATE(s.end_time, '-' || ((CAST(strftime('%w', s.end_time) AS INTEGER) + 6) % 7) || ' days')"
+    runner.execute("DELETE FROM group_weekly_totals")
+    runner.execute(f"""
+        INSERT INTO group_weekly_totals (group_id, week, total_minutes, session_count)
+        SELECT m.group_id, {week}, SUM(s.actual_duration), COUNT(*)
+        FROM study_sessions s JOIN group_members m ON m.user_id = s.user_id
+        WHERE s.status = 'Completed'
+        GROUP BY m.group_id, {week}
+    """)
+
+
+# (version, name, step) - append new migrations, never edit applied ones
+MIGRATIONS = [
+    (1, "base schema", base_schema),
+    (2, "users.badge_count", badge_count_column),
+    (3, "hot path indexes", hot_path_indexes),
+    (4, "unique badges per user", unique_badges),
+    (5, "session history index", session_history_index),
+    (6, "user_stats rollup", user_stats_rollup),
+    (7, "reminder change log", reminder_change_log),
+    (8, "wider password hashes", password_hash_width),
+    (9, "job watermarks", job_watermarks),
+    (10, "journal checkpoints", journal_checkpoints),
+    (11, "group directory", group_directory),
+    (12, "analytics covering index", analytics_index),
+    (13, "session archive", session_archive),
+    (14, "group activity", group_activity),
+]
+
+
+# Versioned, idempotent schema migration runner
+class MigrationRunner:
+    def __init__(self, backend, connection, migrations=None):
+        self.backend = backend
+        self.connection = connection
+        self.migrations = migrations or MIGRATIONS
+
+    @property
+    def cursor(self):
+        return self.backend.cursor(self.connection)
+
+    def execute(self, query, params=()):
+        cursor = self.cursor
+        cursor.execute(query, params)
+        return cursor
+
+    def run_script(self, script):
+        if self.backend.dialect == "sqlite":
+            self.connection.executescript(sqlite_schema(script))
+            return
+        script = re.sub(r"(?im)^\s*(CREATE DATABASE|USE)\b[^;]*;", "", script)
+        for statement in script.split(";"):
+            if statement.strip():
+                self.execute(statement)
+
+    def table_exists(self, table):
+        if self.backend.dialect == "sqlite":
+            cursor = self.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", (table,))
+        else:
+            cursor = self.execute(
+                "SELECT table_name FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s", (table,))
+        return cursor.fetchone() is not None
+
+    def column_exists(self, table, column):
+        if self.backend.dialect == "sqlite":
+            return any(row['name'] == column for row in self.execute(f"PRAGMA table_info({table})").fetchall())
+        cursor = self.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s", (table, column))
+        return cursor.fetchone() is not None
+
+    def index_exists(self, table, index):
+        if self.backend.dialect == "sqlite":
+            cursor = self.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+                (table, index))
+        else:
+            cursor = self.execute(
+                "SELECT index_name FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s", (table, index))
+        return cursor.fetchone() is not None
+
+    def add_column(self, table, column, definition):
+        if not self.column_exists(table, column):
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def create_index(self, name, table, columns, unique=False):
+        if not self.index_exists(table, name):
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            self.execute(f"CREATE {kind} {name} ON {table} ({columns})")
+
+    def applied_versions(self):
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(100),
+                applied_at DATETIME
+            )
+        """)
+        self.connection.commit()
+        return {row['version'] for row in self.execute("SELECT version FROM schema_migrations").fetchall()}
+
+    def pending(self):
+        applied = self.applied_versions()
+        return [migration for migration in self.migrations if migration[0] not in applied]
+
+    def migrate(self):
+        done = []
+        for version, name, step in self.pending():
+            step(self)
+            self.execute("INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                         (version, name, datetime.now()))
+            self.connection.commit()
+            done.append((version, name))
+        return done
+
+
+# Queries that are meant to visit every row, keyed by "Class.method"
+INTENTIONAL_SCANS = {
+    "Leaderboard.load_index",
+    "Leaderboard.rebuild",
+}
+
+
+def collect_queries(path=MAIN_PATH):
+    # Finds every literal SQL string passed to execute() in the source file
+    with open(path) as source:
+        tree = ast.parse(source.read())
+    queries = []
+
+    def visit(node, scope):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                visit(child, scope + [child.name])
+                continue
+            if (isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute)
+                    and child.func.attr == "execute" and child.args
+                    and isinstance(child.args[0], ast.Constant) and isinstance(child.args[0].value, str)):
+                queries.append((".".join(scope), child.lineno, " ".join(child.args[0].value.split())))
+            visit(child, scope)
+
+    visit(tree, [])
+    return queries
+
+
+def full_scans(backend, connection, query):
+    # Returns the tables the plan reads without any usable index. LIKE
+    # parameters get a prefix pattern so the planner can use an index
+    params = ["a%" if re.search(r"(?i)\bLIKE\s*$", query[:match.start()]) else 1
+              for match in re.finditer("%s", query)]
+    cursor = backend.cursor(connection)
+    if backend.dialect == "sqlite":
+        cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+        return [re.match(r"SCAN (\w+)", row['detail']).group(1) for row in cursor.fetchall()
+                if re.match(r"SCAN \w+$", row['detail'])]
+    cursor.execute("EXPLAIN " + query, params)
+    return [row['table'] for row in cursor.fetchall()
+            if row.get('type') == "ALL" and not row.get('possible_keys')]
+
+
+def check_queries(backend, connection, path=MAIN_PATH):
+    # Returns (scope, line, query, tables) for every unexpected full scan
+    problems = []
+    for scope, line, query in collect_queries(path):
+        if not re.match(r"(?i)\s*(SELECT|UPDATE|DELETE)\b", query) or scope in INTENTIONAL_SCANS:
+            continue
+        tables = full_scans(backend, connection, query)
+        if tables:
+            problems.append((scope, line, query, tables))
+    connection.rollback()
+    return problems
@@ -0,0 +1,75 @@
+import base64
+import hashlib
+import hmac
+import os
+
+# Stored hashes are "algorithm$params$salt$hash" so that the cost can be
+# raised later without invalidating existing accounts. Bare 64-character hex
+# strings are the legacy unsalted SHA-256 format.
+SCRYPT_PARAMS = {'n': 2 ** 14, 'r': 8, 'p': 1}
+PBKDF2_PARAMS = {'i': 600000}
+DEFAULT_ALGORITHM = "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _params(text):
+    return {key: int(value) for key, value in (item.split("=") for item in text.split(","))}
+
+
+def _derive(algorithm, params, password, salt):
+    if algorithm == "scrypt":
+        return hashlib.scrypt(password.encode(), salt=salt, n=params['n'], r=params['r'], p=params['p'],
+                              maxmem=256 * params['n'] * params['r'] + (1 << 20), dklen=KEY_BYTES)
+    if algorithm == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, params['i'], KEY_BYTES)
+    raise ValueError(f"Unknown password hash algorithm '{algorithm}'")
+
+
+def current_params(algorithm=DEFAULT_ALGORITHM):
+    return SCRYPT_PARAMS if algorithm == "scrypt" else PBKDF2_PARAMS
+
+
+def legacy_hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def hash_password(password, algorithm=DEFAULT_ALGORITHM):
+    params = current_params(algorithm)
+    salt = os.urandom(SALT_BYTES)
+    encoded = ",".join(f"{key}={value}" for key, value in params.items())
+    return f"{algorithm}${encoded}${_b64(salt)}${_b64(_derive(algorithm, params, password, salt))}"
+
+
+def verify_password(password, stored):
+    # Returns (matches, needs_rehash). The comparison is constant time, and a
+    # missing account still pays for one derivation so it can't be told apart
+    if not stored:
+        hash_password(password)
+        return False, False
+    if "$" not in stored:
+        matches = hmac.compare_digest(legacy_hash(password), stored)
+        return matches, matches
+    try:
+        algorithm, encoded, salt, expected = stored.split("$")
+        params = _params(encoded)
+        actual = _derive(algorithm, params, password, _unb64(salt))
+    except (ValueError, KeyError):
+        return False, False
+    matches = hmac.compare_digest(actual, _unb64(expected))
+    return matches, matches and (algorithm != DEFAULT_ALGORITHM or params != current_params(algorithm))
+
+
+def check_login(password, stored):
+    # One round trip for a worker process: verify, and produce the upgraded
+    # hash in the same call when the stored one is outdated
+    matches, needs_rehash = verify_password(password, stored)
+    return matches, hash_password(password) if needs_rehash else None
@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# Frames from these files are plumbing, not call sites
+_PLUMBING = {os.path.abspath(__file__)}
+
+
+def normalize(query):
+    # Collapses whitespace and IN (...) lists so repeats group together
+    query = " ".join(query.split())
+    return re.sub(r"IN \((%s(, )?)+\)", "IN (...)", query)
+
+
+def call_site():
+    frame = sys._getframe(2)
+    while frame and frame.f_code.co_filename in _PLUMBING:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    code = frame.f_code
+    owner = frame.f_locals.get("self")
+    name = f"{type(owner).__name__}.{code.co_name}" if owner is not None else code.co_name
+    return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {name}"
+
+
+# Cursor proxy that times each statement and counts the rows fetched
+class ProfiledCursor:
+    def __init__(self, cursor, profiler):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._stat = None
+
+    def execute(self, query, params=()):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            self._stat = self._profiler.record(query, time.perf_counter() - started, call_site())
+
+    def executemany(self, query, seq_of_params):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_of_params)
+        finally:
+            self._stat = self._profiler.record(query, time.perf_counter() - started, call_site())
+
+    def _rows(self, count):
+        if self._stat is not None:
+            self._stat['rows'] += count
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._rows(1 if row is not None else 0)
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._rows(len(rows))
+        return rows
+
+    def fetchmany(self, size):
+        rows = self._cursor.fetchmany(size)
+        self._rows(len(rows))
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# Collects per-statement and per-call-site timings for one process. Actions
+# group the statements of one user action so repeated lookups stand out
+class QueryProfiler:
+    def __init__(self, slow_query_ms=None, repeat_threshold=5, log=sys.stderr):
+        self.slow_query_ms = slow_query_ms
+        self.repeat_threshold = repeat_threshold
+        self.log = log
+        self.statements = {}
+        self.call_sites = {}
+        self.actions = {}
+        self.suspects = []
+        self.action = None
+        self.action_counts = {}
+        self.lock = threading.Lock()
+
+    def record(self, query, elapsed, site):
+        key = normalize(query)
+        elapsed_ms = elapsed * 1000
+        with self.lock:
+            stat = self.statements.get(key)
+            if stat is None:
+                stat = self.statements[key] = {'query': key, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0}
+            stat['count'] += 1
+            stat['total_ms'] += elapsed_ms
+            stat['max_ms'] = max(stat['max_ms'], elapsed_ms)
+            self.call_sites[site] = self.call_sites.get(site, 0) + 1
+            if self.action is not None:
+                self.actions[self.action]['queries'] += 1
+                self.actions[self.action]['total_ms'] += elapsed_ms
+                self.action_counts[(key, site)] = self.action_counts.get((key, site), 0) + 1
+        if self.slow_query_ms is not None and elapsed_ms >= self.slow_query_ms and self.log:
+            print(f"==> Slow query ({elapsed_ms:.1f} ms) at {site}: {key}", file=self.log)
+        return stat
+
+    def begin_action(self, name):
+        # Closes the previous user action and checks it for N+1 patterns
+        self.end_action()
+        self.action = name
+        entry = self.actions.setdefault(name, {'action': name, 'runs': 0, 'queries': 0, 'total_ms': 0.0})
+        entry['runs'] += 1
+
+    def end_action(self):
+        if self.action is None:
+            return
+        for (query, site), count in self.action_counts.items():
+            if count >= self.repeat_threshold:
+                self.suspects.append({'action': self.action, 'call_site': site, 'query': query, 'count': count})
+        self.action = None
+        self.action_counts = {}
+
+    def report(self):
+        self.end_action()
+        return {
+            'statements': sorted(self.statements.values(), key=lambda stat: stat['total_ms'], reverse=True),
+            'call_sites': [{'call_site': site, 'count': count} for site, count in
+                           sorted(self.call_sites.items(), key=lambda item: item[1], reverse=True)],
+            'actions': list(self.actions.values()),
+            'n_plus_one': self.suspects,
+        }
+
+    def print_summary(self, out=sys.stderr, limit=15):
+        report = self.report()
+        total = sum(stat['count'] for stat in report['statements'])
+        print(f"\n=== QUERY PROFILE ({total} queries) ===", file=out)
+        print("{:>7} {:>10} {:>9} {:>8}  {}".format("Count", "Total ms", "Max ms", "Rows", "Statement"), file=out)
+        for stat in report['statements'][:limit]:
+            print("{:>7} {:>10.2f} {:>9.2f} {:>8}  {}".format(
+                stat['count'], stat['total_ms'], stat['max_ms'], stat['rows'], stat['query'][:90]), file=out)
+        if report['actions']:
+            print("\nPer action:", file=out)
+            for action in report['actions']:
+                print(f"  {action['action']}: {action['runs']} runs, {action['queries']} queries, "
+                      f"{action['total_ms']:.2f} ms", file=out)
+        print("\nTop call sites:", file=out)
+        for entry in report['call_sites'][:limit]:
+            print(f"  {entry['count']:>6}  {entry['call_site']}", file=out)
+        for suspect in report['n_plus_one']:
+            print(f"\n==> Possible N+1 in {suspect['action']}: {suspect['count']}x at {suspect['call_site']}: "
+                  f"{suspect['query'][:90]}", file=out)
+
+    def export_json(self, path):
+        with open(path, "w") as output:
+            json.dump(self.report(), output, indent=4)
@@ -0,0 +1,127 @@
+import json
+import os
+import random
+import threading
+import time
+
+from lru import LRUCache
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "quotes.json")
+QUOTABLE_URL = "https://api.quotable.io/random?tags=inspirational"
+
+
+# Fetches quotes from api.quotable.io with a hard timeout
+class QuotableSource:
+    def __init__(self, url=QUOTABLE_URL, timeout=2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        import requests
+        try:
+            response = requests.get(self.url, timeout=self.timeout)
+            if response.status_code == 200:
+                data = response.json()
+                return {"content": data['content'], "author": data['author']}
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            pass
+        return None
+
+
+# Offline stand-in for the network source, for tests and benchmarks
+class StubSource:
+    def __init__(self, quotes=None, delay=0.0):
+        self.quotes = quotes or [{"content": "Stub quote.", "author": "StudySpark"}]
+        self.delay = delay
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self.quotes[(self.calls - 1) % len(self.quotes)]
+
+
+# Bounded quote cache: entries expire after ttl seconds and are served
+# least-recently-used first so the same quote does not repeat back to back
+class QuoteCache(LRUCache):
+    def __init__(self, max_size=32, ttl=3600, clock=time.monotonic):
+        super().__init__(max_size)
+        self.ttl = ttl
+        self.clock = clock
+
+    def _expire(self):
+        now = self.clock()
+        for key in [key for key, (expires, _) in self.entries.items() if expires <= now]:
+            del self.entries[key]
+
+    def add(self, quote):
+        with self._lock:
+            self._put(quote['content'], (self.clock() + self.ttl, quote))
+
+    def take(self):
+        with self._lock:
+            self._expire()
+            if not self.entries:
+                return None
+            key, (expires, quote) = next(iter(self.entries.items()))
+            self.entries.move_to_end(key)
+            return quote
+
+    def __len__(self):
+        with self._lock:
+            self._expire()
+            return len(self.entries)
+
+
+# Never-blocking quote provider: serves from the cache or the local corpus and
+# tops the cache up from the network source on a background thread
+class QuoteProvider:
+    def __init__(self, source=None, corpus_path=CORPUS_PATH, cache=None, low_water=4):
+        self.source = source
+        self.cache = cache if cache is not None else QuoteCache()
+        self.low_water = low_water
+        with open(corpus_path) as corpus:
+            self.corpus = json.load(corpus)
+        self._wanted = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.source is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refill, name="quote-refill", daemon=True)
+        self._thread.start()
+        self._wanted.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wanted.set()
+
+    def _refill(self):
+        while not self._stopped.is_set():
+            self._wanted.wait()
+            self._wanted.clear()
+            misses = 0
+            while not self._stopped.is_set() and len(self.cache) < self.cache.max_size and misses < 3:
+                quote = self.source.fetch()
+                if quote:
+                    self.cache.add(quote)
+                else:
+                    misses += 1
+
+    def get(self):
+        quote = self.cache.take()
+        if self._thread is not None and len(self.cache) < self.low_water:
+            self._wanted.set()
+        return quote or random.choice(self.corpus)
+
+
+def create_provider():
+    # STUDYSPARK_QUOTES=offline keeps everything local
+    if os.environ.get("STUDYSPARK_QUOTES") == "offline":
+        provider = QuoteProvider()
+    else:
+        provider = QuoteProvider(QuotableSource())
+    provider.start()
+    return provider
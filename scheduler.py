@@ -0,0 +1,222 @@
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+EVERY_DAY = (1 << 7) - 1
+DAY_GROUPS = {
+    "daily": EVERY_DAY,
+    "everyday": EVERY_DAY,
+    "weekdays": 0b0011111,
+    "weekends": 0b1100000,
+}
+
+
+def parse_days(days):
+    # "Mon,Tue,Wed" -> bitmask with Monday as bit 0; blank means every day
+    if not days or not days.strip():
+        return EVERY_DAY
+    mask = 0
+    for token in days.replace(";", ",").split(","):
+        token = token.strip().lower()
+        if token in DAY_GROUPS:
+            mask |= DAY_GROUPS[token]
+        elif token[:3] in DAY_NAMES:
+            mask |= 1 << DAY_NAMES.index(token[:3])
+    return mask
+
+
+def parse_time(value):
+    # TIME columns come back as timedelta; accept "HH:MM[:SS]" strings too.
+    # Raises ValueError for anything else
+    if isinstance(value, timedelta):
+        return value
+    parts = [int(part) for part in str(value).split(":")]
+    if not 2 <= len(parts) <= 3:
+        raise ValueError(f"invalid time '{value}'")
+    parts += [0] * (3 - len(parts))
+    if not (0 <= parts[0] < 24 and 0 <= parts[1] < 60 and 0 <= parts[2] < 60):
+        raise ValueError(f"invalid time '{value}'")
+    return timedelta(hours=parts[0], minutes=parts[1], seconds=parts[2])
+
+
+def next_fire(after, time_of_day, mask):
+    # First moment strictly after `after` that falls on an enabled weekday
+    midnight = datetime.combine(after.date(), datetime.min.time())
+    for offset in range(8):
+        candidate = midnight + timedelta(days=offset) + time_of_day
+        if mask & (1 << candidate.weekday()) and candidate > after:
+            return candidate
+    return None
+
+
+# Wall clock whose sleep can be cut short when reminders change
+class SystemClock:
+    def __init__(self):
+        self.wakeup = threading.Event()
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        self.wakeup.wait(max(seconds, 0))
+        self.wakeup.clear()
+
+    def wake(self):
+        self.wakeup.set()
+
+
+# Clock that jumps straight to the requested time, for tests and dry runs
+class SimulatedClock:
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        self.current += timedelta(seconds=max(seconds, 0))
+
+    def wake(self):
+        pass
+
+
+def print_reminder(reminder, fire_at):
+    print(f"[{fire_at:%Y-%m-%d %H:%M}] Reminder for {reminder['username']}: time to study!", flush=True)
+
+
+# Reminder daemon: keeps every enabled reminder in a heap keyed on its next
+# fire time and sleeps until the earliest one is due
+class ReminderScheduler:
+    def __init__(self, db, clock=None, on_fire=print_reminder, check_interval=30):
+        self.db = db
+        self.clock = clock or SystemClock()
+        self.on_fire = on_fire
+        self.check_interval = check_interval
+        self.heap = []
+        self.reminders = {}
+        self.by_user = {}
+        self.last_change = 0
+        self.changes_pending = False
+        self.sequence = 0
+
+    def _query(self, where="", params=()):
+        cursor = self.db.cursor
+        cursor.execute(
+            "SELECT r.reminder_id, r.user_id, r.time, r.days, u.username "
+            "FROM study_reminders r JOIN users u ON u.user_id = r.user_id "
+            "WHERE r.enabled = %s" + where, (True,) + tuple(params))
+        return cursor.fetchall()
+
+    def _schedule(self, row, after):
+        try:
+            time_of_day = parse_time(row['time'])
+        except ValueError:
+            # Rows written before times were validated; one bad row must not
+            # stop the daemon
+            print(f"==> Skipping reminder {row['reminder_id']}: invalid time '{row['time']}'", flush=True)
+            return
+        fire_at = next_fire(after, time_of_day, parse_days(row['days']))
+        if fire_at is None:
+            return
+        self.sequence += 1
+        row['fire_at'] = fire_at
+        row['sequence'] = self.sequence
+        self.reminders[row['reminder_id']] = row
+        self.by_user.setdefault(row['user_id'], set()).add(row['reminder_id'])
+        heapq.heappush(self.heap, (fire_at, row['reminder_id'], self.sequence))
+
+    def _unschedule(self, reminder_id):
+        # Heap entries are dropped lazily when they no longer match
+        row = self.reminders.pop(reminder_id, None)
+        if row:
+            self.by_user.get(row['user_id'], set()).discard(reminder_id)
+
+    def load(self):
+        cursor = self.db.cursor
+        cursor.execute("SELECT MAX(change_id) AS last_change FROM reminder_changes")
+        self.last_change = cursor.fetchone()['last_change'] or 0
+        self.heap = []
+        self.reminders = {}
+        self.by_user = {}
+        now = self.clock.now()
+        for row in self._query():
+            self._schedule(row, now)
+        self.db.commit()
+        return len(self.reminders)
+
+    def reload_users(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        for user_id in user_ids:
+            for reminder_id in list(self.by_user.pop(user_id, ())):
+                self._unschedule(reminder_id)
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        now = self.clock.now()
+        for row in self._query(f" AND r.user_id IN ({placeholders})", user_ids):
+            self._schedule(row, now)
+
+    def check_changes(self):
+        # New changes are a short primary key range read. Once they are
+        # loaded the rows before the newest are deleted; that one is kept so
+        # that MySQL, which resets AUTO_INCREMENT to MAX() + 1 on restart,
+        # never hands out a change_id at or below last_change again
+        cursor = self.db.cursor
+        cursor.execute("SELECT change_id, user_id FROM reminder_changes WHERE change_id > %s ORDER BY change_id",
+                       (self.last_change,))
+        changes = cursor.fetchall()
+        self.changes_pending = False
+        if changes:
+            self.last_change = changes[-1]['change_id']
+            self.reload_users({change['user_id'] for change in changes})
+            cursor.execute("DELETE FROM reminder_changes WHERE change_id < %s", (self.last_change,))
+        self.db.commit()
+        return len(changes)
+
+    def notify(self):
+        # Safe to call from a signal handler or another thread
+        self.changes_pending = True
+        self.clock.wake()
+
+    def next_due(self):
+        while self.heap:
+            fire_at, reminder_id, sequence = self.heap[0]
+            row = self.reminders.get(reminder_id)
+            if row and row['sequence'] == sequence:
+                return fire_at
+            heapq.heappop(self.heap)
+        return None
+
+    def run_pending(self):
+        fired = 0
+        now = self.clock.now()
+        while True:
+            fire_at = self.next_due()
+            if fire_at is None or fire_at > now:
+                return fired
+            _, reminder_id, _ = heapq.heappop(self.heap)
+            row = self.reminders[reminder_id]
+            self.on_fire(row, fire_at)
+            fired += 1
+            self._schedule(row, fire_at)
+
+    def run(self, until=None):
+        # check_interval=None disables the periodic change check; notify()
+        # still triggers one
+        self.load()
+        interval = timedelta(seconds=self.check_interval) if self.check_interval else None
+        next_check = self.clock.now() + interval if interval else None
+        while until is None or self.clock.now() < until:
+            self.run_pending()
+            now = self.clock.now()
+            if self.changes_pending or (next_check and now >= next_check):
+                self.check_changes()
+                next_check = now + interval if interval else None
+                continue
+            candidates = [moment for moment in (next_check, self.next_due(), until) if moment is not None]
+            if not candidates:
+                # Nothing scheduled and nothing to poll: wait for notify()
+                self.clock.sleep(24 * 60 * 60)
+                continue
+            self.clock.sleep((min(candidates) - now).total_seconds())
@@ -4,12 +4,15 @@ USE studyspark;
 CREATE TABLE users (
     user_id INT AUTO_INCREMENT PRIMARY KEY,
     username VARCHAR(50) UNIQUE,
-    password VARCHAR(64),
+    password VARCHAR(255),
     streak INT DEFAULT 0,
     points INT DEFAULT 0,
+    badge_count INT DEFAULT 0,
     last_study_date DATE
 );
 
+CREATE INDEX idx_users_ranking ON users (streak, points, badge_count);
+
 CREATE TABLE badges (
     badge_id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT,
@@ -42,6 +45,7 @@ CREATE TABLE study_groups (
     group_id INT AUTO_INCREMENT PRIMARY KEY,
     group_name VARCHAR(100),
     creator_id INT,
+    member_count INT DEFAULT 0,
     FOREIGN KEY (creator_id) REFERENCES users(user_id)
 );
 
@@ -0,0 +1,413 @@
+import asyncio
+import json
+import multiprocessing
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+from main import (Database, GroupBoards, Leaderboard, ProgressReport, ResourceCache, StudyGroup, StudyReminder,
+                  StudySession, User)
+from analytics import PeriodCache, StudyAnalytics
+from journal import SessionWriter
+from passwords import check_login, hash_password
+from quotes import create_provider
+
+MAX_BODY = 64 * 1024
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+           404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# The managers for one request, all sharing a single pooled connection
+class RequestContext:
+    def __init__(self, db, index, quotes, session, query, body, journal=None, resource_cache=None,
+                 period_cache=None, group_boards=None):
+        self.db = db
+        self.leaderboard = Leaderboard(db, index, group_boards)
+        self.users = User(db, self.leaderboard)
+        self.sessions = StudySession(db, quotes, journal)
+        self.reports = ProgressReport(self.users, self.sessions, db)
+        self.groups = StudyGroup(db, resource_cache, group_boards)
+        self.analytics = StudyAnalytics(db, period_cache)
+        self.reminders = StudyReminder(db)
+        self.session = session
+        self.query = query
+        self.body = body
+
+    def field(self, name, kind=str):
+        value = self.body.get(name)
+        if value is None or value == "":
+            raise ApiError(400, f"'{name}' is required")
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            raise ApiError(400, f"'{name}' is not valid")
+
+    def param(self, name, kind=str, default=None):
+        values = self.query.get(name)
+        if not values:
+            return default
+        try:
+            return kind(values[0])
+        except ValueError:
+            raise ApiError(400, f"'{name}' is not valid")
+
+
+def _date(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+# Request handlers: each takes a RequestContext and returns (status, payload)
+def start_session(ctx):
+    session = ctx.sessions.begin(ctx.session['user_id'], ctx.field('session_name'), ctx.field('duration', int))
+    return 201, session
+
+
+def end_session(ctx):
+    session = ctx.sessions.finish(ctx.session['user_id'])
+    if not session:
+        raise ApiError(404, "No active study session found")
+    if ctx.sessions.journal is None:
+        # Journaled sessions reach the leaderboard when the writer flushes them
+        session['streak'] = ctx.users.refresh(ctx.session['username']).streak
+    return 200, session
+
+
+def list_sessions(ctx):
+    limit = max(1, min(ctx.param('limit', int, 100), 1000))
+    sessions = ctx.sessions.iter_sessions(
+        ctx.session['user_id'], ctx.param('status'), ctx.param('since', _date), ctx.param('until', _date),
+        page_size=limit)
+    return 200, {'sessions': list(islice(sessions, limit))}
+
+
+def view_report(ctx):
+    report = ctx.reports.build_report(ctx.session['username'])
+    if not report:
+        raise ApiError(404, "User not found")
+    return 200, report
+
+
+def view_leaderboard(ctx):
+    user_id = ctx.session['user_id'] if ctx.session else None
+    page_size = max(1, min(ctx.param('page_size', int, 10), 100))
+    return 200, ctx.leaderboard.standings(user_id, max(ctx.param('page', int, 1), 1), page_size)
+
+
+def view_analytics(ctx):
+    return 200, ctx.analytics.report(max(1, min(ctx.param('weeks', int, 12), 104)), user_id=ctx.session['user_id'])
+
+
+def group_analytics(ctx, group_id):
+    return 200, ctx.analytics.report(max(1, min(ctx.param('weeks', int, 12), 104)), group_id=int(group_id))
+
+
+def group_leaderboard(ctx, group_id):
+    user_id = ctx.session['user_id'] if ctx.session else None
+    page_size = max(1, min(ctx.param('page_size', int, 10), 100))
+    standings = ctx.groups.standings(group_id, user_id, max(ctx.param('page', int, 1), 1), page_size)
+    if standings is None:
+        raise ApiError(404, "Study group not found")
+    return 200, standings
+
+
+def list_groups(ctx):
+    limit = max(1, min(ctx.param('limit', int, 20), 100))
+    term = ctx.param('q')
+    if term:
+        return 200, {'groups': ctx.groups.search(term, limit), 'next': None}
+    groups = ctx.groups.list_groups(ctx.param('after', int, 0), limit)
+    return 200, {'groups': groups, 'next': groups[-1]['group_id'] if len(groups) == limit else None}
+
+
+def create_group(ctx):
+    group_name = ctx.field('group_name')
+    return 201, {'group_id': ctx.groups.create(ctx.session['user_id'], group_name), 'group_name': group_name}
+
+
+def join_group(ctx, group_id):
+    joined = ctx.groups.join(int(group_id), ctx.session['user_id'])
+    if joined is None:
+        raise ApiError(404, "Study group not found")
+    if not joined:
+        raise ApiError(409, "You are already a member of this group")
+    return 200, {'group_id': int(group_id)}
+
+
+def list_resources(ctx, group_id):
+    limit = max(1, min(ctx.param('limit', int, 100), 1000))
+    return 200, {'resources': ctx.groups.resources(int(group_id), limit)}
+
+
+def add_resource(ctx, group_id):
+    if not ctx.groups.share(int(group_id), ctx.session['user_id'], ctx.field('resource_name'),
+                            ctx.field('resource_link')):
+        raise ApiError(403, "You are not a member of this group")
+    return 201, {'group_id': int(group_id)}
+
+
+def list_reminders(ctx):
+    return 200, {'reminders': ctx.reminders.reminders(ctx.session['user_id'])}
+
+
+def add_reminder(ctx):
+    reminder_id = ctx.reminders.add_reminder(ctx.session['user_id'], ctx.field('time'), ctx.field('days'))
+    if reminder_id is None:
+        raise ApiError(400, "'time' must be HH:MM")
+    return 201, {'reminder_id': reminder_id}
+
+
+def remove_reminder(ctx, reminder_id):
+    if not ctx.reminders.remove_reminder(ctx.session['user_id'], int(reminder_id)):
+        raise ApiError(404, "Reminder not found")
+    return 200, {'reminder_id': int(reminder_id)}
+
+
+def encouragement(ctx):
+    return 200, ctx.sessions.quote_provider.get()
+
+
+# (method, path pattern, handler, needs login)
+ROUTES = [
+    ("POST", r"/sessions/start", start_session, True),
+    ("POST", r"/sessions/end", end_session, True),
+    ("GET", r"/sessions", list_sessions, True),
+    ("GET", r"/report", view_report, True),
+    ("GET", r"/leaderboard", view_leaderboard, False),
+    ("GET", r"/analytics", view_analytics, True),
+    ("GET", r"/groups", list_groups, False),
+    ("POST", r"/groups", create_group, True),
+    ("POST", r"/groups/(\d+)/join", join_group, True),
+    ("GET", r"/groups/(\d+)/resources", list_resources, False),
+    ("GET", r"/groups/(\d+)/analytics", group_analytics, False),
+    ("GET", r"/groups/(\d+)/leaderboard", group_leaderboard, False),
+    ("POST", r"/groups/(\d+)/resources", add_resource, True),
+    ("GET", r"/reminders", list_reminders, True),
+    ("POST", r"/reminders", add_reminder, True),
+    ("DELETE", r"/reminders/(\d+)", remove_reminder, True),
+    ("GET", r"/encouragement", encouragement, False),
+]
+
+
+# asyncio HTTP/JSON front end: sockets are handled on the event loop, the
+# blocking database work runs on a worker pool sized to the connection pool,
+# and password hashing runs in separate processes so a burst of logins
+# neither blocks the loop nor holds database connections
+class StudySparkServer:
+    def __init__(self, backend, workers=None, token_ttl=12 * 60 * 60, kdf_workers=None, journal_path=None,
+                 profiler=None):
+        self.backend = backend
+        self.profiler = profiler
+        # The session writer keeps one pooled connection for good, and
+        # mysql.connector's pool fails a checkout rather than waiting, so the
+        # workers get the rest
+        if not workers:
+            workers = max(backend.pool_size - 1, 1) if journal_path else backend.pool_size
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # spawn, because forking a process that already runs threads is unsafe
+        self.kdf_pool = ProcessPoolExecutor(max_workers=kdf_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.token_ttl = token_ttl
+        self.tokens = {}
+        self.tokens_lock = threading.Lock()
+        self.index = None
+        self.quotes = create_provider()
+        self.resource_cache = ResourceCache()
+        self.group_boards = GroupBoards()
+        self.period_cache = PeriodCache()
+        self.journal = SessionWriter(backend, journal_path, on_flush=self._flushed) if journal_path else None
+        self.routes = [(method, re.compile(pattern + "$"), handler, needs_login)
+                       for method, pattern, handler, needs_login in ROUTES]
+
+    def _run(self, work):
+        # Runs on a worker thread with its own pooled connection
+        db = Database(self.backend, self.profiler)
+        try:
+            return work(db)
+        except self.backend.Error:
+            # Only a failed connect (or an exhausted pool) means the database
+            # is unavailable; other errors are real failures
+            if db.connected:
+                raise
+            raise ApiError(503, "Database unavailable")
+        finally:
+            db.close()
+
+    def _load_index(self, db):
+        return Leaderboard(db).load_index()
+
+    def _flushed(self, db, user_ids):
+        # Runs on the session writer thread after each group commit
+        Leaderboard(db, self.index, self.group_boards).refresh_users(user_ids)
+
+    def _credentials(self, body):
+        username, password = body.get('username'), body.get('password')
+        if not isinstance(username, str) or not isinstance(password, str) or not username or not password:
+            raise ApiError(400, "'username' and 'password' are required")
+        return username, password
+
+    async def _register(self, body):
+        username, password = self._credentials(body)
+        loop = asyncio.get_running_loop()
+        hashed = await loop.run_in_executor(self.kdf_pool, hash_password, password)
+        user_id = await loop.run_in_executor(
+            self.executor, self._run,
+            lambda db: User(db, Leaderboard(db, self.index, self.group_boards)).create_account(username, password, hashed))
+        if user_id is None:
+            raise ApiError(409, "Username already exists")
+        return 201, {'user_id': user_id, 'username': username}
+
+    async def _login(self, body):
+        # Fetch, verify and record the login as three steps so the database
+        # connection is not held while the hash is being checked
+        username, password = self._credentials(body)
+        loop = asyncio.get_running_loop()
+        account = await loop.run_in_executor(self.executor, self._run, lambda db: User(db).find_account(username))
+        matches, upgraded = await loop.run_in_executor(
+            self.kdf_pool, check_login, password, account['password'] if account else None)
+        if not matches:
+            raise ApiError(401, "Invalid username or password")
+        record = await loop.run_in_executor(
+            self.executor, self._run,
+            lambda db: User(db, Leaderboard(db, self.index, self.group_boards)).complete_login(account, upgraded))
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self.tokens_lock:
+            # Every token lives token_ttl seconds, so insertion order is
+            # expiry order and expired tokens are dropped from the front
+            while self.tokens:
+                oldest = next(iter(self.tokens))
+                if self.tokens[oldest]['expires'] >= now:
+                    break
+                del self.tokens[oldest]
+            self.tokens[token] = {'user_id': record.user_id, 'username': record.username,
+                                  'expires': now + self.token_ttl}
+        return 200, {'token': token, 'user_id': record.user_id, 'username': record.username,
+                     'streak': record.streak, 'points': record.points}
+
+    def session_for(self, headers):
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None, None
+        with self.tokens_lock:
+            session = self.tokens.get(token)
+            if session and session['expires'] < time.monotonic():
+                del self.tokens[token]
+                session = None
+        return token, session
+
+    async def dispatch(self, method, target, headers, raw_body):
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+        except ValueError:
+            return 400, {'error': "Body must be JSON"}
+        if not isinstance(body, dict):
+            return 400, {'error': "Body must be a JSON object"}
+
+        loop = asyncio.get_running_loop()
+        token, session = self.session_for(headers)
+        try:
+            if path == "/login" and method == "POST":
+                return await self._login(body)
+            if path == "/register" and method == "POST":
+                return await self._register(body)
+            if path == "/logout" and method == "POST":
+                with self.tokens_lock:
+                    self.tokens.pop(token, None)
+                return 200, {'logged_out': bool(session)}
+
+            allowed = False
+            for route_method, pattern, handler, needs_login in self.routes:
+                match = pattern.match(path)
+                if not match:
+                    continue
+                allowed = True
+                if route_method != method:
+                    continue
+                if needs_login and not session:
+                    raise ApiError(401, "Please log in first")
+                query = parse_qs(url.query)
+                work = lambda db: handler(
+                    RequestContext(db, self.index, self.quotes, session, query, body, self.journal,
+                                   self.resource_cache, self.period_cache, self.group_boards), *match.groups())
+                return await loop.run_in_executor(self.executor, self._run, work)
+            if allowed:
+                raise ApiError(405, "Method not allowed")
+            raise ApiError(404, "Not found")
+        except ApiError as e:
+            return e.status, {'error': e.message}
+        except Exception as e:
+            print(f"==> Error handling {method} {path}: {e!r}", flush=True)
+            return 500, {'error': "Internal server error"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    status, payload = 413, {'error': "Request body too large"}
+                    keep_alive = False
+                else:
+                    raw_body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method.upper(), target, headers, raw_body)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload, default=str).encode()
+                writer.write(
+                    f"{version} {status} {REASONS.get(status, '')}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        loop = asyncio.get_running_loop()
+        self.index = await loop.run_in_executor(self.executor, self._run, self._load_index)
+        if self.journal:
+            replayed = await loop.run_in_executor(self.executor, self.journal.start)
+            print(f"==> Session journal open, {replayed} unflushed events replayed", flush=True)
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print(f"==> StudySpark API listening on http://{host}:{port}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def run(self, host="127.0.0.1", port=8080):
+        try:
+            asyncio.run(self.serve(host, port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.executor.shutdown(wait=False)
+            if self.journal:
+                self.journal.stop()
+            self.kdf_pool.shutdown(wait=False, cancel_futures=True)
+            self.quotes.stop()
@@ -0,0 +1,308 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, time, timedelta
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+
+def upsert_sql(dialect, table, columns, key, updates):
+    # updates maps column -> expression; "{column}" stands for the incoming value
+    placeholders = ", ".join(["%s"] * len(columns))
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    if dialect == "sqlite":
+        incoming = {column: f"excluded.{column}" for column in columns}
+        clause = f" ON CONFLICT ({', '.join(key)}) DO UPDATE SET "
+    else:
+        incoming = {column: f"VALUES({column})" for column in columns}
+        clause = " ON DUPLICATE KEY UPDATE "
+    return query + clause + ", ".join(
+        f"{column} = {expression.format(**incoming)}" for column, expression in updates.items())
+
+
+# Pooled MySQL backend (the production database)
+class MySQLBackend:
+    dialect = "mysql"
+    insert_ignore = "INSERT IGNORE"
+
+    def __init__(self, host="localhost", user="root", port=3311, password="",
+                 database="studyspark", pool_size=5):
+        # mysql.connector takes longer to import than the rest of the app, so
+        # it is loaded by the first checkout or the first `except backend.Error`
+        self.config = {
+            "host": host,
+            "user": user,
+            "port": port,
+            "password": password,
+            "database": database,
+        }
+        self.pool_size = pool_size
+        self.pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def Error(self):
+        import mysql.connector
+        return mysql.connector.Error
+
+    def connect(self):
+        # The pool is only created on the first checkout so that building a
+        # backend never touches the network.
+        with self._lock:
+            if self.pool is None:
+                from mysql.connector import pooling
+                self.pool = pooling.MySQLConnectionPool(
+                    pool_name="studyspark", pool_size=self.pool_size, **self.config)
+        return self.pool.get_connection()
+
+    def cursor(self, connection):
+        return connection.cursor(dictionary=True, buffered=True)
+
+    def upsert(self, table, columns, key, updates):
+        return upsert_sql(self.dialect, table, columns, key, updates)
+
+    def hour(self, column):
+        return f"HOUR({column})"
+
+    def release(self, connection):
+        # Closing a pooled connection hands it back to the pool
+        connection.close()
+
+    def shard(self, period, connection):
+        # Archived sessions for one month go to their own table next to the
+        # hot one, so they are read on the caller's connection; returns
+        # (connection, table)
+        return connection, f"study_sessions_{period:%Y%m}"
+
+    def create_shard(self, period, connection):
+        connection, table = self.shard(period, connection)
+        self.cursor(connection).execute(f"CREATE TABLE IF NOT EXISTS {table} LIKE study_sessions")
+        return connection, table
+
+    def release_shard(self, connection):
+        # The caller's connection, which the caller releases
+        pass
+
+    def close(self):
+        pass
+
+
+# Cursor wrapper that gives sqlite3 the same surface as a MySQL dictionary cursor
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query.replace("%s", "?"), params)
+        return self
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(query.replace("%s", "?"), seq_of_params)
+        return self
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    def fetchall(self):
+        return [dict(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size):
+        return [dict(row) for row in self._cursor.fetchmany(size)]
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+def _parse_date(value):
+    return date.fromisoformat(value.decode()[:10])
+
+
+def _parse_time(value):
+    # MySQL hands TIME columns back as timedelta, so do the same here. SQLite
+    # does not check types on insert, so text that isn't a time comes back
+    # as it was stored instead of failing the whole fetch
+    try:
+        parts = [int(p) for p in value.decode().split(":")]
+        parts += [0] * (3 - len(parts))
+        return timedelta(hours=parts[0], minutes=parts[1], seconds=parts[2])
+    except (ValueError, IndexError):
+        return value.decode()
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(time, lambda value: value.strftime("%H:%M:%S"))
+sqlite3.register_adapter(timedelta, lambda value: "%02d:%02d:%02d" % (
+    value.seconds // 3600 + value.days * 24, value.seconds // 60 % 60, value.seconds % 60))
+sqlite3.register_converter("DATETIME", _parse_datetime)
+sqlite3.register_converter("DATE", _parse_date)
+sqlite3.register_converter("TIME", _parse_time)
+
+
+def as_date(value):
+    # DATE() comes back as a date from MySQL and as text from SQLite, since
+    # the converters above only see declared column types
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+# Schema of a per-month SQLite shard of archived sessions
+SHARD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS study_sessions (
+    session_id INTEGER PRIMARY KEY,
+    user_id INT,
+    session_name VARCHAR(100),
+    duration INT,
+    start_time DATETIME,
+    end_time DATETIME,
+    actual_duration FLOAT,
+    status VARCHAR(20)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_start ON study_sessions (user_id, start_time, session_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_status_start_cover
+    ON study_sessions (status, start_time, user_id, duration, actual_duration);
+"""
+
+
+def sqlite_schema(script):
+    # Turn the MySQL schema.sql into something sqlite3 can run
+    script = re.sub(r"(?im)^\s*(CREATE DATABASE|USE)\b[^;]*;", "", script)
+    script = re.sub(r"(?i)\bINT AUTO_INCREMENT PRIMARY KEY\b",
+                    "INTEGER PRIMARY KEY AUTOINCREMENT", script)
+    return script
+
+
+# Embedded SQLite backend (WAL mode) for local runs and tests
+class SQLiteBackend:
+    dialect = "sqlite"
+    insert_ignore = "INSERT OR IGNORE"
+    Error = sqlite3.Error
+
+    def __init__(self, path=":memory:", pool_size=5):
+        if path == ":memory:":
+            # A named shared-cache database lets every pooled connection see
+            # the same in-memory tables
+            self.uri = f"file:studyspark-{id(self)}?mode=memory&cache=shared"
+        else:
+            self.uri = "file:" + os.path.abspath(path)
+        self.path = path
+        self.pool_size = pool_size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._anchor = None
+        self._shard_anchors = {}
+
+    def _open(self, uri=None):
+        connection = sqlite3.connect(
+            uri or self.uri, uri=True, detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA foreign_keys = ON")
+        if self.path != ":memory:":
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    def _bootstrap(self, connection):
+        # Embedded databases have no admin step, so bring them up to date here
+        from migrations import MigrationRunner
+        MigrationRunner(self, connection).migrate()
+
+    def connect(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._anchor is None:
+                # Keeps in-memory databases alive and migrates the schema once
+                self._anchor = self._open()
+                self._bootstrap(self._anchor)
+        return self._open()
+
+    def cursor(self, connection):
+        return SQLiteCursor(connection.cursor())
+
+    def upsert(self, table, columns, key, updates):
+        return upsert_sql(self.dialect, table, columns, key, updates)
+
+    def hour(self, column):
+        return f"CAST(strftime('%H', {column}) AS INTEGER)"
+
+    def release(self, connection):
+        connection.rollback()
+        if self._idle.qsize() < self.pool_size:
+            self._idle.put(connection)
+        else:
+            connection.close()
+
+    def shard(self, period, connection=None):
+        # Archived sessions for one month live in their own file next to the
+        # main database (studyspark.db -> studyspark.2025-03.db), which stops
+        # changing once the month is archived; returns (connection, table)
+        if self.path == ":memory:":
+            uri = self.uri.replace("?", f"-{period:%Y-%m}?")
+        else:
+            root, ext = os.path.splitext(os.path.abspath(self.path))
+            uri = f"file:{root}.{period:%Y-%m}{ext or '.db'}"
+        connection = self._open(uri)
+        if self.path == ":memory:":
+            # The first connection keeps an in-memory shard alive
+            with self._lock:
+                if uri not in self._shard_anchors:
+                    self._shard_anchors[uri] = connection
+                    connection = self._open(uri)
+        return connection, "study_sessions"
+
+    def create_shard(self, period, connection=None):
+        connection, table = self.shard(period)
+        connection.executescript(SHARD_SCHEMA)
+        return connection, table
+
+    def release_shard(self, connection):
+        connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        if self._anchor is not None:
+            self._anchor.close()
+            self._anchor = None
+        for anchor in self._shard_anchors.values():
+            anchor.close()
+        self._shard_anchors.clear()
+
+
+def create_backend(url=None):
+    # STUDYSPARK_DB selects the backend: "mysql" (default) or "sqlite:<path>",
+    # e.g. "sqlite:studyspark.db" or "sqlite::memory:"
+    url = url or os.environ.get("STUDYSPARK_DB", "mysql")
+    if url.startswith("sqlite:"):
+        return SQLiteBackend(url[len("sqlite:"):] or ":memory:")
+    if url == "mysql":
+        return MySQLBackend(
+            host=os.environ.get("STUDYSPARK_DB_HOST", "localhost"),
+            user=os.environ.get("STUDYSPARK_DB_USER", "root"),
+            port=int(os.environ.get("STUDYSPARK_DB_PORT", "3311")),
+            password=os.environ.get("STUDYSPARK_DB_PASSWORD", ""),
+            database=os.environ.get("STUDYSPARK_DB_NAME", "studyspark"),
+            pool_size=int(os.environ.get("STUDYSPARK_DB_POOL_SIZE", "5")),
+        )
+    raise ValueError(f"Unknown database backend: {url}")
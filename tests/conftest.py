@@ -0,0 +1,53 @@
+import os
+import sys
+from datetime import timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Database
+from storage import SQLiteBackend
+
+
+@pytest.fixture
+def backend():
+    # A fresh shared-cache in-memory database per test, migrated on first use
+    backend = SQLiteBackend(":memory:")
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def db(backend):
+    db = Database(backend)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def add_user(db):
+    def add_user(username, **columns):
+        columns = {'streak': 0, 'points': 0, **columns}
+        names = ["username", "password"] + list(columns)
+        cursor = db.cursor
+        cursor.execute(f"INSERT INTO users ({', '.join(names)}) VALUES ({', '.join(['%s'] * len(names))})",
+                       [username, "x"] + list(columns.values()))
+        db.commit()
+        return cursor.lastrowid
+    return add_user
+
+
+@pytest.fixture
+def add_session(db):
+    def add_session(user_id, start_time, minutes=30, status="Completed", name="study"):
+        completed = status == "Completed"
+        cursor = db.cursor
+        cursor.execute(
+            "INSERT INTO study_sessions (user_id, session_name, duration, start_time, end_time, actual_duration, "
+            "status) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (user_id, name, 30, start_time, start_time + timedelta(minutes=minutes) if completed else None,
+             minutes if completed else None, status))
+        db.commit()
+        return cursor.lastrowid
+    return add_session
@@ -0,0 +1,66 @@
+from datetime import date, datetime, timedelta
+
+from analytics import StudyAnalytics
+from archive import SessionArchive
+from main import StatsRollup, StudySession
+
+NOW = datetime(2026, 10, 19, 12, 0)
+
+
+def history(db, user_id):
+    return [(row['session_id'], row['start_time'], row['status'])
+            for row in StudySession(db).iter_sessions(user_id, page_size=5)]
+
+
+def hot_count(db):
+    cursor = db.cursor
+    cursor.execute("SELECT COUNT(*) AS sessions FROM study_sessions")
+    return cursor.fetchone()['sessions']
+
+
+def seed(add_user, add_session):
+    # Two users with a session every 9 days over the last 300 days, plus one
+    # old session that is still running
+    users = [add_user("ann"), add_user("bob")]
+    for user_id in users:
+        for days in range(0, 300, 9):
+            add_session(user_id, NOW - timedelta(days=days, hours=user_id), minutes=20 + days % 40)
+    add_session(users[0], NOW - timedelta(days=250), status="In Progress")
+    return users
+
+
+def test_round_trip(db, add_user, add_session):
+    users = seed(add_user, add_session)
+    StatsRollup(db).reconcile(repair=True)
+    before = {user_id: history(db, user_id) for user_id in users}
+    analytics = StudyAnalytics(db, clock=lambda: NOW)
+    report = analytics.cohort_report(45)
+    report.pop('cached_weeks')
+    total = hot_count(db)
+
+    archive = SessionArchive(db, retention_days=120, batch_size=7, clock=lambda: NOW)
+    archived = archive.run()
+
+    # Every month entirely before June 2026 (120 days back, rounded down to a month)
+    assert [period for period, _ in archived] == [date(2025, 12, 1), date(2026, 1, 1), date(2026, 2, 1),
+                                                 date(2026, 3, 1), date(2026, 4, 1), date(2026, 5, 1)]
+    moved = sum(count for _, count in archived)
+    assert hot_count(db) == total - moved
+    assert archive.run() == []
+
+    assert {user_id: history(db, user_id) for user_id in users} == before
+    again = StudyAnalytics(db, clock=lambda: NOW).cohort_report(45)
+    again.pop('cached_weeks')
+    assert again == report
+    assert StatsRollup(db).reconcile() == []
+
+    summaries = archive.summaries(users[0])
+    assert sum(row['sessions'] for row in summaries) == sum(
+        1 for _, start, status in before[users[0]] if status == "Completed" and start < datetime(2026, 6, 1))
+
+
+def test_running_sessions_stay_hot(db, add_user, add_session):
+    ann = add_user("ann")
+    add_session(ann, NOW - timedelta(days=250), status="In Progress")
+    assert SessionArchive(db, retention_days=120, clock=lambda: NOW).run() == []
+    assert hot_count(db) == 1
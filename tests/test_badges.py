@@ -0,0 +1,39 @@
+from main import BadgeEngine
+
+
+def badges(db, user_id):
+    cursor = db.cursor
+    cursor.execute("SELECT badge_name FROM badges WHERE user_id = %s ORDER BY badge_name", (user_id,))
+    names = [row['badge_name'] for row in cursor.fetchall()]
+    cursor.execute("SELECT badge_count FROM users WHERE user_id = %s", (user_id,))
+    assert cursor.fetchone()['badge_count'] == len(names)
+    return names
+
+
+def test_evaluate_awards_each_badge_once(db, add_user):
+    ann = add_user("ann", streak=8, points=1200)
+    engine = BadgeEngine(db)
+    user = {'user_id': ann, 'streak': 8, 'points': 1200}
+    assert engine.evaluate(user) == ["7-Day Streak", "1000 Points"]
+    assert engine.evaluate(user) == []
+    assert badges(db, ann) == ["1000 Points", "7-Day Streak"]
+
+
+def test_evaluate_all_in_chunks(db, add_user):
+    users = [add_user(f"user{i}", streak=i * 4, points=i * 300) for i in range(10)]
+    engine = BadgeEngine(db)
+    # Already owned, so not awarded again
+    engine.award(db.cursor, [(users[9], "30-Day Streak")])
+    db.commit()
+
+    scored, awarded = engine.evaluate_all(chunk_size=3)
+
+    assert scored == 10
+    expected = {
+        user_id: sorted(name for name, field, threshold in engine.rules
+                        if {'streak': i * 4, 'points': i * 300}[field] >= threshold)
+        for i, user_id in enumerate(users)
+    }
+    assert awarded == sum(len(names) for names in expected.values()) - 1
+    assert {user_id: badges(db, user_id) for user_id in users} == expected
+    assert engine.evaluate_all(chunk_size=3) == (10, 0)
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+from main import GroupBoards, Leaderboard, LeaderboardIndex, StudyGroup
+
+
+def user(user_id, streak=0, points=0):
+    return {'user_id': user_id, 'username': f"user{user_id}", 'streak': streak, 'points': points, 'badge_count': 0}
+
+
+def test_standings_are_cached_and_kept_current(db, add_user, add_session):
+    ann, bob = add_user("ann", streak=1), add_user("bob", streak=2)
+    boards = GroupBoards()
+    groups = StudyGroup(db, group_boards=boards)
+    group_id = groups.create(ann, "biology")
+    add_session(ann, datetime.now() - timedelta(hours=1), minutes=45)
+    groups.join(group_id, ann)
+    groups.join(group_id, bob)
+
+    standings = groups.standings(group_id, ann)
+    assert [leader['user_id'] for leader in standings['leaders']] == [bob, ann]
+    assert (standings['rank'], standings['total']) == (2, 2)
+    assert standings['weekly'][-1]['minutes'] == 45
+    assert boards.get(group_id) is not None
+
+    # Leaderboard.record updates the cached board in place
+    Leaderboard(db, group_boards=boards).record({**user(ann, streak=5), 'username': "ann"})
+    assert boards.get(group_id)['weekly'] is None
+    assert groups.standings(group_id, ann)['rank'] == 1
+    assert groups.standings(404) is None
+
+
+def board(*members):
+    index = LeaderboardIndex()
+    index.load([user(user_id) for user_id in members])
+    return {'group_name': "g", 'index': index, 'weekly': None}
+
+
+def test_board_read_during_a_member_change_is_not_stored():
+    boards = GroupBoards()
+    token = boards.token(7)
+    boards.update(user(1))
+    boards.put(7, board(1, 2), token)
+    assert boards.get(7) is None
+
+    # Changes to users outside the group don't stop it being cached
+    token = boards.token(7)
+    boards.update(user(3))
+    boards.add_member(8, user(3))
+    boards.put(7, board(1, 2), token)
+    assert boards.get(7) is not None
+
+    # A board read before the oldest remembered change can't be checked
+    boards = GroupBoards(max_changes=1)
+    boards.update(user(1))
+    token = boards.token(7)
+    boards.update(user(2))
+    boards.update(user(3))
+    boards.put(7, board(1), token)
+    assert boards.get(7) is None
+
+
+def test_eviction_forgets_memberships(db, add_user):
+    ann = add_user("ann")
+    boards = GroupBoards(max_size=1)
+    groups = StudyGroup(db, group_boards=boards)
+    first, second = groups.create(ann, "one"), groups.create(ann, "two")
+    groups.join(first, ann)
+    groups.join(second, ann)
+    groups.board(first)
+    groups.board(second)
+    assert boards.get(first) is None
+    assert boards.memberships == {ann: {second}}
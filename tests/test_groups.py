@@ -0,0 +1,66 @@
+from main import ResourceCache, StudyGroup
+
+
+def test_search_treats_wildcards_literally(db, add_user):
+    ann = add_user("ann")
+    groups = StudyGroup(db)
+    names = ["100% Math", "1000 Math", "a_b club", "axb club", "wow! physics", "wow physics", "physics lab"]
+    for name in names:
+        groups.create(ann, name)
+
+    def found(term):
+        return [group['group_name'] for group in groups.search(term)]
+
+    assert found("100%") == ["100% Math"]
+    assert found("a_b") == ["a_b club"]
+    assert found("wow!") == ["wow! physics"]
+    # Prefix matches come before matches elsewhere in the name
+    assert found("physics") == ["physics lab", "wow! physics", "wow physics"]
+    assert found("   ") == []
+
+
+def test_list_groups_pages_and_counts_members(db, add_user):
+    ann, bob = add_user("ann"), add_user("bob")
+    groups = StudyGroup(db)
+    ids = [groups.create(ann, f"group {i}") for i in range(5)]
+    assert groups.join(ids[1], ann) and groups.join(ids[1], bob)
+    assert not groups.join(ids[1], bob)
+    assert groups.join(ids[-1] + 1, bob) is None
+
+    first = groups.list_groups(limit=3)
+    assert [group['group_id'] for group in first] == ids[:3]
+    rest = groups.list_groups(after_id=first[-1]['group_id'], limit=3)
+    assert [group['group_id'] for group in rest] == ids[3:]
+    assert [group['members'] for group in first] == [0, 2, 0]
+
+
+def test_resources_cache_is_invalidated_by_writes(db, add_user):
+    ann, bob = add_user("ann"), add_user("bob")
+    cache = ResourceCache()
+    groups = StudyGroup(db, cache)
+    group_id = groups.create(ann, "chemistry")
+    assert not groups.share(group_id, ann, "notes", "https://example.com/notes")
+    groups.join(group_id, ann)
+    assert groups.share(group_id, ann, "notes", "https://example.com/notes")
+
+    assert [row['resource_name'] for row in groups.resources(group_id)] == ["notes"]
+    assert cache.get(group_id) is not None
+    # A second handle sharing the cache sees the other's writes
+    StudyGroup(db, cache).share(group_id, ann, "slides", "https://example.com/slides")
+    assert cache.get(group_id) is None
+    assert [row['resource_name'] for row in groups.resources(group_id)] == ["slides", "notes"]
+    groups.join(group_id, bob)
+    assert cache.get(group_id) is None
+
+
+def test_stale_put_is_dropped():
+    cache = ResourceCache(max_size=2)
+    token = cache.token(1)
+    cache.invalidate(1)
+    cache.put(1, ["stale"], token)
+    assert cache.get(1) is None
+    cache.put(1, ["fresh"], cache.token(1))
+    cache.put(2, [], cache.token(2))
+    cache.put(3, [], cache.token(3))
+    # Least recently used entry goes first
+    assert cache.get(1) is None and cache.get(3) == []
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+
+from journal import SessionJournal, SessionWriter
+
+START = datetime(2026, 10, 19, 9, 0)
+
+
+def sessions(db):
+    cursor = db.cursor
+    cursor.execute("SELECT user_id, start_time, status, actual_duration FROM study_sessions ORDER BY session_id")
+    rows = cursor.fetchall()
+    db.commit()
+    return rows
+
+
+def journal_events(path, events):
+    # Events written as the server would before a crash, none of them applied
+    journal = SessionJournal(str(path))
+    journal.open(0)
+    for event in events:
+        journal.append(event)
+    journal.close()
+
+
+def test_writer_applies_begin_and_finish(backend, db, add_user, tmp_path):
+    ann = add_user("ann")
+    writer = SessionWriter(backend, str(tmp_path / "sessions.log"))
+    assert writer.start() == 0
+    started = writer.begin(ann, "math", 30)
+    finished = writer.finish(ann)
+    assert finished['session_name'] == "math"
+    assert writer.finish(ann) is None
+    writer.stop()
+
+    rows = sessions(db)
+    assert [(row['user_id'], row['start_time'], row['status']) for row in rows] == \
+        [(ann, started['start_time'], "Completed")]
+    cursor = db.cursor
+    cursor.execute("SELECT streak FROM users WHERE user_id = %s", (ann,))
+    assert cursor.fetchone()['streak'] == 1
+
+
+def test_replays_unapplied_events_once(backend, db, add_user, tmp_path):
+    ann = add_user("ann")
+    path = tmp_path / "sessions.log"
+    journal_events(path, [
+        {'type': "start", 'user_id': ann, 'session_name': "math", 'duration': 30, 'start_time': START},
+        {'type': "end", 'user_id': ann, 'start_time': START, 'end_time': START + timedelta(minutes=25),
+         'actual_duration': 25.0},
+        {'type': "start", 'user_id': ann, 'session_name': "art", 'duration': 30,
+         'start_time': START + timedelta(hours=1)},
+    ])
+
+    writer = SessionWriter(backend, str(path))
+    assert writer.start() == 3
+    writer.stop()
+    assert [(row['status'], row['actual_duration']) for row in sessions(db)] == \
+        [("Completed", 25.0), ("In Progress", None)]
+
+    # Restarting after the events were applied replays nothing
+    writer = SessionWriter(backend, str(path))
+    assert writer.start() == 0
+    assert writer.active[ann][0]['start_time'] == START + timedelta(hours=1)
+    writer.stop()
+    assert len(sessions(db)) == 2
+
+
+def test_torn_tail_is_cut_off(backend, db, add_user, tmp_path):
+    ann = add_user("ann")
+    path = tmp_path / "sessions.log"
+    journal_events(path, [
+        {'type': "start", 'user_id': ann, 'session_name': "math", 'duration': 30, 'start_time': START},
+    ])
+    with open(path, "a") as journal:
+        journal.write('{"type": "end", "user_id": ')
+
+    # The events appended after the torn line must survive the next replay
+    journal = SessionJournal(str(path))
+    assert len(journal.open(0)) == 1
+    journal.append({'type': "end", 'user_id': ann, 'start_time': START, 'end_time': START + timedelta(minutes=30),
+                    'actual_duration': 30.0})
+    journal.close()
+
+    writer = SessionWriter(backend, str(path))
+    assert writer.start() == 2
+    writer.stop()
+    assert [row['status'] for row in sessions(db)] == ["Completed"]
+
+
+def test_unmatched_end_is_not_rolled_up(backend, db, add_user, tmp_path):
+    ann = add_user("ann")
+    path = tmp_path / "sessions.log"
+    # An end whose start never reached the database
+    journal_events(path, [
+        {'type': "end", 'user_id': ann, 'start_time': START, 'end_time': START + timedelta(minutes=30),
+         'actual_duration': 30.0},
+    ])
+    flushed = []
+    writer = SessionWriter(backend, str(path), on_flush=lambda db, user_ids: flushed.append(user_ids))
+    assert writer.start() == 1
+    writer.stop()
+
+    assert (sessions(db), flushed) == ([], [])
+    cursor = db.cursor
+    cursor.execute("SELECT COUNT(*) AS n FROM user_stats")
+    assert cursor.fetchone()['n'] == 0
+    cursor.execute("SELECT streak FROM users WHERE user_id = %s", (ann,))
+    assert cursor.fetchone()['streak'] == 0
+
+
+def test_failing_callback_is_committed_or_rolled_back(backend, db, add_user, tmp_path):
+    ann, bob = add_user("ann"), add_user("bob")
+    calls = []
+
+    def on_flush(db, user_ids):
+        calls.append(user_ids)
+        db.cursor.execute("UPDATE users SET points = points + 1 WHERE user_id IN (%s, %s)", (ann, bob))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    # A long flush interval leaves the flushing to the test
+    writer = SessionWriter(backend, str(tmp_path / "sessions.log"), flush_interval=60, on_flush=on_flush)
+    writer.start()
+    writer.begin(ann, "math", 30)
+    writer.finish(ann)
+    writer.flush()
+    # The writer keeps going after the callback fails
+    writer.begin(bob, "art", 30)
+    writer.finish(bob)
+    writer.flush()
+    writer.stop()
+
+    assert calls == [{ann}, {bob}]
+    assert [row['status'] for row in sessions(db)] == ["Completed", "Completed"]
+    # The failed callback's update was rolled back, the second one committed
+    cursor = db.cursor
+    cursor.execute("SELECT points FROM users ORDER BY user_id")
+    assert [row['points'] for row in cursor.fetchall()] == [1, 1]
+
+
+def test_apply_errors_are_retried(backend, db, add_user, tmp_path, monkeypatch):
+    ann = add_user("ann")
+    writer = SessionWriter(backend, str(tmp_path / "sessions.log"), flush_interval=60)
+    writer.start()
+    apply = writer._apply
+    failures = [TypeError("bad row")]
+
+    def flaky(events):
+        if failures:
+            raise failures.pop()
+        return apply(events)
+
+    monkeypatch.setattr(writer, "_apply", flaky)
+    writer.begin(ann, "math", 30)
+    assert writer.flush() == 0
+    assert writer.flush() == 1
+    writer.stop()
+    assert [row['status'] for row in sessions(db)] == ["In Progress"]
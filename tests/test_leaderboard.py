@@ -0,0 +1,61 @@
+import random
+
+from main import Leaderboard, LeaderboardIndex
+
+
+def row(user_id, streak, points, badge_count=0):
+    return {'user_id': user_id, 'username': f"user{user_id}", 'streak': streak, 'points': points,
+            'badge_count': badge_count}
+
+
+def order(rows):
+    # Leaderboard order: streak, then points, then badges, ties to the
+    # higher user_id
+    return [r['user_id'] for r in sorted(rows, key=lambda r: (-r['streak'], -r['points'], -r['badge_count'],
+                                                               -r['user_id']))]
+
+
+def test_index_orders_and_breaks_ties():
+    index = LeaderboardIndex()
+    rows = [row(1, 3, 10), row(2, 5, 0), row(3, 3, 10), row(4, 3, 10, 1), row(5, 3, 20)]
+    index.load(rows)
+    assert [leader['user_id'] for leader in index.top(10)] == order(rows) == [2, 5, 4, 3, 1]
+    assert [index.rank(user_id) for user_id in (2, 5, 4, 3, 1)] == [1, 2, 3, 4, 5]
+    assert index.top(2, 1)[0] == {'user_id': 5, 'username': "user5", 'streak': 3, 'points': 20, 'badge_count': 0}
+
+
+def test_index_update_and_remove():
+    index = LeaderboardIndex()
+    index.load([row(1, 1, 0), row(2, 2, 0), row(3, 3, 0)])
+    index.update(1, "user1", 4, 0, 0)
+    assert [leader['user_id'] for leader in index.top()] == [1, 3, 2]
+    index.remove(3)
+    assert index.rank(3) is None
+    assert [index.rank(1), index.rank(2), len(index)] == [1, 2, 2]
+
+
+def test_rank_matches_database_order(db, add_user):
+    rng = random.Random(3)
+    rows = []
+    for i in range(60):
+        # Narrow ranges so that plenty of users tie
+        streak, points, badges = rng.randint(0, 3), rng.choice([0, 10]), rng.randint(0, 1)
+        user_id = add_user(f"user{i}", streak=streak, points=points, badge_count=badges)
+        rows.append(row(user_id, streak, points, badges))
+
+    expected = order(rows)
+    # Without an index the ranking is read from idx_users_ranking
+    leaderboard = Leaderboard(db)
+    assert [leader['user_id'] for leader in leaderboard.top(60)] == expected
+    assert [leader['user_id'] for leader in leaderboard.top(5, 10)] == expected[10:15]
+    assert [leaderboard.rank(user_id) for user_id in expected] == list(range(1, 61))
+    assert (leaderboard.rank(10 ** 6), leaderboard.total()) == (None, 60)
+
+    leaderboard.load_index()
+    assert [leader['user_id'] for leader in leaderboard.top(60)] == expected
+    assert [leaderboard.rank(user_id) for user_id in expected] == list(range(1, 61))
+
+    # record() keeps a loaded index current without reloading it
+    last = expected[-1]
+    leaderboard.record(row(last, 9, 0))
+    assert leaderboard.rank(last) == 1
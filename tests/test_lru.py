@@ -0,0 +1,39 @@
+from lru import LRUCache
+from quotes import QuoteCache
+
+
+class Recorder(LRUCache):
+    def __init__(self, max_size):
+        super().__init__(max_size)
+        self.evicted = []
+
+    def _evicted(self, key, value):
+        self.evicted.append((key, value))
+
+
+def test_evicts_least_recently_used():
+    cache = Recorder(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.evicted == [("b", 2)]
+    assert (cache.get("b"), cache.get("a"), cache.get("c")) == (None, 1, 3)
+    assert cache.discard("a") == 1
+    cache.clear()
+    assert cache.get("c") is None
+
+
+def test_quote_cache_expires_and_rotates():
+    now = [0]
+    cache = QuoteCache(max_size=2, ttl=10, clock=lambda: now[0])
+    for content in ("one", "two", "three"):
+        cache.add({'content': content, 'author': "x"})
+        now[0] += 1
+    assert len(cache) == 2
+    # Served least recently used first, so quotes don't repeat back to back
+    assert [cache.take()['content'] for _ in range(3)] == ["two", "three", "two"]
+    now[0] = 11
+    assert [cache.take()['content'], len(cache)] == ["three", 1]
+    now[0] = 20
+    assert cache.take() is None
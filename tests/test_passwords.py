@@ -0,0 +1,69 @@
+import pytest
+
+import passwords
+from passwords import check_login, hash_password, legacy_hash, verify_password
+
+
+@pytest.fixture(autouse=True)
+def cheap_params(monkeypatch):
+    # Same formats, far fewer rounds
+    monkeypatch.setattr(passwords, "SCRYPT_PARAMS", {'n': 2 ** 4, 'r': 8, 'p': 1})
+    monkeypatch.setattr(passwords, "PBKDF2_PARAMS", {'i': 1000})
+
+
+@pytest.mark.parametrize("algorithm", ["scrypt", "pbkdf2_sha256"])
+def test_round_trip(monkeypatch, algorithm):
+    monkeypatch.setattr(passwords, "DEFAULT_ALGORITHM", algorithm)
+    stored = hash_password("correct horse", algorithm)
+    name, params, salt, digest = stored.split("$")
+    assert name == algorithm
+    assert params == ",".join(f"{key}={value}" for key, value in passwords.current_params(algorithm).items())
+    assert salt and digest
+    assert verify_password("correct horse", stored) == (True, False)
+    assert verify_password("wrong horse", stored) == (False, False)
+    # Salted: the same password never hashes the same way twice
+    assert hash_password("correct horse", algorithm) != stored
+
+
+def test_pbkdf2_fallback(monkeypatch):
+    # Interpreters built without hashlib.scrypt hash with PBKDF2; their
+    # hashes are upgraded once scrypt is available
+    stored = hash_password("pw", "pbkdf2_sha256")
+    assert stored.startswith("pbkdf2_sha256$i=1000$")
+    monkeypatch.setattr(passwords, "DEFAULT_ALGORITHM", "pbkdf2_sha256")
+    assert verify_password("pw", stored) == (True, False)
+    monkeypatch.setattr(passwords, "DEFAULT_ALGORITHM", "scrypt")
+    assert verify_password("pw", stored) == (True, True)
+
+
+@pytest.mark.parametrize("stored", [
+    "",
+    None,
+    "scrypt$n=16,r=8,p=1$onlythree",
+    "scrypt$n=sixteen$c2FsdA$aGFzaA",
+    "md5$i=1$c2FsdA$aGFzaA",
+    "scrypt$n=16,r=8,p=1$c2FsdA$aGFzaA$extra",
+])
+def test_malformed_hashes_never_match(stored):
+    assert verify_password("pw", stored) == (False, False)
+
+
+def test_params_change_triggers_rehash(monkeypatch):
+    stored = hash_password("pw", "scrypt")
+    monkeypatch.setattr(passwords, "SCRYPT_PARAMS", {'n': 2 ** 5, 'r': 8, 'p': 1})
+    assert verify_password("pw", stored) == (True, True)
+    assert verify_password("nope", stored) == (False, False)
+
+    matches, upgraded = check_login("pw", stored)
+    assert matches and upgraded.startswith("scrypt$n=32,r=8,p=1$")
+    assert verify_password("pw", upgraded) == (True, False)
+
+
+def test_legacy_hash_verifies_and_upgrades():
+    stored = legacy_hash("pw")
+    assert len(stored) == 64
+    matches, upgraded = check_login("pw", stored)
+    assert matches and upgraded.startswith(passwords.DEFAULT_ALGORITHM + "$")
+    # A wrong password is never flagged, so no hash is derived for it
+    assert verify_password("nope", stored) == (False, False)
+    assert check_login("nope", stored) == (False, None)
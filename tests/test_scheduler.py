@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from main import StudyReminder
+from scheduler import EVERY_DAY, ReminderScheduler, SimulatedClock, next_fire, parse_days, parse_time
+
+# A Monday
+START = datetime(2026, 10, 19, 0, 0)
+
+
+def run(db, hours, start=START):
+    fired = []
+    scheduler = ReminderScheduler(db, SimulatedClock(start), on_fire=lambda row, at: fired.append(
+        (at, row['username'])), check_interval=None)
+    scheduler.run(until=start + timedelta(hours=hours))
+    return scheduler, fired
+
+
+def test_parse_days():
+    assert parse_days("Mon,Wed") == 0b0000101
+    assert parse_days("weekends") == 0b1100000
+    assert parse_days("") == EVERY_DAY
+
+
+def test_parse_time():
+    assert parse_time("07:30") == timedelta(hours=7, minutes=30)
+    assert parse_time(timedelta(hours=7)) == timedelta(hours=7)
+
+
+@pytest.mark.parametrize("value", ["9am", "25:00", "7"])
+def test_parse_time_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        parse_time(value)
+
+
+def test_next_fire_skips_disabled_days():
+    # Monday 10:00, reminder at 09:00 on Mondays and Wednesdays
+    assert next_fire(START + timedelta(hours=10), timedelta(hours=9), parse_days("Mon,Wed")) == \
+        datetime(2026, 10, 21, 9, 0)
+
+
+def test_fires_in_time_order(db, add_user):
+    reminders = StudyReminder(db)
+    ann, bob = add_user("ann"), add_user("bob")
+    reminders.add_reminder(ann, "09:00", "Mon,Tue")
+    reminders.add_reminder(bob, "08:30", "daily")
+    reminders.add_reminder(ann, "08:30", "Tue")
+
+    _, fired = run(db, 48)
+
+    assert fired == [
+        (datetime(2026, 10, 19, 8, 30), "bob"),
+        (datetime(2026, 10, 19, 9, 0), "ann"),
+        (datetime(2026, 10, 20, 8, 30), "bob"),
+        (datetime(2026, 10, 20, 8, 30), "ann"),
+        (datetime(2026, 10, 20, 9, 0), "ann"),
+    ]
+
+
+def test_picks_up_changes(db, add_user):
+    reminders = StudyReminder(db)
+    ann = add_user("ann")
+    first = reminders.add_reminder(ann, "09:00", "daily")
+    scheduler, fired = run(db, 1)
+    assert scheduler.reminders.keys() == {first}
+
+    reminders.remove_reminder(ann, first)
+    second = reminders.add_reminder(ann, "10:00", "daily")
+    assert scheduler.check_changes() == 2
+    assert scheduler.reminders.keys() == {second}
+    # Consumed changes are deleted, all but the newest
+    cursor = db.cursor
+    cursor.execute("SELECT change_id FROM reminder_changes")
+    assert [row['change_id'] for row in cursor.fetchall()] == [scheduler.last_change]
+    assert scheduler.check_changes() == 0
+    scheduler.run_pending()
+    scheduler.clock.sleep(11 * 60 * 60)
+    scheduler.run_pending()
+    assert fired == [(datetime(2026, 10, 19, 10, 0), "ann")]
+
+
+def test_rejects_and_skips_bad_times(db, add_user):
+    reminders = StudyReminder(db)
+    ann = add_user("ann")
+    assert reminders.add_reminder(ann, "9am", "daily") is None
+    reminders.add_reminder(ann, "9:15", "daily")
+    # Written before times were validated
+    cursor = db.cursor
+    cursor.execute("INSERT INTO study_reminders (user_id, time, days, enabled) VALUES (%s, %s, %s, %s)",
+                   (ann, "noon", "daily", True))
+    db.commit()
+
+    assert len(reminders.reminders(ann)) == 2
+    _, fired = run(db, 24)
+    assert fired == [(datetime(2026, 10, 19, 9, 15), "ann")]
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from server import StudySparkServer
+
+
+@pytest.fixture
+def server(backend, monkeypatch):
+    monkeypatch.setenv("STUDYSPARK_QUOTES", "offline")
+    server = StudySparkServer(backend, workers=2)
+    yield server
+    server.executor.shutdown()
+    server.quotes.stop()
+
+
+def call(server, method, target, body=None, token=None):
+    headers = {'authorization': f"Bearer {token}"} if token else {}
+    raw = body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else b""
+    return asyncio.run(server.dispatch(method, target, headers, raw))
+
+
+def login(server, username="ann", password="secret"):
+    call(server, "POST", "/register", {'username': username, 'password': password})
+    status, payload = call(server, "POST", "/login", {'username': username, 'password': password})
+    assert status == 200
+    return payload['token']
+
+
+def test_session_flow(server):
+    token = login(server)
+    assert call(server, "POST", "/sessions/start", {'session_name': "math", 'duration': 30}, token)[0] == 201
+    status, session = call(server, "POST", "/sessions/end", token=token)
+    assert status == 200 and session['session_name'] == "math"
+    status, payload = call(server, "GET", "/sessions?limit=5", token=token)
+    assert [row['status'] for row in payload['sessions']] == ["Completed"]
+    # Limits below 1 are clamped rather than read as "no limit"
+    assert len(call(server, "GET", "/sessions?limit=-1", token=token)[1]['sessions']) == 1
+    assert call(server, "GET", "/leaderboard?page_size=-5", token=token)[0] == 200
+    status, payload = call(server, "GET", "/leaderboard", token=token)
+    assert payload['leaders'][0]['username'] == "ann"
+
+
+def test_bad_requests(server):
+    token = login(server)
+    assert call(server, "POST", "/groups", b"{not json", token) == (400, {'error': "Body must be JSON"})
+    assert call(server, "POST", "/groups", b"[1]", token) == (400, {'error': "Body must be a JSON object"})
+    assert call(server, "POST", "/groups", {}, token) == (400, {'error': "'group_name' is required"})
+    assert call(server, "POST", "/sessions/start", {'session_name': "x", 'duration': "long"}, token) == \
+        (400, {'error': "'duration' is not valid"})
+    assert call(server, "POST", "/login", {'username': "ann"})[0] == 400
+    assert call(server, "POST", "/register", {'username': "ann", 'password': "again"})[0] == 409
+
+
+def test_routing(server):
+    token = login(server)
+    assert call(server, "GET", "/nowhere") == (404, {'error': "Not found"})
+    assert call(server, "GET", "/groups/1/join", token=token) == (405, {'error': "Method not allowed"})
+    assert call(server, "DELETE", "/leaderboard") == (405, {'error': "Method not allowed"})
+    assert call(server, "POST", "/sessions/end", token=token)[0] == 404
+    assert call(server, "DELETE", "/reminders/99", token=token)[0] == 404
+    assert call(server, "POST", "/groups/99/join", token=token) == (404, {'error': "Study group not found"})
+    assert call(server, "GET", "/reminders")[0] == 401
+    # Trailing slashes are ignored
+    assert call(server, "GET", "/groups/")[0] == 200
+
+
+def test_unreachable_database_is_a_503(server, monkeypatch):
+    def refuse():
+        raise sqlite3.OperationalError("unable to open database file")
+
+    monkeypatch.setattr(server.backend, "connect", refuse)
+    assert call(server, "GET", "/groups") == (503, {'error': "Database unavailable"})
+
+
+def test_tokens_expire_and_log_out(server):
+    token = login(server)
+    assert call(server, "GET", "/reminders", token=token)[0] == 200
+    server.tokens[token]['expires'] = 0
+    assert call(server, "GET", "/reminders", token=token)[0] == 401
+    assert token not in server.tokens
+
+    token = login(server)
+    assert call(server, "POST", "/logout", token=token) == (200, {'logged_out': True})
+    assert call(server, "GET", "/reminders", token=token)[0] == 401
+
+
+def test_expired_tokens_are_pruned_on_login(server):
+    first, second = login(server, "ann"), login(server, "bob")
+    server.tokens[first]['expires'] = 0
+    third = login(server, "cat")
+    assert list(server.tokens) == [second, third]
+
+
+def test_http_round_trip(server):
+    async def exchange():
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps({'username': "bob", 'password': "pw"}).encode()
+        writer.write(b"POST /register HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+        writer.write(b"GET /missing HTTP/1.1\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        data = await reader.read()
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return data.decode()
+
+    response = asyncio.run(exchange())
+    assert response.startswith("HTTP/1.1 201 Created\r\n")
+    assert "HTTP/1.1 404 Not Found\r\n" in response
+    assert response.endswith('{"error": "Not found"}')
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+from main import StatsRollup
+
+START = datetime(2026, 10, 19, 9, 0)
+
+
+def stats(db, user_id):
+    cursor = db.cursor
+    cursor.execute("SELECT total_minutes, session_count, last_session FROM user_stats WHERE user_id = %s",
+                   (user_id,))
+    return cursor.fetchone()
+
+
+def test_record_session_accumulates(db, add_user):
+    ann = add_user("ann")
+    rollup = StatsRollup(db)
+    rollup.record_session(db.cursor, ann, 25.0, START)
+    rollup.record_session(db.cursor, ann, 15.5, START + timedelta(hours=2))
+    db.commit()
+    assert stats(db, ann) == {'total_minutes': 40.5, 'session_count': 2, 'last_session': START + timedelta(hours=2)}
+
+
+def test_reconcile_finds_and_repairs_drift(db, add_user, add_session):
+    ann, bob, cat, dan = add_user("ann"), add_user("bob"), add_user("cat"), add_user("dan")
+    rollup = StatsRollup(db)
+    # ann is in step: her session went through the rollup
+    add_session(ann, START, minutes=30)
+    rollup.record_session(db.cursor, ann, 30, START + timedelta(minutes=30))
+    # bob's sessions were written without it, and a running one doesn't count
+    add_session(bob, START, minutes=20)
+    add_session(bob, START + timedelta(days=1), minutes=40)
+    add_session(bob, START + timedelta(days=2), status="In Progress")
+    # cat has a rollup but no sessions, dan a badge that badge_count missed
+    rollup.record_session(db.cursor, cat, 10, START)
+    db.cursor.execute("INSERT INTO badges (user_id, badge_name) VALUES (%s, %s)", (dan, "7-Day Streak"))
+    db.commit()
+
+    assert rollup.reconcile(chunk_size=2) == [bob, cat, dan]
+    # Without --repair nothing is written
+    assert rollup.reconcile() == [bob, cat, dan]
+
+    assert rollup.reconcile(repair=True, chunk_size=3) == [bob, cat, dan]
+    assert rollup.reconcile() == []
+    assert stats(db, bob) == {'total_minutes': 60, 'session_count': 2,
+                              'last_session': START + timedelta(days=1, minutes=40)}
+    assert stats(db, cat)['session_count'] == 0
+    cursor = db.cursor
+    cursor.execute("SELECT badge_count FROM users WHERE user_id = %s", (dan,))
+    assert cursor.fetchone()['badge_count'] == 1
@@ -0,0 +1,73 @@
+from datetime import date, datetime, timedelta
+
+from main import StreakEngine
+
+TODAY = date(2026, 10, 19)
+
+
+def at(day, hour=10):
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+
+
+def streaks(db):
+    cursor = db.cursor
+    cursor.execute("SELECT username, streak, last_study_date FROM users ORDER BY user_id")
+    rows = {row['username']: (row['streak'], row['last_study_date']) for row in cursor.fetchall()}
+    db.commit()
+    return rows
+
+
+def test_streak_for():
+    days = [TODAY, TODAY - timedelta(days=1), TODAY - timedelta(days=2), TODAY - timedelta(days=4)]
+    assert StreakEngine.streak_for(days, TODAY) == 3
+    # Studying yesterday keeps the streak alive until today ends
+    assert StreakEngine.streak_for(days, TODAY + timedelta(days=1)) == 3
+    assert StreakEngine.streak_for(days, TODAY + timedelta(days=2)) == 0
+    assert StreakEngine.streak_for([], TODAY) == 0
+
+
+def test_record_session(db, add_user):
+    ann = add_user("ann")
+    engine = StreakEngine(db)
+    for day in (TODAY - timedelta(days=3), TODAY - timedelta(days=2), TODAY - timedelta(days=2), TODAY):
+        engine.record_session(db.cursor, ann, at(day))
+        db.commit()
+    assert streaks(db)['ann'] == (1, TODAY)
+    engine.record_session(db.cursor, ann, at(TODAY + timedelta(days=1)))
+    assert streaks(db)['ann'] == (2, TODAY + timedelta(days=1))
+
+
+def test_recompute_all_matches_session_days(db, add_user, add_session):
+    ann, bob, cat = add_user("ann", streak=9), add_user("bob", streak=5), add_user("cat")
+    for offset in (0, 1, 1, 2, 5):
+        add_session(ann, at(TODAY - timedelta(days=offset)))
+    for offset in (3, 4):
+        add_session(bob, at(TODAY - timedelta(days=offset)))
+    add_session(cat, at(TODAY - timedelta(days=1)), status="In Progress")
+
+    scanned, changed = StreakEngine(db, chunk_size=2).recompute_all(as_of=TODAY)
+
+    assert (scanned, changed) == (3, 2)
+    assert streaks(db) == {
+        'ann': (3, TODAY),
+        'bob': (0, TODAY - timedelta(days=3)),
+        'cat': (0, None),
+    }
+
+
+def test_incremental_run(db, add_user, add_session):
+    ann, bob = add_user("ann"), add_user("bob")
+    add_session(ann, at(TODAY - timedelta(days=2)))
+    add_session(bob, at(TODAY - timedelta(days=2)))
+    engine = StreakEngine(db)
+    engine.recompute_all(as_of=TODAY - timedelta(days=1))
+    assert streaks(db)['bob'] == (1, TODAY - timedelta(days=2))
+
+    # Only ann studies again; bob's streak lapses without being rescanned
+    add_session(ann, at(TODAY - timedelta(days=1)))
+    add_session(ann, at(TODAY))
+    scanned, changed = engine.run_incremental(as_of=TODAY)
+
+    assert scanned == 1
+    assert changed == 2
+    assert streaks(db) == {'ann': (3, TODAY), 'bob': (0, TODAY - timedelta(days=2))}
@@ -0,0 +1,90 @@
+import io
+import json
+
+import pytest
+
+from transfer import UserExporter, UserImporter, iter_json_array, iter_users
+
+USERS = [
+    {"username": "ann", "password": "h1", "streak": 3, "points": 40, "badges": ["7-Day Streak"],
+     "last_study_date": "2026-10-18",
+     "study_reminders": [{"time": "08:30:00", "days": "Mon,Wed", "enabled": True}]},
+    {"username": "bob", "password": "h2", "streak": 0, "points": 0, "badges": [],
+     "last_study_date": None, "study_reminders": []},
+    {"username": "cat \"the\" [great]", "password": "h3", "streak": 1, "points": 5,
+     "badges": ["1000 Points", "7-Day Streak"], "last_study_date": "2026-10-01",
+     "study_reminders": [{"time": "21:00:00", "days": "daily", "enabled": False}]},
+]
+
+
+def export(db, fmt):
+    output = io.StringIO()
+    UserExporter(db, batch_size=2, progress=None).export_users(output, fmt)
+    return output.getvalue()
+
+
+def normalized(users):
+    return sorted(({**user, 'badges': sorted(user['badges'])} for user in users), key=lambda user: user['username'])
+
+
+@pytest.mark.parametrize("fmt", ["json", "jsonl"])
+def test_round_trip(db, fmt):
+    importer = UserImporter(db, batch_size=2, progress=None)
+    assert importer.import_users(iter(USERS)) == 3
+    text = export(db, fmt)
+    assert normalized(iter_users(io.StringIO(text))) == normalized(USERS)
+
+    # Importing the export again changes nothing
+    assert importer.import_users(iter_users(io.StringIO(text), fmt)) == 3
+    assert export(db, fmt) == text
+    cursor = db.cursor
+    cursor.execute("SELECT badge_count FROM users WHERE username = %s", ("cat \"the\" [great]",))
+    assert cursor.fetchone()['badge_count'] == 2
+
+
+def test_import_replaces_badges_and_reminders(db):
+    importer = UserImporter(db, progress=None)
+    importer.import_users(iter(USERS[:1]))
+    changed = {**USERS[0], "points": 99, "study_reminders": []}
+    importer.import_users(iter([changed]))
+    [ann] = json.loads(export(db, "json"))
+    assert (ann['points'], ann['study_reminders']) == (99, [])
+
+
+def test_only_changed_reminders_are_recorded(db):
+    def changes():
+        cursor = db.cursor
+        cursor.execute("SELECT user_id FROM reminder_changes ORDER BY change_id")
+        return [row['user_id'] for row in cursor.fetchall()]
+
+    importer = UserImporter(db, progress=None)
+    importer.import_users(iter(USERS))
+    # bob has no reminders, so nothing changed for him
+    first = changes()
+    assert len(first) == 2
+    importer.import_users(iter_users(io.StringIO(export(db, "jsonl")), "jsonl"))
+    assert changes() == first
+
+    changed = {**USERS[2], "points": 6, "study_reminders": [{"time": "21:00:00", "days": "daily", "enabled": True}]}
+    importer.import_users(iter([USERS[0], changed]))
+    cursor = db.cursor
+    cursor.execute("SELECT user_id FROM users WHERE username = %s", (changed['username'],))
+    assert changes() == first + [cursor.fetchone()['user_id']]
+
+
+def test_iter_json_array_reads_in_small_pieces():
+    text = json.dumps(USERS, indent=2)
+    assert list(iter_json_array(io.StringIO(text), read_size=7)) == USERS
+    assert list(iter_json_array(io.StringIO("  [ ]  "))) == []
+    assert list(iter_json_array(io.StringIO(""))) == []
+
+
+@pytest.mark.parametrize("text", [
+    '{"username": "ann"}',
+    '[{"username": "ann"}, {"username": ',
+    '[{"username": "ann"}, {"username": "bob"}',
+    '[{"username": "ann"}, nonsense]',
+])
+def test_iter_json_array_rejects_malformed_input(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), read_size=5))
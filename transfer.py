@@ -0,0 +1,239 @@
+import json
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+USER_COLUMNS = ["username", "password", "streak", "points", "last_study_date"]
+
+
+def iter_json_array(source, read_size=1 << 16):
+    # Incrementally decodes the objects of a top-level JSON array so that the
+    # whole file never has to be held in memory
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array of users")
+            started = True
+            position += 1
+            continue
+        if started and position < len(buffer) and buffer[position] == "]":
+            return
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                position = end
+                continue
+        if eof:
+            if started:
+                raise ValueError("Unterminated JSON array")
+            return
+        chunk = source.read(read_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_json_lines(source):
+    for line in source:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_users(source, fmt=None):
+    # fmt is "json" or "jsonl"; guessed from the first character when omitted
+    if fmt is None:
+        first = source.read(1)
+        while first and first.isspace():
+            first = source.read(1)
+        fmt = "json" if first == "[" else "jsonl"
+        source = _Prepend(first, source)
+    return iter_json_array(source) if fmt == "json" else iter_json_lines(source)
+
+
+class _Prepend:
+    def __init__(self, head, source):
+        self.head = head
+        self.source = source
+
+    def read(self, size=-1):
+        head, self.head = self.head, ""
+        return head + self.source.read(size if size < 0 else max(size - len(head), 0))
+
+    def __iter__(self):
+        head, self.head = self.head, ""
+        lines = iter(self.source)
+        first = next(lines, "")
+        if head or first:
+            yield head + first
+        yield from lines
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _report(label, count, started, out):
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0
+    print(f"==> {count} users {label} in {elapsed:.1f}s ({rate:,.0f} users/s)", file=out)
+
+
+# Bulk loader for users.json style fixtures (users with nested badges and reminders)
+class UserImporter:
+    def __init__(self, db, batch_size=1000, progress=sys.stderr):
+        self.db = db
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def import_users(self, users):
+        started = time.perf_counter()
+        count = 0
+        for chunk in _chunks(users, self.batch_size):
+            self.load_chunk(chunk)
+            count += len(chunk)
+            if self.progress:
+                _report("imported", count, started, self.progress)
+        return count
+
+    def load_chunk(self, chunk):
+        # One transaction per chunk; users are upserted on username and their
+        # badges and reminders replaced by the ones in the file
+        backend = self.db.backend
+        cursor = self.db.cursor
+        cursor.executemany(
+            backend.upsert("users", USER_COLUMNS, ["username"],
+                           {column: "{%s}" % column for column in USER_COLUMNS[1:]}),
+            [(user['username'], user.get('password'), user.get('streak', 0), user.get('points', 0),
+              user.get('last_study_date')) for user in chunk]
+        )
+        usernames = [user['username'] for user in chunk]
+        placeholders = ", ".join(["%s"] * len(usernames))
+        cursor.execute(f"SELECT user_id, username FROM users WHERE username IN ({placeholders})", usernames)
+        ids = {row['username']: row['user_id'] for row in cursor.fetchall()}
+        user_ids = list(ids.values())
+
+        badges = [(ids[user['username']], badge) for user in chunk for badge in user.get('badges') or []]
+        if badges:
+            cursor.executemany(f"{backend.insert_ignore} INTO badges (user_id, badge_name) VALUES (%s, %s)", badges)
+        cursor.execute(f"""
+            UPDATE users SET badge_count = (
+                SELECT COUNT(*) FROM badges WHERE badges.user_id = users.user_id
+            ) WHERE user_id IN ({placeholders})
+        """, user_ids)
+
+        # Reminders are only rewritten, and the scheduler only told about
+        # them, for users whose reminders differ from the file's
+        wanted = {ids[user['username']]: Counter(
+            (reminder.get('time'), reminder.get('days'), bool(reminder.get('enabled', True)))
+            for reminder in user.get('study_reminders') or []) for user in chunk}
+        current = {user_id: Counter() for user_id in user_ids}
+        cursor.execute(
+            f"SELECT user_id, time, days, enabled FROM study_reminders WHERE user_id IN ({placeholders})", user_ids)
+        for row in cursor.fetchall():
+            current[row['user_id']][(_plain(row['time']), row['days'], bool(row['enabled']))] += 1
+        changed = [user_id for user_id in user_ids if wanted[user_id] != current[user_id]]
+        if changed:
+            marks = ", ".join(["%s"] * len(changed))
+            cursor.execute(f"DELETE FROM study_reminders WHERE user_id IN ({marks})", changed)
+            reminders = [(user_id, *reminder) for user_id in changed for reminder in wanted[user_id].elements()]
+            if reminders:
+                cursor.executemany(
+                    "INSERT INTO study_reminders (user_id, time, days, enabled) VALUES (%s, %s, %s, %s)", reminders)
+            now = datetime.now()
+            cursor.executemany("INSERT INTO reminder_changes (user_id, changed_at) VALUES (%s, %s)",
+                               [(user_id, now) for user_id in changed])
+        self.db.commit()
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return "%02d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return value
+
+
+# Streams every user, with badges and reminders, back out in users.json format
+class UserExporter:
+    def __init__(self, db, batch_size=1000, progress=sys.stderr):
+        self.db = db
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def iter_users(self):
+        cursor = self.db.cursor
+        last_id = 0
+        while True:
+            cursor.execute(
+                "SELECT user_id, username, password, streak, points, last_study_date FROM users "
+                "WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                (last_id, self.batch_size)
+            )
+            users = cursor.fetchall()
+            if not users:
+                return
+            last_id = users[-1]['user_id']
+            user_ids = [user['user_id'] for user in users]
+            placeholders = ", ".join(["%s"] * len(user_ids))
+            badges = {}
+            cursor.execute(f"SELECT user_id, badge_name FROM badges WHERE user_id IN ({placeholders})", user_ids)
+            for row in cursor.fetchall():
+                badges.setdefault(row['user_id'], []).append(row['badge_name'])
+            reminders = {}
+            cursor.execute(
+                f"SELECT user_id, time, days, enabled FROM study_reminders WHERE user_id IN ({placeholders})",
+                user_ids)
+            for row in cursor.fetchall():
+                reminders.setdefault(row['user_id'], []).append(
+                    {"time": _plain(row['time']), "days": row['days'], "enabled": bool(row['enabled'])})
+            for user in users:
+                yield {
+                    "username": user['username'],
+                    "password": user['password'],
+                    "streak": user['streak'],
+                    "points": user['points'],
+                    "badges": badges.get(user['user_id'], []),
+                    "last_study_date": _plain(user['last_study_date']),
+                    "study_reminders": reminders.get(user['user_id'], []),
+                }
+
+    def export_users(self, output, fmt="json"):
+        started = time.perf_counter()
+        count = 0
+        if fmt == "json":
+            output.write("[")
+        for user in self.iter_users():
+            if fmt == "json":
+                output.write(",\n    " if count else "\n    ")
+                output.write(json.dumps(user))
+            else:
+                output.write(json.dumps(user) + "\n")
+            count += 1
+            if self.progress and count % self.batch_size == 0:
+                _report("exported", count, started, self.progress)
+        if fmt == "json":
+            output.write("\n]\n" if count else "]\n")
+        if self.progress:
+            _report("exported", count, started, self.progress)
+        return count